@@ -0,0 +1,124 @@
+"""
+Benchmark of the NutriScore calculation on synthetic recipes.
+
+The compiled grille scorer is compared with the row-range implementation
+(one `.loc` assignment per nutrient and grille row) on the same data, and the
+scores of both implementations are checked to be identical.
+
+Run from the root of the repository:
+
+    PYTHONPATH=src python benchmarks/bench_calcul_nutriscore.py --rows 10000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from calcul_nutriscore import CompiledGrille  # noqa: E402
+from core.asset_manager import get_asset_path  # noqa: E402
+
+GRILLECOLNAME = [
+    'dv_calories_%',
+    'dv_sat_fat_%',
+    'dv_sugar_%',
+    'dv_sodium_%',
+    'dv_protein_%'
+]
+
+
+def synthetic_recipes(n_rows, seed=0):
+    """
+    Generate daily value percentages for synthetic recipes.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of recipes to generate.
+    seed : int
+        Seed of the random generator.
+
+    Returns
+    -------
+    pd.DataFrame
+        The synthetic daily value percentages, rounded like the database.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        nutrient: rng.exponential(80, n_rows).round(3)
+        for nutrient in GRILLECOLNAME
+    })
+
+
+def row_range_score(data, grille):
+    """
+    Calculate the NutriScore with one `.loc` assignment per grille row.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The daily value percentages of the recipes.
+    grille : pd.DataFrame
+        The nutritional table containing the thresholds for each nutrient.
+
+    Returns
+    -------
+    np.ndarray
+        The NutriScore of each recipe.
+    """
+    data = data.copy()
+    data['nutriscore'] = 14.0
+    for nutrient in GRILLECOLNAME:
+        values = data[nutrient].values
+        if nutrient == 'dv_protein_%':
+            values = -values
+        for i, grille_row in grille.iterrows():
+            prev_value = -np.inf if i == 0 else grille[nutrient].iloc[i - 1]
+            if np.isnan(grille_row[nutrient]):
+                mask = values > prev_value
+                data.loc[mask, 'nutriscore'] -= grille_row['points']
+                break
+            mask = (values > prev_value) & (values <= grille_row[nutrient])
+            data.loc[mask, 'nutriscore'] -= grille_row['points']
+    return data['nutriscore'].to_numpy()
+
+
+def main():
+    """
+    Run the benchmark and print the timings of both implementations.
+
+    Returns
+    -------
+    None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    grille = pd.read_csv(
+        get_asset_path('data/nutrient_table.csv'), encoding='utf-8-sig'
+    )
+    data = synthetic_recipes(args.rows)
+
+    start = time.perf_counter()
+    expected = row_range_score(data, grille)
+    row_range_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = CompiledGrille(grille, GRILLECOLNAME).score(data)
+    compiled_time = time.perf_counter() - start
+
+    assert np.array_equal(result, expected), 'Scores differ'
+    print(f'rows: {args.rows}')
+    print(f'row-range masks: {row_range_time:.3f} s')
+    print(f'compiled grille: {compiled_time:.3f} s')
+    print(f'speed-up: {row_range_time / compiled_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark of the per-recipe interaction statistics on synthetic interactions.
+
+The single named-aggregation groupby of `InteractionData.interactions_df` is
+compared with the former implementation (one groupby per statistic, folded
+together with `pd.merge`) on the same data, and the results of both
+implementations are checked to be identical.
+
+Run from the root of the repository:
+
+    PYTHONPATH=src python benchmarks/bench_interactions.py --rows 10000000
+"""
+import argparse
+import os
+import sys
+import time
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from interaction_correlation_analysis import InteractionData  # noqa: E402
+
+
+def synthetic_interactions(n_rows, n_recipes=230_000, seed=0):
+    """
+    Generate synthetic user interactions with recipes.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of interactions to generate.
+    n_recipes : int
+        Number of distinct recipes.
+    seed : int
+        Seed of the random generator.
+
+    Returns
+    -------
+    pd.DataFrame
+        The interactions, with about 1% of missing ratings and reviews.
+    """
+    rng = np.random.default_rng(seed)
+    rating = rng.integers(0, 6, n_rows).astype(float)
+    rating[rng.random(n_rows) < 0.01] = np.nan
+    review = pd.Series(['ok'] * n_rows, dtype=object)
+    review[rng.random(n_rows) < 0.01] = np.nan
+    return pd.DataFrame({
+        'user_id': rng.integers(0, 2_000_000, n_rows),
+        'recipe_id': rng.zipf(1.3, n_rows) % n_recipes,
+        'rating': rating,
+        'review': review
+    })
+
+
+def merged_groupbys(data):
+    """
+    Compute the interaction statistics with one groupby per statistic.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The interactions.
+
+    Returns
+    -------
+    pd.DataFrame
+        The statistics of each recipe.
+    """
+    data_filtered = data.dropna(subset=['rating', 'review'])
+    # The groups are rebuilt for each statistic, as in the former code
+    dfs = [
+        data_filtered.groupby('recipe_id').size()
+        .reset_index(name='interaction_count'),
+        data_filtered.groupby('recipe_id')['rating'].count()
+        .reset_index(name='review_count'),
+        data_filtered.groupby('recipe_id')['rating'].count()
+        .reset_index(name='rating_count'),
+        data_filtered.groupby('recipe_id')['rating'].mean()
+        .reset_index(name='average_rating')
+    ]
+    return reduce(
+        lambda left, right: pd.merge(left, right, on='recipe_id'), dfs
+    )
+
+
+def main():
+    """
+    Run the benchmark and print the timings of both implementations.
+
+    Returns
+    -------
+    None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    data = synthetic_interactions(args.rows)
+
+    start = time.perf_counter()
+    expected = merged_groupbys(data)
+    merged_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = InteractionData(data=data).interactions_df()
+    single_time = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(result, expected)
+    print(f'rows: {args.rows}')
+    print(f'merged groupbys: {merged_time:.3f} s')
+    print(f'single groupby: {single_time:.3f} s')
+    print(f'speed-up: {merged_time / single_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -7,13 +7,12 @@ from core.config_logging import configure_logging
 from core.asset_manager import get_asset_path
 from db.db_instance import db_instance
 from db.db_instance import Database
+from core.fingerprint import data_fingerprint
+from chart_aggregates import histogram_figure
 from nutriscore_analysis import (
-    nutriscore_analysis,
-    shapiro_test,
-    ks_test,
-    ad_test,
-    skewness,
-    kurtosis
+    NormalityTester,
+    ScoreDistribution,
+    label_distribution
 )
 st.set_page_config(layout="wide")
 
@@ -22,6 +21,9 @@ logger = logging.getLogger("HomePage")
 
 logger.info("Starting the application")
 
+# Number of recipes on which the normality tests run
+NORMALITY_SAMPLE_SIZE = 5000
+
 @st.cache_data
 def get_cached_data(_db_instance: Database, query1:str, query2:str):
     """
@@ -48,6 +50,88 @@ def get_cached_data(_db_instance: Database, query1:str, query2:str):
         logger.error(f"An error occurred while fetching data: {e}")
         return None, None
 
+
+@st.cache_data
+def get_nutriscore_versions(_db_instance: Database, query1: str, query2: str):
+    """
+    Compute the version of the Nutri-Scores once, when they are loaded.
+
+    The versions key the cached normality tests, so the scores are not
+    hashed again on every rerun of the page.
+
+    Parameters
+    ----------
+    db_instance (Database): Instance of the class Database to perform
+    the queries
+    query1 (str): SQL query to fetch data with outliers
+    query2 (str): SQL query to fetch data without outliers
+
+    Returns
+    -------
+    tuple: Versions of the Nutri-Scores with and without outliers, None
+    for the data that could not be fetched
+    """
+    return tuple(
+        None if data is None else data_fingerprint(data['nutriscore'])
+        for data in get_cached_data(_db_instance, query1, query2)
+    )
+
+
+@st.cache_data
+def get_label_versions(_db_instance: Database, query1: str, query2: str):
+    """
+    Compute the version of the Nutri-Score labels once, when they are loaded.
+
+    The versions key the cached label distributions, so the labels are not
+    hashed again on every rerun of the page.
+
+    Parameters
+    ----------
+    db_instance (Database): Instance of the class Database to perform
+    the queries
+    query1 (str): SQL query to fetch data with outliers
+    query2 (str): SQL query to fetch data without outliers
+
+    Returns
+    -------
+    tuple: Versions of the labels with and without outliers, None
+    for the data that could not be fetched
+    """
+    return tuple(
+        None if data is None else data_fingerprint(data['label'])
+        for data in get_cached_data(_db_instance, query1, query2)
+    )
+
+
+@st.cache_data
+def get_score_distribution(scores: pd.Series):
+    """
+    Encode the Nutri-Scores on the 0.25 point grid and count them.
+
+    Parameters
+    ----------
+    scores (pd.Series): Nutri-Scores of the recipes
+
+    Returns
+    -------
+    ScoreDistribution: Number of recipes for each Nutri-Score value
+    """
+    logger.debug("Counting the Nutri-Score values")
+    return ScoreDistribution.from_scores(scores)
+
+
+@st.cache_resource
+def get_normality_tester():
+    """
+    Get the normality testing service shared by all sessions.
+
+    Returns
+    -------
+    NormalityTester: Service caching the normality test results
+    """
+    return NormalityTester(sample_size=NORMALITY_SAMPLE_SIZE)
+
+
 def dropna_nutriscore_data(data):
     """
     Drop rows with missing values in the 'nutriscore' column.
@@ -137,29 +221,18 @@ def analyze_data(data_with_outliers: pd.DataFrame,\
         pd.DataFrame: Analysis results
     """
     logger.debug("Analyzing the data")
-    nutriscore_with_outliers_mean, nutriscore_with_outliers_median, \
-        nutriscore_with_outliers_max, nutriscore_with_outliers_min = \
-        nutriscore_analysis(data_with_outliers)
-    skewness_with_outliers = skewness(data_with_outliers, 'nutriscore')
-    kurtois_with_outliers = kurtosis(data_with_outliers, 'nutriscore')
-
-    nutriscore_no_outliers_mean, nutriscore_no_outliers_median, \
-        nutriscore_no_outliers_max, nutriscore_no_outliers_min = \
-        nutriscore_analysis(data_no_outliers)
-    skewness_no_outliers = skewness(data_no_outliers, 'nutriscore')
-    kurtosis_no_outliers = kurtosis(data_no_outliers, 'nutriscore')
-
-    results = pd.DataFrame({
-        'Mean': [nutriscore_with_outliers_mean, nutriscore_no_outliers_mean],
-        'Median': [
-            nutriscore_with_outliers_median,
-            nutriscore_no_outliers_median
-        ],
-        'Max': [nutriscore_with_outliers_max, nutriscore_no_outliers_max],
-        'Min': [nutriscore_with_outliers_min, nutriscore_no_outliers_min],
-        'Skewness': [skewness_with_outliers, skewness_no_outliers],
-        'Kurtosis': [kurtois_with_outliers, kurtosis_no_outliers]
-    }, index=['With outliers', 'Without outliers'])
+    stats_with_outliers = get_score_distribution(
+        data_with_outliers['nutriscore']
+    ).summary()
+    stats_no_outliers = get_score_distribution(
+        data_no_outliers['nutriscore']
+    ).summary()
+
+    columns = ['Mean', 'Median', 'Max', 'Min', 'Skewness', 'Kurtosis']
+    results = pd.DataFrame(
+        [stats_with_outliers.to_dict(), stats_no_outliers.to_dict()],
+        index=['With outliers', 'Without outliers']
+    )[columns]
     logger.debug(f"Analysis results: {results}")
     return results
 
@@ -187,12 +260,11 @@ def display_histograms(data_with_outliers: pd.DataFrame,
         bins_with_outliers = st.slider(
             "Select the number of bins", 4, 100, 28, key=1
         )
-        fig = px.histogram(
-            data_with_outliers,
-            x='nutriscore',
-            nbins=bins_with_outliers,
+        fig = histogram_figure(
+            get_score_distribution(data_with_outliers['nutriscore'])
+            .histogram(bins=bins_with_outliers),
             title='Nutri-Score Distribution',
-            color_discrete_sequence=['#741B47']
+            color='#741B47'
         )
         fig.update_layout(
             xaxis_title='Nutri-Score',
@@ -214,12 +286,11 @@ def display_histograms(data_with_outliers: pd.DataFrame,
         bins_no_outliers = st.slider(
             "Select the number of bins", 4, 100, 28, key=2
         )
-        fig = px.histogram(
-            data_no_outliers,
-            x='nutriscore',
-            nbins=bins_no_outliers,
+        fig = histogram_figure(
+            get_score_distribution(data_no_outliers['nutriscore'])
+            .histogram(bins=bins_no_outliers),
             title='Nutri-Score Distribution',
-            color_discrete_sequence=['#C27BA0']
+            color='#C27BA0'
         )
         fig.update_layout(
             xaxis_title='Nutri-Score',
@@ -258,7 +329,8 @@ def display_histograms(data_with_outliers: pd.DataFrame,
     
 
 def display_distribution_analysis(data_with_outliers: pd.DataFrame,
-                                   data_no_outliers: pd.DataFrame):
+                                  data_no_outliers: pd.DataFrame,
+                                  versions: tuple = (None, None)):
     """
     Display the normality analysis of the Nutri-Score using Shapiro-Wilk, 
     Kolmogorov-Smirnov, and Anderson-Darling tests.
@@ -266,6 +338,8 @@ def display_distribution_analysis(data_with_outliers: pd.DataFrame,
     Args:
         data_with_outliers (pd.DataFrame): Data with outliers.
         data_no_outliers (pd.DataFrame): Data without outliers.
+        versions (tuple): Versions of the Nutri-Scores with and without
+            outliers, computed from the data when None.
 
     Returns:
         None
@@ -279,51 +353,24 @@ def display_distribution_analysis(data_with_outliers: pd.DataFrame,
         key=3
     )
 
-    if analysis == "Shapiro-Wilk":
-        st.write("**Shapiro-Wilk Test**")
-        shapiro_with_outliers = shapiro_test(data_with_outliers, 'nutriscore')
-        shapiro_no_outliers = shapiro_test(data_no_outliers, 'nutriscore')
-
-        st.write(
-            f"Shapiro-Wilk test for the Nutri-Score with outliers: "
-            f"{shapiro_with_outliers}"
-        )
-        st.write(
-            f"Shapiro-Wilk test for the Nutri-Score without outliers: "
-            f"{shapiro_no_outliers}"
-        )
-
-    elif analysis == "Kolmogorov-Smirnov":
-        st.write("**Kolmogorov-Smirnov Test**")
-        ks_with_outliers = ks_test(data_with_outliers, 'nutriscore')
-        ks_no_outliers = ks_test(data_no_outliers, 'nutriscore')
-
-        st.write(
-            f"Kolmogorov-Smirnov test for the Nutri-Score with outliers: "
-            f"{ks_with_outliers}"
-        )
-        st.write(
-            f"Kolmogorov-Smirnov test for the Nutri-Score without outliers: "
-            f"{ks_no_outliers}"
-        )
-
-    elif analysis == "Anderson-Darling":
-        st.write("**Anderson-Darling Test**")
-        ad_with_outliers = ad_test(data_with_outliers, 'nutriscore')
-        ad_no_outliers = ad_test(data_no_outliers, 'nutriscore')
-
-        st.write(
-            f"Anderson-Darling test for the Nutri-Score with outliers: "
-            f"{ad_with_outliers}"
-        )
-        st.write(
-            f"Anderson-Darling test for the Nutri-Score without outliers: "
-            f"{ad_no_outliers}"
-        )
+    st.write(f"**{analysis} Test**")
+    tester = get_normality_tester()
+    for name, data, version in zip(
+        ("with outliers", "without outliers"),
+        (data_with_outliers, data_no_outliers),
+        versions
+    ):
+        # All tests run at once, so switching test is served from the cache
+        result = tester.run(
+            data, 'nutriscore', concurrent=True, version=version
+        )[analysis]
+        st.write(f"{analysis} test for the Nutri-Score {name}: {result}")
 
     st.write(
         "**Summary:** All tests indicate that the Nutri-Score is not normally distributed. "
-        "Note: The Shapiro-Wilk test is recommended for sample sizes smaller than 5000."
+        f"Note: The tests run on a stratified sample of "
+        f"{NORMALITY_SAMPLE_SIZE} recipes, the Shapiro-Wilk test being "
+        "valid for sample sizes smaller than 5000."
     )
 
     st.divider()
@@ -331,7 +378,8 @@ def display_distribution_analysis(data_with_outliers: pd.DataFrame,
 
 
 def display_label_distribution(
-        data_with_outliers: pd.DataFrame, data_no_outliers: pd.DataFrame):
+        data_with_outliers: pd.DataFrame, data_no_outliers: pd.DataFrame,
+        versions: tuple = (None, None)):
     """
     Display the label distribution of the Nutri-Score.
     
@@ -339,6 +387,8 @@ def display_label_distribution(
     ----------
     data_with_outliers (pd.DataFrame): Data with outliers
     data_no_outliers (pd.DataFrame): Data without outliers
+    versions (tuple): Versions of the labels with and without outliers,
+    computed from the data when None
 
     Returns
     ---------
@@ -359,7 +409,10 @@ def display_label_distribution(
 
     with col3:
         fig = px.pie(
-            data_with_outliers,
+            label_distribution(
+                data_with_outliers, version=versions[0]
+            ).reset_index(),
+            values='count',
             names='label',
             title='Nutri-Score Label Distribution with outliers',
             color='label',
@@ -372,7 +425,10 @@ def display_label_distribution(
 
     with col4:
         fig = px.pie(
-            data_no_outliers,
+            label_distribution(
+                data_no_outliers, version=versions[1]
+            ).reset_index(),
+            values='count',
             names='label',
             title='Nutri-Score Label Distribution without outliers',
             color='label',
@@ -428,8 +484,14 @@ def main():
     "---"
     results = analyze_data(data_with_outliers, data_no_outliers)
     display_histograms(data_with_outliers, data_no_outliers, results)
-    display_distribution_analysis(data_with_outliers, data_no_outliers)
-    display_label_distribution(data_with_outliers, data_no_outliers)
+    versions = get_nutriscore_versions(db_instance, query1, query2)
+    display_distribution_analysis(
+        data_with_outliers, data_no_outliers, versions
+    )
+    label_versions = get_label_versions(db_instance, query1, query2)
+    display_label_distribution(
+        data_with_outliers, data_no_outliers, label_versions
+    )
 
 if __name__ == "__main__":
     try:
@@ -1,13 +1,601 @@
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import threading
+import time
+import io
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+import plotly.express as px
 import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from cachetools import LRUCache
+from core.asset_manager import get_asset_path
+from core.fingerprint import data_fingerprint
 from db.db_instance import db_instance
 import toml
 import logging
 
 logger = logging.getLogger("app.calcul_nutriscore")
 
+# Score of a recipe before any point is subtracted
+BASE_SCORE = 14.0
+# Nutrients compared to the grille through their negative value
+NEGATED_NUTRIENTS = ('dv_protein_%',)
+# Nutrient columns of the grille used for the calculation
+GRILLECOLNAME = [
+    'dv_calories_%',
+    'dv_sat_fat_%',
+    'dv_sugar_%',
+    'dv_sodium_%',
+    'dv_protein_%'
+]
+# Lowest score of each label above E, and the labels from worst to best
+LABEL_CUTS = (3, 6, 9, 12)
+LABELS = ('E', 'D', 'C', 'B', 'A')
+
+
+class CompiledGrille:
+    """
+    This class compiles the nutrient table into sorted threshold arrays.
+
+    For each nutrient, the thresholds of the grille are kept up to the first
+    undefined value. A recipe value is then mapped to its grille row with a
+    single `np.searchsorted`, the row after the last threshold being the
+    open-ended range. Values above the last threshold of a nutrient without
+    open-ended range, and missing values, are mapped to an extra row worth
+    0 points.
+
+    Parameters
+    ----------
+    grille : pd.DataFrame
+        The nutritional table containing the thresholds for each nutrient.
+    grillecolname : list
+        The nutrient columns of the grille used for the calculation.
+
+    Methods
+    -------
+    bin_codes(nutrient, values)
+        Get the grille row of each value for a nutrient.
+    bin_code_matrix(data)
+        Get the uint8 matrix of grille rows per recipe and nutrient.
+    score_from_codes(codes, points=None)
+        Calculate the NutriScore from a matrix of grille rows.
+    score(data)
+        Calculate the NutriScore of each row of a dataset.
+    score_one(dv_values)
+        Calculate the NutriScore, label and points of a single recipe.
+    score_many(values)
+        Calculate the NutriScore, labels and points of an array of recipes.
+    """
+    def __init__(self, grille, grillecolname):
+        """
+        Method to initialize the CompiledGrille instance.
+
+        Parameters
+        ----------
+        grille : pd.DataFrame
+            The nutritional table containing the thresholds for each nutrient.
+        grillecolname : list
+            The nutrient columns of the grille used for the calculation.
+
+        Raises
+        ------
+        ValueError
+            If the thresholds of a nutrient are not sorted in ascending order.
+        """
+        points = grille['points'].to_numpy(dtype=float)
+        self.n_rows = len(points)
+        # The extra row holds the points of values outside the grille
+        self.points = np.append(points, 0.0)
+        self.nutrients = [
+            nutrient for nutrient in grillecolname
+            if nutrient in grille.columns
+        ]
+
+        self.thresholds = {}
+        for nutrient in self.nutrients:
+            column = grille[nutrient].to_numpy(dtype=float)
+            undefined = np.flatnonzero(np.isnan(column))
+            upper = undefined[0] if undefined.size else column.size
+            thresholds = column[:upper]
+            if np.any(np.diff(thresholds) < 0):
+                raise ValueError(
+                    f'The thresholds of "{nutrient}" are not sorted in '
+                    'ascending order.'
+                )
+            self.thresholds[nutrient] = thresholds
+
+        # Plain Python copies for the scoring of a single recipe
+        self._points_list = self.points.tolist()
+        self._thresholds_list = [
+            (nutrient, nutrient in NEGATED_NUTRIENTS,
+             self.thresholds[nutrient].tolist())
+            for nutrient in self.nutrients
+        ]
+
+    def bin_codes(self, nutrient, values):
+        """
+        Get the grille row of each value for a nutrient.
+
+        Parameters
+        ----------
+        nutrient : str
+            The nutrient column of the grille.
+        values : array-like
+            The values of the nutrient for each recipe.
+
+        Returns
+        -------
+        np.ndarray
+            The grille row of each value, `n_rows` for the values worth
+            0 points.
+        """
+        values = np.asarray(values, dtype=float)
+        if nutrient in NEGATED_NUTRIENTS:
+            values = -values
+        codes = np.searchsorted(
+            self.thresholds[nutrient], values, side='left'
+        )
+        codes[np.isnan(values)] = self.n_rows
+        return codes
+
+    def bin_code_matrix(self, data):
+        """
+        Get the matrix of grille rows per recipe and nutrient.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            The dataset containing the nutritional information for each
+            recipe.
+
+        Returns
+        -------
+        np.ndarray
+            A uint8 matrix with one row per recipe and one column per
+            nutrient of `nutrients`.
+
+        Raises
+        ------
+        ValueError
+            If the grille has too many rows to be encoded on 8 bits.
+        """
+        if self.n_rows > np.iinfo(np.uint8).max:
+            raise ValueError(
+                f'The grille has {self.n_rows} rows, bin codes are limited '
+                f'to {np.iinfo(np.uint8).max} rows.'
+            )
+        codes = np.empty((len(data), len(self.nutrients)), dtype=np.uint8)
+        for j, nutrient in enumerate(self.nutrients):
+            codes[:, j] = self.bin_codes(nutrient, data[nutrient])
+        return codes
+
+    def score_from_codes(self, codes, points=None):
+        """
+        Calculate the NutriScore from a matrix of grille rows.
+
+        Parameters
+        ----------
+        codes : np.ndarray
+            The matrix returned by `bin_code_matrix`.
+        points : array-like, optional
+            New points of each grille row. Defaults to the points of the
+            grille.
+
+        Returns
+        -------
+        np.ndarray
+            The NutriScore of each recipe.
+
+        Raises
+        ------
+        ValueError
+            If the number of points does not match the grille rows.
+        """
+        return BASE_SCORE - self.points_from_codes(codes, points).sum(axis=1)
+
+    def points_from_codes(self, codes, points=None):
+        """
+        Get the points subtracted for each recipe and nutrient.
+
+        Parameters
+        ----------
+        codes : np.ndarray
+            The matrix returned by `bin_code_matrix`.
+        points : array-like, optional
+            New points of each grille row. Defaults to the points of the
+            grille.
+
+        Returns
+        -------
+        np.ndarray
+            The points matrix, with the same shape as `codes`.
+
+        Raises
+        ------
+        ValueError
+            If the number of points does not match the grille rows.
+        """
+        if points is None:
+            lookup = self.points
+        else:
+            points = np.asarray(points, dtype=float)
+            if points.shape != (self.n_rows,):
+                raise ValueError(
+                    f'Expected {self.n_rows} points, got {points.size}.'
+                )
+            lookup = np.append(points, 0.0)
+        return lookup[codes]
+
+    def score(self, data):
+        """
+        Calculate the NutriScore of each row of a dataset.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            The dataset containing the nutritional information for each
+            recipe.
+
+        Returns
+        -------
+        np.ndarray
+            The NutriScore of each recipe.
+        """
+        score = np.full(len(data), BASE_SCORE)
+        for nutrient in self.nutrients:
+            codes = self.bin_codes(nutrient, data[nutrient])
+            score -= self.points[codes]
+        return score
+
+    def score_one(self, dv_values):
+        """
+        Calculate the NutriScore, label and points of a single recipe.
+
+        The grille rows are found with `bisect` on plain lists, which avoids
+        any DataFrame or array allocation.
+
+        Parameters
+        ----------
+        dv_values : dict
+            The daily value percentage of each nutrient of `nutrients`.
+
+        Returns
+        -------
+        dict
+            The NutriScore (`nutriscore`), the label (`label`) and the points
+            subtracted for each nutrient (`points`).
+
+        Raises
+        ------
+        KeyError
+            If a nutrient of the grille is missing from `dv_values`.
+        """
+        score = BASE_SCORE
+        points = {}
+        for nutrient, negated, thresholds in self._thresholds_list:
+            value = float(dv_values[nutrient])
+            if value != value:
+                # Missing values are worth 0 points
+                row = self.n_rows
+            else:
+                row = bisect_left(thresholds, -value if negated else value)
+            points[nutrient] = self._points_list[row]
+            score -= points[nutrient]
+        return {
+            'nutriscore': score,
+            'label': LABELS[bisect_right(LABEL_CUTS, score)],
+            'points': points
+        }
+
+    def score_many(self, values):
+        """
+        Calculate the NutriScore, labels and points of an array of recipes.
+
+        Parameters
+        ----------
+        values : array-like or pd.DataFrame
+            An array with one row per recipe and one column per nutrient of
+            `nutrients`, in the same order, or a DataFrame with these
+            columns.
+
+        Returns
+        -------
+        dict
+            The NutriScore (`nutriscore`), the labels (`label`) and the
+            matrix of points subtracted per recipe and nutrient (`points`).
+
+        Raises
+        ------
+        ValueError
+            If the array does not have one column per nutrient.
+        """
+        if isinstance(values, pd.DataFrame):
+            values = values[self.nutrients].to_numpy(dtype=float)
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+        if values.shape[1] != len(self.nutrients):
+            raise ValueError(
+                f'Expected {len(self.nutrients)} nutrient columns, '
+                f'got {values.shape[1]}.'
+            )
+        points = np.empty(values.shape)
+        for j, nutrient in enumerate(self.nutrients):
+            points[:, j] = self.points[self.bin_codes(nutrient, values[:, j])]
+        score = BASE_SCORE - points.sum(axis=1)
+        labels = np.asarray(LABELS)[
+            np.searchsorted(LABEL_CUTS, score, side='right')
+        ]
+        return {'nutriscore': score, 'label': labels, 'points': points}
+
+
+def assign_labels(scores, cuts=LABEL_CUTS):
+    """
+    Assign NutriScore labels (A-E) to scores with a single `np.digitize`.
+
+    Parameters
+    ----------
+    scores : array-like
+        The NutriScore of each recipe.
+    cuts : sequence
+        The lowest score of the labels D, C, B and A, in ascending order.
+
+    Returns
+    -------
+    pd.Categorical
+        The labels, with ordered categories A to E. Missing scores get a
+        missing label (NaN), where the string labels used to be ''. Both
+        are left out of the label counts and plots. NutriScore never gives
+        a missing score, since missing nutrients score no points.
+
+    Raises
+    ------
+    ValueError
+        If the cut points are not 4 ascending values.
+    """
+    cuts = np.asarray(cuts, dtype=float)
+    if cuts.shape != (len(LABELS) - 1,) or np.any(np.diff(cuts) < 0):
+        raise ValueError(
+            f'Expected {len(LABELS) - 1} ascending cut points, got {cuts}.'
+        )
+    scores = np.asarray(scores, dtype=float)
+    # Bin 0 is below the first cut (E), the last bin is above the last (A)
+    codes = len(cuts) - np.digitize(scores, cuts)
+    codes[np.isnan(scores)] = -1
+    return pd.Categorical.from_codes(
+        codes, categories=LABELS[::-1], ordered=True
+    )
+
+
+class GrilleExplorer:
+    """
+    This class rescores a whole dataset with edited grilles.
+
+    The values of each nutrient are sorted and deduplicated once. For a new
+    grille, the thresholds are only searched over the sorted distinct
+    values, and the points are gathered back to the recipes, so the label
+    distribution of all recipes is updated without rescoring each row.
+    Results are cached by grille fingerprint, in a cache that the threads
+    of the sessions share under a lock.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The dataset containing the nutritional information for each recipe.
+    grillecolname : list
+        The nutrient columns of the grille used for the calculation.
+    cache_size : int
+        The number of grilles whose results are cached.
+
+    Methods
+    -------
+    score(grille)
+        Calculate the NutriScore of all recipes with a grille.
+    bin_counts(grille)
+        Count the recipes in each grille row for each nutrient.
+    label_distribution(grille, cuts=LABEL_CUTS)
+        Get the label counts and shares of all recipes with a grille.
+    """
+    def __init__(self, data, grillecolname=GRILLECOLNAME, cache_size=128):
+        """
+        Method to initialize the GrilleExplorer instance.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            The dataset containing the nutritional information for each
+            recipe.
+        grillecolname : list
+            The nutrient columns of the grille used for the calculation.
+        cache_size : int
+            The number of grilles whose results are cached.
+        """
+        self.n_recipes = len(data)
+        self.grillecolname = list(grillecolname)
+        self.sorted_values = {}
+        self.value_counts = {}
+        self.inverse = {}
+        for nutrient in self.grillecolname:
+            uniques, inverse, counts = np.unique(
+                data[nutrient].to_numpy(dtype=float),
+                return_inverse=True,
+                return_counts=True
+            )
+            self.sorted_values[nutrient] = uniques
+            self.value_counts[nutrient] = counts
+            self.inverse[nutrient] = inverse.astype(np.int32)
+        self._cache = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+
+    def _compile(self, grille):
+        """
+        Compile a grille and get the grille row of each distinct value.
+
+        Parameters
+        ----------
+        grille : pd.DataFrame
+            The nutritional table containing the thresholds for each nutrient.
+
+        Returns
+        -------
+        tuple
+            The compiled grille and a dict of the grille rows of the sorted
+            distinct values of each nutrient.
+        """
+        compiled = CompiledGrille(grille, self.grillecolname)
+        codes = {
+            nutrient: compiled.bin_codes(
+                nutrient, self.sorted_values[nutrient]
+            )
+            for nutrient in compiled.nutrients
+        }
+        return compiled, codes
+
+    def score(self, grille):
+        """
+        Calculate the NutriScore of all recipes with a grille.
+
+        Parameters
+        ----------
+        grille : pd.DataFrame
+            The nutritional table containing the thresholds for each nutrient.
+
+        Returns
+        -------
+        np.ndarray
+            The NutriScore of each recipe.
+        """
+        compiled, codes = self._compile(grille)
+        score = np.full(self.n_recipes, BASE_SCORE)
+        for nutrient, nutrient_codes in codes.items():
+            score -= compiled.points[nutrient_codes][self.inverse[nutrient]]
+        return score
+
+    def bin_counts(self, grille):
+        """
+        Count the recipes in each grille row for each nutrient.
+
+        Parameters
+        ----------
+        grille : pd.DataFrame
+            The nutritional table containing the thresholds for each nutrient.
+
+        Returns
+        -------
+        pd.DataFrame
+            The number of recipes per grille row (and outside the grille, in
+            the last row) and nutrient.
+        """
+        compiled, codes = self._compile(grille)
+        counts = {
+            nutrient: np.bincount(
+                nutrient_codes,
+                weights=self.value_counts[nutrient],
+                minlength=compiled.n_rows + 1
+            ).astype(np.int64)
+            for nutrient, nutrient_codes in codes.items()
+        }
+        index = list(compiled.points[:-1]) + ['outside']
+        return pd.DataFrame(
+            counts, index=pd.Index(index, name='points')
+        )
+
+    def label_distribution(self, grille, cuts=LABEL_CUTS):
+        """
+        Get the label counts and shares of all recipes with a grille.
+
+        Parameters
+        ----------
+        grille : pd.DataFrame
+            The nutritional table containing the thresholds for each nutrient.
+        cuts : sequence
+            The lowest score of the labels D, C, B and A.
+
+        Returns
+        -------
+        pd.DataFrame
+            The number (`count`) and share (`share`) of recipes per label,
+            indexed by label from A to E.
+        """
+        key = data_fingerprint(grille, tuple(cuts))
+        with self._lock:
+            distribution = self._cache.get(key)
+        if distribution is None:
+            labels = assign_labels(self.score(grille), cuts)
+            counts = np.bincount(
+                labels.codes[labels.codes >= 0], minlength=len(LABELS)
+            )
+            distribution = pd.DataFrame(
+                {'count': counts, 'share': counts / max(counts.sum(), 1)},
+                index=pd.Index(labels.categories, name='label')
+            )
+            with self._lock:
+                self._cache[key] = distribution
+            logger.debug(f"What-if label distribution computed: {key}")
+        return distribution.copy()
+
+
+def load_default_grille():
+    """
+    Compile the nutrient table shipped in the assets.
+
+    Returns
+    -------
+    CompiledGrille
+        The compiled grille of `assets/data/nutrient_table.csv`.
+    """
+    grille = pd.read_csv(
+        get_asset_path("data/nutrient_table.csv"), encoding='utf-8-sig'
+    )
+    return CompiledGrille(grille, GRILLECOLNAME)
+
+
+# Grille compiled once at import for the low-latency scoring functions
+DEFAULT_GRILLE = load_default_grille()
+
+
+def score_one(dv_values, grille=None):
+    """
+    Calculate the NutriScore, label and points of a single recipe.
+
+    Parameters
+    ----------
+    dv_values : dict
+        The daily value percentage of each nutrient of the grille.
+    grille : CompiledGrille, optional
+        The compiled grille. Defaults to the nutrient table of the assets.
+
+    Returns
+    -------
+    dict
+        The NutriScore (`nutriscore`), the label (`label`) and the points
+        subtracted for each nutrient (`points`).
+    """
+    return (grille or DEFAULT_GRILLE).score_one(dv_values)
+
+
+def score_many(values, grille=None):
+    """
+    Calculate the NutriScore, labels and points of an array of recipes.
+
+    Parameters
+    ----------
+    values : array-like or pd.DataFrame
+        An array with one column per nutrient of `GRILLECOLNAME`, in the same
+        order, or a DataFrame with these columns.
+    grille : CompiledGrille, optional
+        The compiled grille. Defaults to the nutrient table of the assets.
+
+    Returns
+    -------
+    dict
+        The NutriScore (`nutriscore`), the labels (`label`) and the matrix of
+        points subtracted per recipe and nutrient (`points`).
+    """
+    return (grille or DEFAULT_GRILLE).score_many(values)
+
 
 class NutriScore:
     """
@@ -29,10 +617,16 @@ class NutriScore:
         Calculate the NutriScore for each row in the dataset.
     set_scorelabel()
         Assign NutriScore labels (A-E) based on the calculated scores.
+    relabel(cuts)
+        Assign NutriScore labels (A-E) with new cut points.
+    rescore(points)
+        Recalculate the NutriScore with new points for the grille rows.
+    points_breakdown(points=None)
+        Get the points subtracted for each recipe and nutrient.
     stock_database()
         Store the NutriScore data in a PostgreSQL database
     """
-    def __init__(self, data, grille, configs):
+    def __init__(self, data, grille, configs, keep_bin_codes=False):
         """
         Method to initialize the NutriScore instance.
 
@@ -47,10 +641,18 @@ class NutriScore:
         configs : dict
             A dictionary containing the configuration parameters for the
             NutriScore calculation.
+
+        keep_bin_codes : bool
+            Keep the uint8 matrix of grille rows per recipe and nutrient in
+            `bin_codes`, so that the scores can be recalculated with new
+            points without the raw values.
         """
         self.data = data
         self.grille = grille
         self.configs = configs
+        self.keep_bin_codes = keep_bin_codes
+        self.compiled_grille = None
+        self.bin_codes = None
 
         # Calculate NutriScore and assign labels
         self.nutriscore = self.calcul_nutriscore()
@@ -60,6 +662,9 @@ class NutriScore:
         """
         Calculate the NutriScore for each row in the dataset.
 
+        The grille is compiled into sorted threshold arrays, so the points of
+        every recipe are found in one pass per nutrient.
+
         Parameters
         ----------
         None
@@ -72,43 +677,104 @@ class NutriScore:
         Raises
         ------
         ValueError
-            If the column "nutriscore" is missing from the dataframe.        
+            If the thresholds of a nutrient are not sorted in ascending order.
         """
         data = self.data.copy()
-        data['nutriscore'] = 14.0  # Start with a base score of 14
-
-        grillecolname = self.configs['grillecolname']
-
-        for nutrient in grillecolname:
-            if nutrient in self.grille.columns:
-                nutrient_grille = self.grille
-                nutrient_values = data[nutrient].values
-
-                for i, grille_row in nutrient_grille.iterrows():
-                    prev_value = -np.inf if i == 0 else \
-                                 nutrient_grille[nutrient].iloc[i - 1]
-                    if np.isnan(grille_row[nutrient]):
-                        # Handle the last range where the upper limit is 
-                        # undefined
-                        mask = (-nutrient_values > prev_value) if \
-                            nutrient == "dv_protein_%" else \
-                                (nutrient_values > prev_value)
-                        data.loc[mask, 'nutriscore'] -= grille_row['points']
-                        break
-                    # Apply the NutriScore logic for valid ranges
-                    mask = (-nutrient_values > prev_value) & \
-                        (-nutrient_values <= grille_row[nutrient]) if \
-                            nutrient == "dv_protein_%" else \
-                           (nutrient_values > prev_value) & \
-                            (nutrient_values <= grille_row[nutrient])
-                    data.loc[mask, 'nutriscore'] -= grille_row['points']
+
+        grille = CompiledGrille(self.grille, self.configs['grillecolname'])
+        self.compiled_grille = grille
+        if self.keep_bin_codes:
+            self.bin_codes = grille.bin_code_matrix(data)
+            data['nutriscore'] = grille.score_from_codes(self.bin_codes)
+        else:
+            data['nutriscore'] = grille.score(data)
 
         return data
+
+    def rescore(self, points):
+        """
+        Recalculate the NutriScore with new points for the grille rows.
+
+        The thresholds are unchanged, so the scores are a gather and sum
+        over the kept bin codes.
+
+        Parameters
+        ----------
+        points : array-like
+            The new `points` column of the grille.
+
+        Returns
+        -------
+        pd.Series
+            The recalculated NutriScore of each recipe.
+
+        Raises
+        ------
+        ValueError
+            If the bin codes were not kept, or if the number of points does
+            not match the grille rows.
+        """
+        codes = self._get_bin_codes()
+        return pd.Series(
+            self.compiled_grille.score_from_codes(codes, points),
+            index=self.nutriscore.index,
+            name='nutriscore'
+        )
+
+    def points_breakdown(self, points=None):
+        """
+        Get the points subtracted for each recipe and nutrient.
+
+        Parameters
+        ----------
+        points : array-like, optional
+            New points of the grille rows. Defaults to the grille points.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame with one column of points per nutrient.
+
+        Raises
+        ------
+        ValueError
+            If the bin codes were not kept, or if the number of points does
+            not match the grille rows.
+        """
+        codes = self._get_bin_codes()
+        return pd.DataFrame(
+            self.compiled_grille.points_from_codes(codes, points),
+            index=self.nutriscore.index,
+            columns=self.compiled_grille.nutrients
+        )
+
+    def _get_bin_codes(self):
+        """
+        Get the kept bin codes.
+
+        Returns
+        -------
+        np.ndarray
+            The uint8 matrix of grille rows per recipe and nutrient.
+
+        Raises
+        ------
+        ValueError
+            If the bin codes were not kept.
+        """
+        if self.bin_codes is None:
+            raise ValueError(
+                'The bin codes were not kept, use keep_bin_codes=True.'
+            )
+        return self.bin_codes
     
     def set_scorelabel(self):
         """
         Assigns NutriScore labels (A-E) based on the calculated scores.
 
+        The cut points are read from the `label_cuts` configuration, with
+        `LABEL_CUTS` as default.
+
         Parameters
         ----------
         None
@@ -116,7 +782,8 @@ class NutriScore:
         Returns
         -------
         pd.DataFrame
-            A DataFrame containing the NutriScore labels for each recipe.
+            A copy of the scores with the ordered categorical NutriScore
+            label of each recipe.
 
         Raises
         ------
@@ -129,67 +796,267 @@ class NutriScore:
                 'The column "nutriscore" is missing from the dataframe.'
             )
 
-        # Assign labels based on score thresholds
-        score['label'] = ''
-        score.loc[score['nutriscore'] >= 12, 'label'] = 'A'
-        score.loc[
-            (score['nutriscore'] >= 9) & (score['nutriscore'] < 12),
-            'label'
-        ] = 'B'
-        score.loc[
-            (score['nutriscore'] >= 6) & (score['nutriscore'] < 9),
-            'label'
-        ] = 'C'
-        score.loc[
-            (score['nutriscore'] >= 3) & (score['nutriscore'] < 6),
-            'label'
-        ] = 'D'
-        score.loc[score['nutriscore'] < 3, 'label'] = 'E'
-        
-        return score
+        # Assign labels based on score thresholds, without modifying the
+        # scores
+        cuts = self.configs.get('label_cuts', LABEL_CUTS)
+        return score.assign(label=assign_labels(score['nutriscore'], cuts))
+
+    def relabel(self, cuts):
+        """
+        Assign NutriScore labels (A-E) with new cut points.
+
+        Parameters
+        ----------
+        cuts : sequence
+            The lowest score of the labels D, C, B and A.
+
+        Returns
+        -------
+        pd.Series
+            The ordered categorical labels of each recipe.
+        """
+        return pd.Series(
+            assign_labels(self.nutriscore['nutriscore'], cuts),
+            index=self.nutriscore.index,
+            name='label'
+        )
+
+    def stock_database(self, table_name='NS_withOutliers'):
+        """
+        Stores the NutriScore data in the PostgreSQL database.
+
+        Parameters
+        ----------
+        table_name : str
+            The name of the table to replace with the NutriScore data.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        Exception
+            If an error occurs while storing the data in the database.
+        """
+        db_instance.write_data(
+            self.nutriscore_label, table_name, if_exists='replace'
+        )
+        logger.info(
+            f"NutriScore data successfully stored in {table_name}."
+        )
+
+
+class NutriScoreBatchJob:
+    """
+    This class scores normalized nutrition data chunk by chunk.
+
+    Each chunk is read from the database, scored with the compiled grille,
+    labelled and written to a staging table or Parquet file while the next
+    chunk is read and scored. Memory is bounded by a few chunks whatever the
+    size of the source table. Once every chunk is written, the staging
+    table and file replace the targets, so a failed run leaves the previous
+    results in place.
+
+    Parameters
+    ----------
+    grille : pd.DataFrame
+        The nutritional table containing the thresholds for each nutrient.
+    chunksize : int
+        The number of rows read, scored and written at once.
+    database : Database
+        The database to read the nutrition data from and to write the
+        NutriScore data to.
+
+    Methods
+    -------
+    score_chunk(chunk)
+        Calculate the NutriScore and label of a chunk of recipes.
+    run(source_table, target_table=None, parquet_path=None)
+        Score a whole table and stream the results.
+    """
+    def __init__(self, grille, chunksize=50000, database=None):
+        """
+        Method to initialize the NutriScoreBatchJob instance.
+
+        Parameters
+        ----------
+        grille : pd.DataFrame
+            The nutritional table containing the thresholds for each nutrient.
+        chunksize : int
+            The number of rows read, scored and written at once.
+        database : Database, optional
+            The database to read from and to write to. Defaults to the
+            application database instance.
+        """
+        self.grille = CompiledGrille(grille, GRILLECOLNAME)
+        self.chunksize = chunksize
+        self.database = database if database is not None else db_instance
+
+    def score_chunk(self, chunk):
+        """
+        Calculate the NutriScore and label of a chunk of recipes.
+
+        Parameters
+        ----------
+        chunk : pd.DataFrame
+            The normalized nutrition data of the recipes.
+
+        Returns
+        -------
+        pd.DataFrame
+            The chunk with the `nutriscore` and `label` columns.
+        """
+        scored = self.grille.score_many(chunk)
+        return chunk.assign(
+            nutriscore=scored['nutriscore'],
+            label=assign_labels(scored['nutriscore'])
+        )
+
+    def run(self, source_table, target_table=None, parquet_path=None):
+        """
+        Score a whole table and stream the results.
+
+        Parameters
+        ----------
+        source_table : str
+            The table of normalized nutrition data to score.
+        target_table : str, optional
+            The table replaced with the NutriScore data. The chunks are
+            written to `<target_table>_staging`, renamed to the target once
+            they are all written.
+        parquet_path : str, optional
+            The Parquet file written with the NutriScore data, one row group
+            per chunk. The chunks are written to `<parquet_path>.partial`,
+            moved to the path once they are all written.
+
+        Returns
+        -------
+        int
+            The number of scored recipes.
+
+        Raises
+        ------
+        ValueError
+            If neither a target table nor a Parquet path is given.
+        """
+        if target_table is None and parquet_path is None:
+            raise ValueError(
+                'A target table or a Parquet path is required.'
+            )
+        query = f'SELECT * FROM "{source_table}"'
+        sink = _NutriScoreSink(self.database, target_table, parquet_path)
+        start = time.perf_counter()
+        n_rows = 0
+        pending = None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            try:
+                chunks = self.database.fetch_chunks(query, self.chunksize)
+                for chunk in chunks:
+                    scored = self.score_chunk(chunk)
+                    # Keep a single write in flight while the next chunk
+                    # is read and scored
+                    if pending is not None:
+                        pending.result()
+                    pending = executor.submit(sink.write, scored)
+                    n_rows += len(scored)
+                    elapsed = time.perf_counter() - start
+                    logger.info(
+                        f"{source_table}: {n_rows} rows scored "
+                        f"({n_rows / elapsed:.0f} rows/s)"
+                    )
+                if pending is not None:
+                    pending.result()
+            finally:
+                sink.close()
+        sink.commit()
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"{source_table} scored in {elapsed:.2f} s: {n_rows} rows, "
+            f"{n_rows / max(elapsed, 1e-9):.0f} rows/s"
+        )
+        return n_rows
+
 
-    # def stock_database(self):
-    #     """
-    #     Stores the NutriScore data in a PostgreSQL database.
-
-    #     Parameters
-    #     ----------
-    #     None
-
-    #     Returns
-    #     -------
-    #     None
-
-    #     Raises
-    #     ------
-    #     Exception
-    #         If an error occurs while storing the data in the database.        
-    #     """
-    #     secrets = toml.load('secrets.toml')
-    #     postgresql_config = secrets['connections']['postgresql']
-    #     try:
-    #         # Establish a database connection
-    #         engine = create_engine(f'postgresql://{postgresql_config["username"]}:{postgresql_config["password"]}'
-    #                                f'@{postgresql_config["host"]}:{postgresql_config["port"]}/{postgresql_config["database"]}')
-    #         with engine.connect() as conn:
-    #             # Save the NutriScore data to the database
-    #             self.nutriscore_label.to_sql(
-    #                 'NS_withOutliers',
-    #                 conn,
-    #                 if_exists='replace',
-    #                 index=False
-    #             )
-    #             logging.info(
-    #                 "NutriScore data successfully stored in the database."
-    #             )
-    #     except Exception as e:
-    #         logging.error(f"Error storing data in the database: {e}")
+class _NutriScoreSink:
+    """
+    Write scored chunks to a staging table and/or Parquet file, which
+    replace the targets on commit.
+    """
+
+    def __init__(self, database, target_table, parquet_path):
+        """
+        Initialize the sink.
+
+        Parameters
+        ----------
+        database : Database
+            The database to write the table to.
+        target_table : str or None
+            The table replaced on commit.
+        parquet_path : str or None
+            The Parquet file replaced on commit.
+        """
+        self.database = database
+        self.target_table = target_table
+        self.parquet_path = parquet_path
+        self.parquet_writer = None
+        self.if_exists = 'replace'
+        if target_table is not None:
+            self.staging_table = f'{target_table}_staging'
+        if parquet_path is not None:
+            self.partial_path = f'{parquet_path}.partial'
+
+    def write(self, chunk):
+        """
+        Write a scored chunk.
+
+        Parameters
+        ----------
+        chunk : pd.DataFrame
+            The scored chunk.
+        """
+        if self.target_table is not None:
+            # The staging table left by a failed run is replaced
+            self.database.write_data(
+                chunk, self.staging_table, if_exists=self.if_exists
+            )
+            self.if_exists = 'append'
+        if self.parquet_path is not None:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(
+                    self.partial_path, table.schema
+                )
+            self.parquet_writer.write_table(table)
+
+    def close(self):
+        """Close the Parquet file."""
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+    def commit(self):
+        """Replace the targets with the written chunks, if any."""
+        if self.target_table is not None and self.if_exists == 'append':
+            self.database.replace_table(self.staging_table, self.target_table)
+        if self.parquet_writer is not None:
+            os.replace(self.partial_path, self.parquet_path)
 
 
 class Plot:
     """
     This class generates and saves distribution plots for the NutriScore data.
 
+    The plots are drawn on `matplotlib.figure.Figure` objects rendered with
+    the non-interactive Agg canvas, so nothing depends on the global pyplot
+    state and no window is opened. Rendered plots are cached by data
+    fingerprint and plot parameters, in a cache shared by all instances and
+    guarded by a lock.
+
     Parameters
     ----------
     data : pd.Series
@@ -205,11 +1072,19 @@ class Plot:
 
     Methods
     -------
+    render_distribution(bins=20, fmt='png')
+        Render a histogram of the data.
+    render_distribution_label(labels, fmt='png')
+        Render a count plot for the NutriScore labels.
     plot_distribution()
         Plot and save a histogram of the data.
     plot_distribution_label(labels)
         Plot and save a count plot for the NutriScore labels
     """
+    # Rendered plots shared by all instances
+    _cache = LRUCache(maxsize=64)
+    _lock = threading.Lock()
+
     def __init__(
             self,
             data,
@@ -240,6 +1115,65 @@ class Plot:
         self.ylabel = ylabel
         self.output_path = output_path
 
+    def render_distribution(self, bins=20, fmt='png'):
+        """
+        Render a histogram of the data.
+
+        Parameters
+        ----------
+        bins : int
+            The number of bins of the histogram.
+        fmt : str
+            The output format: 'png' or 'svg' for image bytes, 'plotly' for
+            the JSON of a plotly figure.
+
+        Returns
+        -------
+        bytes or str
+            The rendered plot.
+        """
+        def draw_matplotlib(ax, data):
+            ax.hist(data, bins=bins, edgecolor='k', alpha=0.7)
+
+        def draw_plotly(data):
+            return px.histogram(x=data, nbins=bins)
+
+        return self._render(
+            ('distribution', bins), fmt, draw_matplotlib, draw_plotly
+        )
+
+    def render_distribution_label(self, labels, fmt='png'):
+        """
+        Render a count plot for the NutriScore labels.
+
+        Parameters
+        ----------
+        labels : list
+            List of labels to be plotted.
+        fmt : str
+            The output format: 'png' or 'svg' for image bytes, 'plotly' for
+            the JSON of a plotly figure.
+
+        Returns
+        -------
+        bytes or str
+            The rendered plot.
+        """
+        labels = list(labels)
+
+        def draw_matplotlib(ax, data):
+            sns.countplot(x=data, order=labels, ax=ax)
+
+        def draw_plotly(data):
+            return px.histogram(
+                x=data, category_orders={'x': labels}
+            )
+
+        return self._render(
+            ('distribution_label', tuple(labels)), fmt,
+            draw_matplotlib, draw_plotly
+        )
+
     def plot_distribution(self):
         """
         Plot and save a histogram of the data.
@@ -247,39 +1181,145 @@ class Plot:
         Parameters
         ----------
         None
-        
+
         Returns
         -------
-        None
+        bytes
+            The PNG image of the plot.
         """
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.hist(self.data, bins=20, edgecolor='k', alpha=0.7)
-        ax.set_title(self.title)
-        ax.set_xlabel(self.xlabel)
-        ax.set_ylabel(self.ylabel)
-        plt.savefig(self.output_path)
-        plt.show()
+        image = self.render_distribution()
+        self._save(image)
+        return image
 
     def plot_distribution_label(self, labels):
         """
         Plot and save a count plot for the NutriScore labels.
-        
+
         Parameters
         ----------
         labels : list
-            List of labels to be plotted.  
+            List of labels to be plotted.
 
         Returns
         -------
-        None
+        bytes
+            The PNG image of the plot.
+        """
+        image = self.render_distribution_label(labels)
+        self._save(image)
+        return image
+
+    def _render(self, params, fmt, draw_matplotlib, draw_plotly):
+        """
+        Render a plot, or get it from the cache.
+
+        Parameters
+        ----------
+        params : tuple
+            The kind of plot and its parameters.
+        fmt : str
+            The output format: 'png', 'svg' or 'plotly'.
+        draw_matplotlib : callable
+            Draw the data on a matplotlib Axes.
+        draw_plotly : callable
+            Build the plotly figure of the data.
+
+        Returns
+        -------
+        bytes or str
+            The rendered plot.
+
+        Raises
+        ------
+        ValueError
+            If the output format is not supported.
         """
-        fig, ax = plt.subplots(figsize=(10, 6))
-        sns.countplot(x=self.data, order=labels)
-        ax.set_title(self.title)
-        ax.set_xlabel(self.xlabel)
-        ax.set_ylabel(self.ylabel)
-        plt.savefig(self.output_path)
-        plt.show()
+        if fmt not in ('png', 'svg', 'plotly'):
+            raise ValueError(f'Unsupported plot format: {fmt}')
+        data = pd.Series(self.data)
+        key = data_fingerprint(
+            data, params, fmt, self.title, self.xlabel, self.ylabel
+        )
+        with self._lock:
+            output = self._cache.get(key)
+        if output is not None:
+            logger.debug(f"Plot served from cache: {params}")
+            return output
+
+        if fmt == 'plotly':
+            fig = draw_plotly(data)
+            fig.update_layout(
+                title=self.title,
+                xaxis_title=self.xlabel,
+                yaxis_title=self.ylabel
+            )
+            output = fig.to_json()
+        else:
+            fig = Figure(figsize=(10, 6))
+            FigureCanvasAgg(fig)
+            ax = fig.add_subplot()
+            draw_matplotlib(ax, data)
+            ax.set_title(self.title)
+            ax.set_xlabel(self.xlabel)
+            ax.set_ylabel(self.ylabel)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=fmt)
+            output = buffer.getvalue()
+
+        with self._lock:
+            self._cache[key] = output
+        return output
+
+    def _save(self, output):
+        """
+        Write a rendered plot to the output path, if any.
+
+        Parameters
+        ----------
+        output : bytes or str
+            The rendered plot.
+        """
+        if self.output_path is None:
+            return
+        mode = 'w' if isinstance(output, str) else 'wb'
+        with open(self.output_path, mode) as f:
+            f.write(output)
+
+
+def render_batch(plots, fmt='png'):
+    """
+    Render many plots in one process.
+
+    The figures are not registered with pyplot, so they are released as
+    soon as they are rendered.
+
+    Parameters
+    ----------
+    plots : iterable
+        Dicts of `Plot` arguments, with an optional `labels` entry to render
+        a count plot of labels instead of a histogram.
+    fmt : str
+        The output format: 'png', 'svg' or 'plotly'.
+
+    Returns
+    -------
+    list
+        The rendered plots, in the same order. Plots with an `output_path`
+        are also written to it.
+    """
+    outputs = []
+    for spec in plots:
+        spec = dict(spec)
+        labels = spec.pop('labels', None)
+        plot = Plot(**spec)
+        if labels is None:
+            output = plot.render_distribution(fmt=fmt)
+        else:
+            output = plot.render_distribution_label(labels, fmt=fmt)
+        plot._save(output)
+        outputs.append(output)
+    logger.info(f"{len(outputs)} plots rendered")
+    return outputs
 
 
 def main():
@@ -346,6 +1386,62 @@ def main():
     ).plot_distribution_label(labels=['A', 'B', 'C', 'D', 'E'])
 
 
+def run_batch_scoring(chunksize=50000, parquet_dir=None):
+    """
+    Score the normalized nutrition tables chunk by chunk.
+
+    `nutrition_withOutliers` is streamed to `NS_withOutliers` and
+    `nutrition_noOutliers` to `NS_noOutliers`, or to Parquet files of the
+    same names when a directory is given.
+
+    Parameters
+    ----------
+    chunksize : int
+        The number of rows read, scored and written at once.
+    parquet_dir : str, optional
+        The directory of the Parquet files. The database tables are written
+        when it is not given.
+
+    Returns
+    -------
+    None
+    """
+    df_grille = db_instance.fetch_data("SELECT * FROM nutrient_table")
+    job = NutriScoreBatchJob(df_grille, chunksize=chunksize)
+    tables = {
+        'nutrition_withOutliers': 'NS_withOutliers',
+        'nutrition_noOutliers': 'NS_noOutliers'
+    }
+    for source_table, target_table in tables.items():
+        if parquet_dir is None:
+            job.run(source_table, target_table=target_table)
+        else:
+            job.run(
+                source_table,
+                parquet_path=os.path.join(
+                    parquet_dir, f'{target_table}.parquet'
+                )
+            )
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='score the nutrition tables chunk by chunk')
+    parser.add_argument(
+        '--chunksize',
+        type=int,
+        default=50000,
+        help='number of rows scored at once in batch mode')
+    parser.add_argument(
+        '--parquet_dir',
+        type=str,
+        default=None,
+        help='write Parquet files instead of database tables in batch mode')
+    args = parser.parse_args()
+    if args.batch:
+        run_batch_scoring(args.chunksize, args.parquet_dir)
+    else:
+        main()
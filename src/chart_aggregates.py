@@ -0,0 +1,293 @@
+import logging
+import threading
+
+import numpy as np
+import plotly.graph_objects as go
+from cachetools import LRUCache
+
+from core.fingerprint import data_fingerprint
+
+logger = logging.getLogger("chart_aggregates")
+
+# Aggregates are small (a few kilobytes), so many of them can be kept
+_histogram_cache = LRUCache(maxsize=256)
+_box_cache = LRUCache(maxsize=256)
+# Streamlit runs the sessions in threads, which share the caches
+_cache_lock = threading.Lock()
+
+
+def dataset_version(data):
+    """
+    Get the version of a dataset, used as the cache key of its aggregates.
+
+    Parameters
+    ----------
+    data : pd.DataFrame or pd.Series
+        The dataset.
+
+    Returns
+    -------
+    str
+        The fingerprint of the dataset.
+    """
+    return data_fingerprint(data)
+
+
+def _cached(cache, key, compute):
+    """
+    Get an aggregate from a cache, computing it on a miss.
+
+    The lookups and insertions are made under a lock, the computation out
+    of it. The arrays of the aggregate are made read-only, since they are
+    shared by every caller.
+
+    Parameters
+    ----------
+    cache : LRUCache
+        The cache of the aggregates.
+    key : tuple
+        The key of the aggregate.
+    compute : callable
+        The function computing the aggregate, as a dict.
+
+    Returns
+    -------
+    dict
+        A copy of the cached aggregate.
+    """
+    with _cache_lock:
+        result = cache.get(key)
+    if result is None:
+        result = compute()
+        for value in result.values():
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+        with _cache_lock:
+            cache[key] = result
+    return dict(result)
+
+
+def _column_values(data, column, value_range=None):
+    """
+    Get the non-missing values of a column, within an optional range.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The dataset.
+    column : str
+        The column to aggregate.
+    value_range : tuple, optional
+        The (min, max) bounds of the values to keep, both included.
+
+    Returns
+    -------
+    np.ndarray
+        The values of the column.
+    """
+    values = data[column].to_numpy(dtype=float)
+    values = values[~np.isnan(values)]
+    if value_range is not None:
+        low, high = value_range
+        values = values[(values >= low) & (values <= high)]
+    return values
+
+
+def histogram(data, column, bins=20, value_range=None, version=None):
+    """
+    Count the values of a column in bins of equal width.
+
+    The counts are cached by (dataset version, column, bins, range), so
+    moving a slider back to a previous position does not scan the column
+    again. The returned arrays are read-only.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The dataset.
+    column : str
+        The column to aggregate.
+    bins : int
+        The number of bins.
+    value_range : tuple, optional
+        The (min, max) bounds of the histogram. Values outside are ignored.
+        Defaults to the range of the column.
+    version : str, optional
+        The version of the dataset, computed with `dataset_version` if not
+        given. Pass the version computed when the dataset was loaded, to
+        avoid hashing the dataset on every call.
+
+    Returns
+    -------
+    dict
+        The bin 'counts', the bin 'edges' and the 'count' of values.
+    """
+    if version is None:
+        version = dataset_version(data)
+    key = (version, column, int(bins),
+           None if value_range is None else tuple(map(float, value_range)))
+
+    def compute():
+        values = _column_values(data, column)
+        if values.size == 0:
+            counts, edges = np.zeros(int(bins), dtype=np.int64), \
+                np.linspace(0, 1, int(bins) + 1)
+        else:
+            counts, edges = np.histogram(
+                values, bins=int(bins), range=value_range
+            )
+        logger.debug(f"Histogram of {column} computed with {bins} bins")
+        return {
+            'counts': counts,
+            'edges': edges,
+            'count': int(counts.sum())
+        }
+    return _cached(_histogram_cache, key, compute)
+
+
+def box_stats(data, column, value_range=None, whisker=1.5, max_outliers=500,
+              version=None):
+    """
+    Compute the statistics of a box plot of a column.
+
+    The quartiles use the linear interpolation of plotly. The whiskers end
+    at the most extreme values within `whisker` interquartile ranges of the
+    quartiles, and the values beyond are outliers. At most `max_outliers`
+    of them are kept, evenly spaced in rank so that the extremes and the
+    shape of the tails are preserved. The returned outliers are read-only.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The dataset.
+    column : str
+        The column to aggregate.
+    value_range : tuple, optional
+        The (min, max) bounds of the values to keep, both included.
+    whisker : float
+        The length of the whiskers, in interquartile ranges.
+    max_outliers : int
+        The maximum number of outliers kept.
+    version : str, optional
+        The version of the dataset, computed with `dataset_version` if not
+        given. Pass the version computed when the dataset was loaded, to
+        avoid hashing the dataset on every call.
+
+    Returns
+    -------
+    dict
+        The 'q1', 'median', 'q3', 'mean', 'lowerfence', 'upperfence',
+        'count', 'n_outliers' and the sample of 'outliers'.
+    """
+    if version is None:
+        version = dataset_version(data)
+    key = (version, column,
+           None if value_range is None else tuple(map(float, value_range)),
+           float(whisker), int(max_outliers))
+
+    def compute():
+        values = np.sort(_column_values(data, column, value_range))
+        if values.size == 0:
+            stats = {
+                'q1': np.nan, 'median': np.nan, 'q3': np.nan,
+                'mean': np.nan, 'lowerfence': np.nan, 'upperfence': np.nan,
+                'count': 0, 'n_outliers': 0, 'outliers': np.empty(0)
+            }
+        else:
+            q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+            iqr = q3 - q1
+            inside = values[
+                (values >= q1 - whisker * iqr) & (values <= q3 + whisker * iqr)
+            ]
+            lowerfence, upperfence = inside[0], inside[-1]
+            outliers = values[(values < lowerfence) | (values > upperfence)]
+            n_outliers = outliers.size
+            if n_outliers > max_outliers:
+                keep = np.linspace(0, n_outliers - 1, max_outliers)
+                outliers = outliers[np.unique(keep.round().astype(int))]
+            stats = {
+                'q1': q1, 'median': median, 'q3': q3,
+                'mean': values.mean(),
+                'lowerfence': lowerfence, 'upperfence': upperfence,
+                'count': int(values.size), 'n_outliers': int(n_outliers),
+                'outliers': outliers
+            }
+        logger.debug(f"Box plot statistics of {column} computed")
+        return stats
+    return _cached(_box_cache, key, compute)
+
+
+def histogram_figure(hist, title=None, color=None):
+    """
+    Build a bar chart from histogram counts.
+
+    Parameters
+    ----------
+    hist : dict
+        The histogram returned by `histogram`.
+    title : str, optional
+        The title of the figure.
+    color : str, optional
+        The color of the bars.
+
+    Returns
+    -------
+    go.Figure
+        The histogram figure.
+    """
+    edges = hist['edges']
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=hist['counts'],
+        width=np.diff(edges),
+        marker_color=color,
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate='[%{customdata[0]:.3g}, %{customdata[1]:.3g}]'
+                      '<br>count: %{y}<extra></extra>'
+    ))
+    fig.update_layout(title=title, bargap=0)
+    return fig
+
+
+def box_figure(stats, title=None, name=None, color=None):
+    """
+    Build a box plot from precomputed statistics.
+
+    Parameters
+    ----------
+    stats : dict
+        The statistics returned by `box_stats`.
+    title : str, optional
+        The title of the figure.
+    name : str, optional
+        The name of the box.
+    color : str, optional
+        The color of the box and of the outliers.
+
+    Returns
+    -------
+    go.Figure
+        The box plot figure.
+    """
+    name = name or ''
+    fig = go.Figure(go.Box(
+        x=[name],
+        q1=[stats['q1']],
+        median=[stats['median']],
+        q3=[stats['q3']],
+        mean=[stats['mean']],
+        lowerfence=[stats['lowerfence']],
+        upperfence=[stats['upperfence']],
+        name=name,
+        marker_color=color
+    ))
+    if len(stats['outliers']):
+        fig.add_trace(go.Scatter(
+            x=[name] * len(stats['outliers']),
+            y=stats['outliers'],
+            mode='markers',
+            name=f"outliers ({stats['n_outliers']})",
+            marker_color=color
+        ))
+    fig.update_layout(title=title, showlegend=False)
+    return fig
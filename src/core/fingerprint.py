@@ -0,0 +1,46 @@
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("core.fingerprint")
+
+
+def data_fingerprint(*objects) -> str:
+    """
+    Compute a stable fingerprint of datasets and parameters.
+
+    DataFrames and Series are hashed row by row with
+    `pd.util.hash_pandas_object`, together with their column names, and
+    numpy arrays through their raw bytes. Any other object is hashed through
+    its `repr`. The fingerprint is used as a cache key for results derived
+    from the data.
+
+    Args:
+        *objects: The datasets and parameters to fingerprint.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the objects.
+    """
+    digest = hashlib.sha256()
+    for obj in objects:
+        if isinstance(obj, (pd.DataFrame, pd.Series)):
+            columns = obj.columns if isinstance(obj, pd.DataFrame) \
+                else [obj.name]
+            digest.update(repr(list(columns)).encode())
+            digest.update(
+                pd.util.hash_pandas_object(obj, index=True).to_numpy()
+                .tobytes()
+            )
+        elif isinstance(obj, np.ndarray):
+            digest.update(f"{obj.dtype}{obj.shape}".encode())
+            digest.update(np.ascontiguousarray(obj).tobytes())
+        else:
+            digest.update(repr(obj).encode())
+        # Separator so that consecutive objects cannot be confused
+        digest.update(b"\x00")
+
+    fingerprint = digest.hexdigest()
+    logger.debug(f"Data fingerprint: {fingerprint}")
+    return fingerprint
@@ -1,6 +1,6 @@
 import os
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 import streamlit as st
 import logging
 
@@ -69,6 +69,116 @@ class Database:
                 results.append(None)
         return tuple(results)
 
+    def fetch_chunks(self, query: str, chunksize: int):
+        """
+        Execute a SQL query and yield the results in chunks.
+
+        The rows are streamed with a server-side cursor, so only one chunk
+        is held in memory at a time.
+
+        Parameters:
+            query (str): The SQL query to execute.
+            chunksize (int): The maximum number of rows of each chunk.
+
+        Yields:
+            pd.DataFrame: The next chunk of the query results.
+        """
+        logger.debug(f"Streaming query in chunks of {chunksize}: {query}")
+        with self.engine.connect().execution_options(
+                stream_results=True) as conn:
+            for chunk in pd.read_sql_query(query, conn, chunksize=chunksize):
+                yield chunk
+        logger.debug(f"Query streamed successfully: {query}")
+
+    def write_data(self, data: pd.DataFrame, table_name: str,
+                   if_exists: str = "append", chunksize: int = 10000) -> None:
+        """
+        Write a DataFrame to a table with multi-row inserts.
+
+        Parameters:
+            data (pd.DataFrame): The data to write.
+            table_name (str): The name of the target table.
+            if_exists (str): Behaviour when the table exists, "append" or
+                "replace".
+            chunksize (int): The number of rows of each insert statement.
+
+        Raises:
+            Exception: If the data cannot be written to the table.
+        """
+        try:
+            logger.debug(f"Writing {len(data)} rows to {table_name}")
+            data.to_sql(
+                table_name,
+                self.engine,
+                if_exists=if_exists,
+                index=False,
+                method="multi",
+                chunksize=chunksize
+            )
+        except Exception as e:
+            logger.error(f"An error occurred while writing {table_name}: {e}")
+            raise
+
+    def write_tables(self, tables: dict, if_exists: str = "replace",
+                     chunksize: int = 10000) -> None:
+        """
+        Write several DataFrames to their tables in a single transaction.
+
+        Either every table is written or, if one of them fails, none of
+        them is changed.
+
+        Parameters:
+            tables (dict): The DataFrame to write to each table name.
+            if_exists (str): Behaviour when a table exists, "append" or
+                "replace".
+            chunksize (int): The number of rows of each insert statement.
+
+        Raises:
+            Exception: If one of the tables cannot be written.
+        """
+        try:
+            with self.engine.begin() as conn:
+                for table_name, data in tables.items():
+                    logger.debug(f"Writing {len(data)} rows to {table_name}")
+                    data.to_sql(
+                        table_name,
+                        conn,
+                        if_exists=if_exists,
+                        index=False,
+                        method="multi",
+                        chunksize=chunksize
+                    )
+        except Exception as e:
+            logger.error(
+                f"An error occurred while writing {', '.join(tables)}: {e}"
+            )
+            raise
+
+    def replace_table(self, source: str, target: str) -> None:
+        """
+        Replace a table by another one, renamed in a single transaction.
+
+        Readers see either the previous target table or the new one, never
+        a partially written table.
+
+        Parameters:
+            source (str): The name of the table replacing the target.
+            target (str): The name of the replaced table.
+
+        Raises:
+            Exception: If the table cannot be replaced.
+        """
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(text(f'DROP TABLE IF EXISTS "{target}"'))
+                conn.execute(
+                    text(f'ALTER TABLE "{source}" RENAME TO "{target}"')
+                )
+            logger.debug(f"Table {target} replaced by {source}")
+        except Exception as e:
+            logger.error(f"An error occurred while replacing {target}: {e}")
+            raise
+
     def close_connection(self) -> None:
         """
         Close the database connection.
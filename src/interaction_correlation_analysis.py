@@ -1,5 +1,8 @@
+import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from functools import reduce
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
@@ -50,6 +53,29 @@ class InteractionData:
         else:
             self.data = data
             logger.info("Data provided directly.")
+        self.aggregator = None
+
+    @classmethod
+    def from_aggregates(cls, aggregates):
+        """
+        Method to initialize the class from persisted per-recipe
+        aggregates instead of the interactions.
+
+        Parameters
+        ----------
+        aggregates: pd.DataFrame
+            The aggregates table written by `InteractionAggregator.save`.
+
+        Returns
+        -------
+        interaction_data: InteractionData
+            The analysis of the aggregated interactions.
+        """
+        interaction_data = cls(data=None)
+        interaction_data.aggregator = InteractionAggregator.from_frame(
+            aggregates
+        )
+        return interaction_data
 
     def interactions_df(self):
         """
@@ -66,43 +92,25 @@ class InteractionData:
         result: DataFrame
             The result of the computation.
         """
+        if self.aggregator is not None:
+            return self.aggregator.result()
         logger.debug("Starting interactions_df computation.")
-        data_filtered = self.data.dropna(subset=['rating', 'review'])
-        interaction_count = (
+        # Only the grouped columns are copied, not the review texts
+        complete = self.data['rating'].notna() & self.data['review'].notna()
+        data_filtered = self.data.loc[complete, ['recipe_id', 'rating']]
+        # All the statistics in a single groupby pass
+        result = (
             data_filtered
             .groupby('recipe_id')
-            .size()
-            .reset_index(name='interaction_count')
-        )
-        logger.debug(f"Interaction count computed: {interaction_count.head()}")
-
-        review_count = (
-            data_filtered
-            .groupby('recipe_id')['rating']
-            .count()
-            .reset_index(name='review_count')
-        )
-        rating_count = (
-            data_filtered
-            .groupby('recipe_id')['rating']
-            .count()
-            .reset_index(name='rating_count')
-        )
-        average_rating = (
-            data_filtered
-            .groupby('recipe_id')['rating']
-            .mean()
-            .reset_index(name='average_rating')
-        )
-
-        dfs = [interaction_count, review_count, rating_count, average_rating]
-        logger.debug(f"Merging dataframes: {[df.shape for df in dfs]}")
-
-        result = reduce(
-            lambda left,
-            right: pd.merge(left, right, on='recipe_id'),
-            dfs
+            .agg(
+                interaction_count=('rating', 'size'),
+                review_count=('rating', 'count'),
+                rating_count=('rating', 'count'),
+                average_rating=('rating', 'mean')
+            )
+            .reset_index()
         )
+        logger.debug(f"Interaction statistics computed: {result.head()}")
         logger.info("Interactions dataframe created successfully.")
         return result
 
@@ -195,6 +203,491 @@ class InteractionData:
         logger.info("Correlation matrix plot displayed.")
 
 
+class InteractionAggregator:
+    """
+    Streaming computation of the per-recipe interaction statistics.
+
+    The interactions are consumed chunk by chunk, and only the number of
+    complete interactions (with a rating and a review) and the sum of their
+    ratings are kept, in dense arrays indexed by recipe id. The memory
+    depends on the number of recipes, not on the number of interactions.
+    Partial aggregators computed on separate chunks, for example by
+    parallel workers, are combined with `merge`, and `result` gives the
+    same table as `InteractionData.interactions_df`, as long as the ratings
+    are integers.
+
+    Parameters
+    ----------
+    size: int
+        The initial length of the arrays, grown to the largest recipe id.
+
+    Methods
+    -------
+    update(chunk)
+        Add a chunk of interactions.
+    merge(other)
+        Add the partial aggregates of another aggregator.
+    result()
+        Compute the statistics of each recipe.
+    from_chunks(chunks)
+        Aggregate an iterable of interaction chunks.
+    from_csv(path, chunksize)
+        Aggregate a CSV file read in chunks.
+    from_database(database, table_name, chunksize)
+        Aggregate a database table streamed in chunks.
+    from_parquet(path, workers)
+        Aggregate the row groups of a Parquet file, in parallel.
+    save(database, table_name)
+        Persist the aggregates and their watermark.
+    load(database, table_name)
+        Read the persisted aggregates and their watermark.
+    refresh(database, source_table, until, chunksize)
+        Add the interactions dated after the watermark.
+    """
+    COLUMNS = ['recipe_id', 'rating', 'review']
+
+    def __init__(self, size=0):
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.rating_sums = np.zeros(size, dtype=np.float64)
+        # Latest interaction date aggregated, as 'YYYY-MM-DD'
+        self.watermark = None
+
+    def _grow(self, size):
+        """
+        Extend the arrays with zeros up to a length.
+
+        Parameters
+        ----------
+        size: int
+            The new length of the arrays.
+
+        Returns
+        -------
+        None
+        """
+        if size > len(self.counts):
+            extra = size - len(self.counts)
+            self.counts = np.concatenate(
+                [self.counts, np.zeros(extra, dtype=np.int64)]
+            )
+            self.rating_sums = np.concatenate(
+                [self.rating_sums, np.zeros(extra, dtype=np.float64)]
+            )
+
+    def update(self, chunk):
+        """
+        Add a chunk of interactions.
+
+        Parameters
+        ----------
+        chunk: DataFrame
+            The interactions, with 'recipe_id' and 'rating', and 'review'
+            if the incomplete interactions are not filtered yet.
+
+        Returns
+        -------
+        self: InteractionAggregator
+            The updated aggregator.
+        """
+        complete = chunk['rating'].notna()
+        if 'review' in chunk:
+            complete &= chunk['review'].notna()
+        ids = chunk.loc[complete, 'recipe_id'].to_numpy(dtype=np.int64)
+        if len(ids):
+            ratings = chunk.loc[complete, 'rating'].to_numpy(dtype=float)
+            self._grow(int(ids.max()) + 1)
+            size = len(self.counts)
+            self.counts += np.bincount(ids, minlength=size)
+            self.rating_sums += np.bincount(
+                ids, weights=ratings, minlength=size
+            )
+        if 'date' in chunk:
+            self._advance(pd.to_datetime(chunk['date']).max())
+        logger.debug(f"{len(ids)} interactions aggregated.")
+        return self
+
+    def _advance(self, date):
+        """
+        Move the watermark forward to a date.
+
+        Parameters
+        ----------
+        date: str or pd.Timestamp
+            The latest date of aggregated interactions, ignored if missing.
+
+        Returns
+        -------
+        None
+        """
+        if pd.isna(date):
+            return
+        date = pd.Timestamp(date).strftime('%Y-%m-%d')
+        if self.watermark is None or date > self.watermark:
+            self.watermark = date
+
+    def merge(self, other):
+        """
+        Add the partial aggregates of another aggregator.
+
+        Parameters
+        ----------
+        other: InteractionAggregator
+            The aggregator of other interactions.
+
+        Returns
+        -------
+        self: InteractionAggregator
+            The merged aggregator.
+        """
+        self._grow(len(other.counts))
+        size = len(other.counts)
+        self.counts[:size] += other.counts
+        self.rating_sums[:size] += other.rating_sums
+        self._advance(other.watermark)
+        return self
+
+    def result(self):
+        """
+        Compute the number of interactions, reviews, ratings and average
+        rating for each recipe.
+
+        The average rating is the sum of the ratings divided by their
+        number. The ratings are integers (0 to 5), so their float sums are
+        exact whatever the order in which chunks and partial aggregates
+        were added. The average is then the same as the mean of
+        `InteractionData.interactions_df`. Fractional ratings would make
+        it depend on that order by a few units in the last place.
+
+        Returns
+        -------
+        result: DataFrame
+            The statistics of the recipes having interactions, sorted by
+            recipe id, as `InteractionData.interactions_df`.
+        """
+        ids = np.flatnonzero(self.counts)
+        counts = self.counts[ids]
+        result = pd.DataFrame({
+            'recipe_id': ids.astype(np.int64),
+            'interaction_count': counts,
+            'review_count': counts,
+            'rating_count': counts,
+            'average_rating': self.rating_sums[ids] / counts
+        })
+        logger.info(f"Interaction statistics of {len(ids)} recipes.")
+        return result
+
+    def to_frame(self):
+        """
+        Get the partial aggregates of the recipes having interactions.
+
+        Returns
+        -------
+        aggregates: DataFrame
+            The 'recipe_id', 'interaction_count' and 'rating_sum' of each
+            recipe.
+        """
+        ids = np.flatnonzero(self.counts)
+        return pd.DataFrame({
+            'recipe_id': ids.astype(np.int64),
+            'interaction_count': self.counts[ids],
+            'rating_sum': self.rating_sums[ids]
+        })
+
+    @classmethod
+    def from_frame(cls, aggregates, watermark=None):
+        """
+        Build an aggregator from partial aggregates.
+
+        Parameters
+        ----------
+        aggregates: DataFrame
+            The partial aggregates returned by `to_frame`.
+        watermark: str
+            The latest interaction date of the aggregates.
+
+        Returns
+        -------
+        aggregator: InteractionAggregator
+            The aggregator of the aggregates.
+        """
+        ids = aggregates['recipe_id'].to_numpy(dtype=np.int64)
+        aggregator = cls(int(ids.max()) + 1 if len(ids) else 0)
+        aggregator.counts[ids] = aggregates['interaction_count'].to_numpy()
+        aggregator.rating_sums[ids] = aggregates['rating_sum'].to_numpy()
+        aggregator._advance(watermark)
+        return aggregator
+
+    def save(self, database, table_name='interaction_aggregates'):
+        """
+        Persist the aggregates, replacing the previous ones, and their
+        watermark in the table `<table_name>_watermark`.
+
+        Both tables are written in one transaction, so a reader never sees
+        aggregates paired with the watermark of another run.
+
+        Only dated aggregates can be saved. Without a watermark, the next
+        `refresh` would add the whole history again. The full builds
+        (`from_csv`, `from_database`, `from_parquet`) don't read the
+        dates, so the persisted aggregates are built with
+        `refresh_interaction_aggregates`.
+
+        Parameters
+        ----------
+        database: Database
+            The database connection.
+        table_name: str
+            The table of the aggregates.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            If the aggregates have no watermark.
+        """
+        if self.watermark is None:
+            raise ValueError(
+                "Aggregates without a watermark cannot be refreshed, build "
+                "them with refresh_interaction_aggregates."
+            )
+        database.write_tables({
+            table_name: self.to_frame(),
+            f'{table_name}_watermark': pd.DataFrame(
+                {'watermark': [self.watermark]}
+            ),
+        }, if_exists='replace')
+        logger.info(
+            f"Aggregates saved to {table_name}, watermark {self.watermark}."
+        )
+
+    @classmethod
+    def load(cls, database, table_name='interaction_aggregates'):
+        """
+        Read the persisted aggregates and their watermark.
+
+        Parameters
+        ----------
+        database: Database
+            The database connection.
+        table_name: str
+            The table of the aggregates.
+
+        Returns
+        -------
+        aggregator: InteractionAggregator
+            The persisted aggregates, empty if there are none yet.
+        """
+        aggregates = database.fetch_data(f'SELECT * FROM "{table_name}";')
+        watermark = database.fetch_data(
+            f'SELECT * FROM "{table_name}_watermark";'
+        )
+        if aggregates is None or watermark is None:
+            logger.info(f"No aggregates in {table_name} yet.")
+            return cls()
+        return cls.from_frame(aggregates, watermark['watermark'].iloc[0])
+
+    def refresh(self, database, source_table='RAW_interactions', until=None,
+                chunksize=1_000_000):
+        """
+        Add the interactions dated after the watermark, up to a date.
+
+        Only the interactions of complete days are added, before `until`,
+        so that interactions inserted later with the date of the watermark
+        are not missed.
+
+        Parameters
+        ----------
+        database: Database
+            The database connection.
+        source_table: str
+            The table of the interactions.
+        until: str
+            The first date not aggregated, 'YYYY-MM-DD', today by default.
+        chunksize: int
+            The number of interactions of each chunk.
+
+        Returns
+        -------
+        n_rows: int
+            The number of new interactions read.
+        """
+        until = until or pd.Timestamp.today().strftime('%Y-%m-%d')
+        condition = f"date < '{until}'"
+        if self.watermark is not None:
+            condition += f" AND date > '{self.watermark}'"
+        query = (
+            f'SELECT recipe_id, rating, review IS NOT NULL AS has_review, '
+            f'date FROM "{source_table}" WHERE {condition};'
+        )
+        n_rows = 0
+        for chunk in database.fetch_chunks(query, chunksize):
+            self.update(chunk[chunk['has_review']])
+            self._advance(pd.to_datetime(chunk['date']).max())
+            n_rows += len(chunk)
+        logger.info(
+            f"{n_rows} new interactions aggregated, watermark "
+            f"{self.watermark}."
+        )
+        return n_rows
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Aggregate an iterable of interaction chunks.
+
+        Parameters
+        ----------
+        chunks: iterable of DataFrame
+            The chunks of interactions.
+
+        Returns
+        -------
+        aggregator: InteractionAggregator
+            The aggregates of all the chunks.
+        """
+        aggregator = cls()
+        for chunk in chunks:
+            aggregator.update(chunk)
+        return aggregator
+
+    @classmethod
+    def from_csv(cls, path, chunksize=1_000_000):
+        """
+        Aggregate a CSV file of interactions read in chunks.
+
+        Parameters
+        ----------
+        path: str
+            The path to the CSV file.
+        chunksize: int
+            The number of interactions of each chunk.
+
+        Returns
+        -------
+        aggregator: InteractionAggregator
+            The aggregates of the file.
+        """
+        logger.info(f"Aggregating interactions from {path}.")
+        return cls.from_chunks(pd.read_csv(
+            path, sep=',', usecols=cls.COLUMNS, chunksize=chunksize
+        ))
+
+    @classmethod
+    def from_database(cls, database, table_name='RAW_interactions',
+                      chunksize=1_000_000):
+        """
+        Aggregate a database table of interactions streamed in chunks.
+
+        The incomplete interactions are filtered by the database, so the
+        review texts are not transferred.
+
+        Parameters
+        ----------
+        database: Database
+            The database connection.
+        table_name: str
+            The table of the interactions.
+        chunksize: int
+            The number of interactions of each chunk.
+
+        Returns
+        -------
+        aggregator: InteractionAggregator
+            The aggregates of the table.
+        """
+        logger.info(f"Aggregating interactions from {table_name}.")
+        query = (
+            f'SELECT recipe_id, rating FROM "{table_name}" '
+            'WHERE rating IS NOT NULL AND review IS NOT NULL;'
+        )
+        return cls.from_chunks(database.fetch_chunks(query, chunksize))
+
+    @classmethod
+    def from_parquet(cls, path, workers=1):
+        """
+        Aggregate the row groups of a Parquet file of interactions.
+
+        Each worker aggregates its own row groups, and the partial
+        aggregates are merged.
+
+        Parameters
+        ----------
+        path: str
+            The path to the Parquet file.
+        workers: int
+            The number of row groups read and aggregated in parallel.
+
+        Returns
+        -------
+        aggregator: InteractionAggregator
+            The aggregates of the file.
+        """
+        import pyarrow.parquet as pq
+
+        n_groups = pq.ParquetFile(path).num_row_groups
+        logger.info(
+            f"Aggregating {n_groups} row groups of {path} with {workers} "
+            "workers."
+        )
+
+        def aggregate(groups):
+            parquet = pq.ParquetFile(path)
+            aggregator = cls()
+            for group in groups:
+                aggregator.update(parquet.read_row_group(
+                    group, columns=cls.COLUMNS
+                ).to_pandas())
+            return aggregator
+
+        workers = max(1, min(workers, n_groups))
+        shares = [range(i, n_groups, workers) for i in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(aggregate, shares))
+        aggregator = cls()
+        for partial in partials:
+            aggregator.merge(partial)
+        return aggregator
+
+
+def refresh_interaction_aggregates(database=None,
+                                   source_table='RAW_interactions',
+                                   table_name='interaction_aggregates',
+                                   until=None, chunksize=1_000_000):
+    """
+    Fold the new interactions into the persisted per-recipe aggregates.
+
+    Parameters
+    ----------
+    database: Database
+        The database connection, the application one by default.
+    source_table: str
+        The table of the interactions.
+    table_name: str
+        The table of the aggregates.
+    until: str
+        The first date not aggregated, 'YYYY-MM-DD', today by default.
+    chunksize: int
+        The number of interactions of each chunk.
+
+    Returns
+    -------
+    aggregator: InteractionAggregator
+        The up-to-date aggregates.
+    """
+    if database is None:
+        from db.db_instance import db_instance
+        database = db_instance
+    aggregator = InteractionAggregator.load(database, table_name)
+    aggregator.refresh(database, source_table, until, chunksize)
+    if aggregator.watermark is None:
+        logger.warning(f"No interactions in {source_table} to aggregate.")
+    else:
+        aggregator.save(database, table_name)
+    return aggregator
+
+
 class LabelAnalysis:
     """
     Class to analyze the labels.
@@ -305,4 +798,14 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='fold the new interactions into the interaction_aggregates '
+             'table')
+    args = parser.parse_args()
+    if args.refresh:
+        refresh_interaction_aggregates()
+    else:
+        main()
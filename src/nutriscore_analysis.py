@@ -1,11 +1,646 @@
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 import scipy
 from scipy.stats import shapiro, kstest, anderson
-from calcul_nutriscore import Plot
+from cachetools import LRUCache
+from calcul_nutriscore import Plot, BASE_SCORE, LABELS, LABEL_CUTS, \
+    assign_labels
+from core.fingerprint import data_fingerprint
 
 logger = logging.getLogger("nutriscore_analysis")
 
+# NutriScores are 14 minus sums of grille points, multiples of 0.25
+SCORE_STEP = 0.25
+N_SCORE_CODES = int(BASE_SCORE / SCORE_STEP) + 1
+# Code of the missing scores, outside the 57 codes of the grid
+MISSING_CODE = 255
+
+
+class SummaryStats:
+    """
+    Mergeable summary statistics of a numerical sample.
+
+    The partial result of a chunk holds its count, mean, minimum, maximum
+    and the sums of the centred powers up to the 4th order. Two partial
+    results are combined with `merge`, using the pairwise update formulas
+    of Chan and Pébay, so a sample can be summarised chunk by chunk and
+    give the same moments as the whole sample at once. Skewness and
+    kurtosis follow `scipy.stats.skew(bias=True)` and
+    `scipy.stats.kurtosis(fisher=False, bias=True)`.
+
+    For the quantiles, the partial result also holds the counts of the
+    distinct values, so the quantiles are exact (linear interpolation of
+    `np.quantile`) for discrete or low-cardinality samples such as the
+    NutriScores. Beyond `MAX_CENTROIDS` distinct values, adjacent values
+    are merged into centroids of about equal counts, a bounded sketch whose
+    quantiles are approximate (rank error about 1 / MAX_CENTROIDS) and
+    whose merge cost does not grow with the sample.
+
+    Parameters
+    ----------
+    count : int
+        Number of values.
+    mean : float
+        Mean of the values.
+    m2, m3, m4 : float
+        Sums of the 2nd, 3rd and 4th powers of the deviations to the mean.
+    minimum, maximum : float
+        Extreme values.
+    values : np.ndarray, optional
+        Sorted distinct values, or centroids. None if the quantiles are
+        not tracked.
+    counts : np.ndarray, optional
+        Number of occurrences of each distinct value or centroid.
+    exact : bool
+        Whether `values` are the distinct values rather than centroids.
+
+    Methods
+    -------
+    from_array(x, quantiles)
+        Summarise an array in one vectorized pass.
+    merge(other)
+        Combine two partial results.
+    quantile(q)
+        Quantile(s) of the summarised sample.
+    to_dict()
+        The summary statistics as a dictionary.
+    """
+
+    # Maximum number of distinct values or centroids kept for quantiles
+    MAX_CENTROIDS = 4096
+
+    def __init__(self, count=0, mean=np.nan, m2=0.0, m3=0.0, m4=0.0,
+                 minimum=np.nan, maximum=np.nan, values=None, counts=None,
+                 exact=True):
+        self.count = int(count)
+        self.mean = float(mean)
+        self.m2 = float(m2)
+        self.m3 = float(m3)
+        self.m4 = float(m4)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.values = None if values is None \
+            else np.asarray(values, dtype=float)
+        self.counts = None if counts is None \
+            else np.asarray(counts, dtype=np.int64)
+        self.exact = bool(exact) and self.values is not None
+
+    @property
+    def has_quantiles(self):
+        """Whether the quantiles of the sample are tracked."""
+        return self.values is not None
+
+    @staticmethod
+    def _compress(values, counts, size):
+        """
+        Merge adjacent sorted values into at most `size` centroids of about
+        equal counts.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            The sorted values.
+        counts : np.ndarray
+            The number of occurrences of each value.
+        size : int
+            The maximum number of centroids.
+
+        Returns
+        -------
+        tuple of np.ndarray
+            The centroids (weighted means) and their counts.
+        """
+        before = np.cumsum(counts) - counts
+        group = before * size // counts.sum()
+        weights = np.bincount(group, weights=counts, minlength=size)
+        sums = np.bincount(group, weights=values * counts, minlength=size)
+        keep = weights > 0
+        return sums[keep] / weights[keep], weights[keep].astype(np.int64)
+
+    @classmethod
+    def from_array(cls, x, quantiles=True):
+        """
+        Summarise an array, ignoring missing values.
+
+        The distinct values are counted with one hash pass. When there are
+        at most `MAX_CENTROIDS` of them, the moments are computed from the
+        counts, without another pass over the array. Otherwise the moments
+        are computed from the array, and the sorted values are compressed
+        into centroids.
+
+        Parameters
+        ----------
+        x : array-like
+            The values to summarise.
+        quantiles : bool
+            Whether to track the quantiles. Without them, no value is
+            counted and the summary is a fixed-size set of moments.
+
+        Returns
+        -------
+        SummaryStats
+            The partial result of the array.
+        """
+        x = np.asarray(x, dtype=float).ravel()
+        x = x[~np.isnan(x)]
+        if x.size == 0:
+            return cls(values=np.empty(0) if quantiles else None,
+                       counts=np.empty(0) if quantiles else None)
+        # Hashing many distinct values is slower than sorting them, so the
+        # cardinality is first probed on the beginning of the array
+        low_cardinality = quantiles and pd.unique(
+            x[:8 * cls.MAX_CENTROIDS]).size <= cls.MAX_CENTROIDS
+        if low_cardinality:
+            value_counts = pd.Series(x).value_counts(sort=False)
+            values = value_counts.index.to_numpy(dtype=float)
+            counts = value_counts.to_numpy()
+            if values.size <= cls.MAX_CENTROIDS:
+                return cls.from_counts(values, counts)
+            order = np.argsort(values)
+            values, counts = values[order], counts[order]
+        elif quantiles:
+            values = np.sort(x)
+            counts = np.ones(x.size, dtype=np.int64)
+        mean = x.mean()
+        deviation = x - mean
+        squared = deviation * deviation
+        stats = cls(
+            count=x.size,
+            mean=mean,
+            m2=squared.sum(),
+            m3=np.dot(squared, deviation),
+            m4=np.dot(squared, squared),
+            minimum=x.min(),
+            maximum=x.max()
+        )
+        if quantiles:
+            stats.values, stats.counts = cls._compress(
+                values, counts, cls.MAX_CENTROIDS
+            )
+            stats.exact = False
+        return stats
+
+    @classmethod
+    def from_counts(cls, values, counts):
+        """
+        Summarise a sample given as distinct values and their counts.
+
+        The cost depends on the number of distinct values only, not on the
+        size of the sample.
+
+        Parameters
+        ----------
+        values : array-like
+            The distinct values.
+        counts : array-like
+            The number of occurrences of each value.
+
+        Returns
+        -------
+        SummaryStats
+            The partial result of the sample.
+        """
+        values = np.asarray(values, dtype=float)
+        counts = np.asarray(counts, dtype=np.int64)
+        keep = counts > 0
+        values, counts = values[keep], counts[keep]
+        order = np.argsort(values)
+        values, counts = values[order], counts[order]
+        n = counts.sum()
+        if n == 0:
+            return cls(values=values, counts=counts)
+        mean = (counts * values).sum() / n
+        deviation = values - mean
+        squared = deviation * deviation
+        return cls(
+            count=n,
+            mean=mean,
+            m2=(counts * squared).sum(),
+            m3=(counts * squared * deviation).sum(),
+            m4=(counts * squared * squared).sum(),
+            minimum=values[0],
+            maximum=values[-1],
+            values=values,
+            counts=counts
+        )
+
+    def merge(self, other):
+        """
+        Combine the partial results of two disjoint samples.
+
+        The cost depends on the number of distinct values or centroids
+        kept, at most `MAX_CENTROIDS` per partial result, not on the size
+        of the samples.
+
+        Parameters
+        ----------
+        other : SummaryStats
+            The partial result of the other sample.
+
+        Returns
+        -------
+        SummaryStats
+            The partial result of the union of both samples.
+        """
+        tracked = self.has_quantiles and other.has_quantiles
+        if self.count == 0 or other.count == 0:
+            stats = other if self.count == 0 else self
+            if stats.has_quantiles == tracked:
+                return stats
+            # Only one side tracks the quantiles, the union does not
+            return SummaryStats(stats.count, stats.mean, stats.m2, stats.m3,
+                                stats.m4, stats.minimum, stats.maximum)
+        na, nb = self.count, other.count
+        n = na + nb
+        delta = other.mean - self.mean
+        delta_n = delta / n
+        mean = self.mean + delta_n * nb
+        m2 = self.m2 + other.m2 + delta * delta_n * na * nb
+        m3 = sum([
+            self.m3, other.m3,
+            delta * delta_n ** 2 * na * nb * (na - nb),
+            3 * delta_n * (na * other.m2 - nb * self.m2)
+        ])
+        m4 = sum([
+            self.m4, other.m4,
+            delta * delta_n ** 3 * na * nb * (na * na - na * nb + nb * nb),
+            6 * delta_n ** 2 * (na * na * other.m2 + nb * nb * self.m2),
+            4 * delta_n * (na * other.m3 - nb * self.m3)
+        ])
+        stats = SummaryStats(
+            count=n,
+            mean=mean,
+            m2=m2,
+            m3=m3,
+            m4=m4,
+            minimum=min(self.minimum, other.minimum),
+            maximum=max(self.maximum, other.maximum)
+        )
+        if tracked:
+            values, inverse = np.unique(
+                np.concatenate([self.values, other.values]),
+                return_inverse=True
+            )
+            counts = np.bincount(
+                inverse, weights=np.concatenate([self.counts, other.counts]),
+                minlength=values.size
+            ).astype(np.int64)
+            exact = self.exact and other.exact
+            if values.size > self.MAX_CENTROIDS:
+                values, counts = self._compress(
+                    values, counts, self.MAX_CENTROIDS
+                )
+                exact = False
+            stats.values, stats.counts, stats.exact = values, counts, exact
+        return stats
+
+    @property
+    def variance(self):
+        """Population variance of the sample."""
+        return self.m2 / self.count if self.count else np.nan
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1), as `pd.Series.std`."""
+        return np.sqrt(self.m2 / (self.count - 1)) \
+            if self.count > 1 else np.nan
+
+    @property
+    def skewness(self):
+        """Biased skewness of the sample."""
+        if self.count == 0 or self.m2 == 0:
+            return np.nan
+        return (self.m3 / self.count) / self.variance ** 1.5
+
+    @property
+    def kurtosis(self):
+        """Biased Pearson kurtosis (3 for a normal law) of the sample."""
+        if self.count == 0 or self.m2 == 0:
+            return np.nan
+        return (self.m4 / self.count) / self.variance ** 2
+
+    @property
+    def median(self):
+        """Median of the sample."""
+        return self.quantile(0.5)
+
+    def quantile(self, q):
+        """
+        Quantile(s) of the sample, interpolated linearly.
+
+        The quantiles are exact while `exact` is True, approximate when
+        the values were compressed into centroids, and NaN when the
+        quantiles are not tracked.
+
+        Parameters
+        ----------
+        q : float or array-like
+            Probabilities between 0 and 1.
+
+        Returns
+        -------
+        float or np.ndarray
+            The quantile(s) of the sample.
+        """
+        q = np.asarray(q, dtype=float)
+        if self.count == 0 or not self.has_quantiles:
+            return np.full(q.shape, np.nan)[()]
+        # Positions in the sorted sample, mapped to the distinct values
+        position = q * (self.count - 1)
+        below = np.floor(position)
+        cumulative = np.cumsum(self.counts)
+        lower = self.values[np.searchsorted(cumulative, below, side='right')]
+        upper = self.values[np.searchsorted(
+            cumulative, np.minimum(below + 1, self.count - 1), side='right'
+        )]
+        result = lower + (upper - lower) * (position - below)
+        if not self.exact:
+            # The centroids are means, the extremes are kept exactly
+            result = np.clip(result, self.minimum, self.maximum)
+            result = np.where(q == 0, self.minimum,
+                              np.where(q == 1, self.maximum, result))
+        return result[()]
+
+    def to_dict(self):
+        """
+        The summary statistics as a dictionary.
+
+        Returns
+        -------
+        dict
+            Count, mean, median, max, min, skewness and kurtosis.
+        """
+        return {
+            'Count': self.count,
+            'Mean': self.mean,
+            'Median': self.median,
+            'Max': self.maximum,
+            'Min': self.minimum,
+            'Skewness': self.skewness,
+            'Kurtosis': self.kurtosis
+        }
+
+
+def summary_stats(x, chunksize=None, quantiles=True):
+    """
+    Summarise a numerical sample in a single vectorized pass.
+
+    Parameters
+    ----------
+    x : array-like or iterable of array-like
+        The values to summarise, or an iterable of chunks of values (for
+        instance a generator over a database cursor).
+    chunksize : int, optional
+        If given, an array is summarised chunk by chunk to bound memory.
+    quantiles : bool
+        Whether to track the quantiles, see `SummaryStats.from_array`.
+
+    Returns
+    -------
+    SummaryStats
+        The mergeable summary statistics of the sample.
+    """
+    if isinstance(x, (np.ndarray, pd.Series, pd.Index, list, tuple)):
+        x = np.asarray(x, dtype=float)
+        if chunksize is None:
+            stats = SummaryStats.from_array(x, quantiles)
+            logger.info(f"Summary statistics of {stats.count} values.")
+            return stats
+        chunks = (x[start:start + chunksize]
+                  for start in range(0, x.size, chunksize))
+    else:
+        chunks = x
+    stats = SummaryStats.from_array([], quantiles)
+    for chunk in chunks:
+        stats = stats.merge(SummaryStats.from_array(chunk, quantiles))
+    logger.info(f"Summary statistics of {stats.count} values.")
+    return stats
+
+
+def encode_scores(scores):
+    """
+    Encode NutriScores as their index on the 0.25 point grid.
+
+    Parameters
+    ----------
+    scores : array-like
+        The NutriScores, between 0 and 14.
+
+    Returns
+    -------
+    np.ndarray
+        The uint8 codes of the scores, `MISSING_CODE` for missing scores.
+
+    Raises
+    ------
+    ValueError
+        If a score is outside [0, 14] or not a multiple of 0.25.
+    """
+    scores = np.asarray(scores, dtype=float)
+    missing = np.isnan(scores)
+    steps = np.where(missing, 0, scores / SCORE_STEP)
+    codes = np.rint(steps)
+    if (np.abs(steps - codes) > 1e-6).any() or (codes < 0).any() \
+            or (codes >= N_SCORE_CODES).any():
+        raise ValueError(
+            f"NutriScores must be multiples of {SCORE_STEP} between 0 and "
+            f"{BASE_SCORE}"
+        )
+    codes = codes.astype(np.uint8)
+    codes[missing] = MISSING_CODE
+    return codes
+
+
+def decode_scores(codes):
+    """
+    Decode NutriScore codes back to scores.
+
+    Parameters
+    ----------
+    codes : array-like
+        The codes returned by `encode_scores`.
+
+    Returns
+    -------
+    np.ndarray
+        The NutriScores, NaN for missing scores.
+    """
+    codes = np.asarray(codes)
+    return np.where(codes == MISSING_CODE, np.nan, codes * SCORE_STEP)
+
+
+class ScoreDistribution:
+    """
+    Distribution of NutriScores over the 57 values of the 0.25 point grid.
+
+    The distribution only stores one count per grid value, so statistics,
+    label shares and histograms of a whole dataset are computed in O(57)
+    and a cached distribution weighs a few hundred bytes.
+
+    Parameters
+    ----------
+    counts : array-like, optional
+        The number of recipes for each grid value, from 0 to 14.
+    missing : int
+        The number of missing scores.
+
+    Methods
+    -------
+    from_scores(scores)
+        Count the scores of a dataset.
+    from_codes(codes)
+        Count the codes of a dataset.
+    merge(other)
+        Combine the distributions of two datasets.
+    summary()
+        The summary statistics of the scores.
+    histogram(bins=20, value_range=None)
+        The histogram of the scores.
+    label_counts(cuts=LABEL_CUTS)
+        The number of recipes of each label.
+    """
+
+    values = np.arange(N_SCORE_CODES) * SCORE_STEP
+
+    def __init__(self, counts=None, missing=0):
+        self.counts = np.zeros(N_SCORE_CODES, dtype=np.int64) \
+            if counts is None else np.asarray(counts, dtype=np.int64)
+        if self.counts.shape != (N_SCORE_CODES,):
+            raise ValueError(f"Expected {N_SCORE_CODES} counts")
+        self.missing = int(missing)
+
+    @classmethod
+    def from_codes(cls, codes):
+        """
+        Count the codes of a dataset.
+
+        Parameters
+        ----------
+        codes : array-like
+            The codes returned by `encode_scores`.
+
+        Returns
+        -------
+        ScoreDistribution
+            The distribution of the scores.
+        """
+        counts = np.bincount(
+            np.asarray(codes, dtype=np.uint8), minlength=MISSING_CODE + 1
+        )
+        return cls(counts[:N_SCORE_CODES], missing=counts[MISSING_CODE])
+
+    @classmethod
+    def from_scores(cls, scores):
+        """
+        Count the scores of a dataset.
+
+        Parameters
+        ----------
+        scores : array-like
+            The NutriScores.
+
+        Returns
+        -------
+        ScoreDistribution
+            The distribution of the scores.
+        """
+        distribution = cls.from_codes(encode_scores(scores))
+        logger.info(
+            f"Score distribution of {distribution.count} recipes encoded."
+        )
+        return distribution
+
+    @property
+    def count(self):
+        """Number of non-missing scores."""
+        return int(self.counts.sum())
+
+    @property
+    def nbytes(self):
+        """Memory used by the counts."""
+        return self.counts.nbytes
+
+    def merge(self, other):
+        """
+        Combine the distributions of two disjoint datasets.
+
+        Parameters
+        ----------
+        other : ScoreDistribution
+            The distribution of the other dataset.
+
+        Returns
+        -------
+        ScoreDistribution
+            The distribution of both datasets.
+        """
+        return ScoreDistribution(
+            self.counts + other.counts, self.missing + other.missing
+        )
+
+    def summary(self):
+        """
+        The summary statistics of the scores.
+
+        Returns
+        -------
+        SummaryStats
+            Count, mean, extremes, moments and quantiles of the scores.
+        """
+        return SummaryStats.from_counts(self.values, self.counts)
+
+    def histogram(self, bins=20, value_range=None):
+        """
+        The histogram of the scores, as `np.histogram` on the scores.
+
+        Parameters
+        ----------
+        bins : int
+            The number of bins.
+        value_range : tuple, optional
+            The (min, max) bounds of the histogram. Defaults to the range of
+            the scores.
+
+        Returns
+        -------
+        dict
+            The bin 'counts', the bin 'edges' and the 'count' of scores.
+        """
+        present = self.counts > 0
+        if not present.any():
+            counts = np.zeros(int(bins), dtype=np.int64)
+            edges = np.linspace(0, BASE_SCORE, int(bins) + 1)
+        else:
+            counts, edges = np.histogram(
+                self.values[present], bins=int(bins), range=value_range,
+                weights=self.counts[present]
+            )
+            counts = counts.astype(np.int64)
+        return {'counts': counts, 'edges': edges, 'count': int(counts.sum())}
+
+    def label_counts(self, cuts=LABEL_CUTS):
+        """
+        The number of recipes of each label.
+
+        Parameters
+        ----------
+        cuts : sequence of float
+            The four ascending score cuts of the labels.
+
+        Returns
+        -------
+        pd.Series
+            The number of recipes of each label, indexed from A to E.
+        """
+        codes = assign_labels(self.values, cuts).codes
+        counts = np.bincount(
+            codes, weights=self.counts, minlength=len(LABELS)
+        ).astype(np.int64)
+        return pd.Series(counts, index=list(LABELS[::-1]), name='count')
+
 
 def nutriscore_analysis(data):
     """
@@ -113,6 +748,161 @@ def ad_test(data, column):
         raise
 
 
+def stratified_sample(x, size, seed=0):
+    """
+    Draw a reproducible sample stratified on the ranks of the values.
+
+    The sorted values are split into `size` strata of equal counts and one
+    value is drawn at random in each stratum, so the sample follows the
+    distribution of the data, tails included.
+
+    Parameters
+    ----------
+    x : array-like
+        The values to sample, without missing values.
+    size : int
+        The size of the sample.
+    seed : int
+        The seed of the random generator.
+
+    Returns
+    -------
+    np.ndarray
+        The sorted sample, or all the sorted values if there are fewer than
+        `size`.
+    """
+    x = np.sort(np.asarray(x, dtype=float))
+    if x.size <= size:
+        return x
+    rng = np.random.default_rng(seed)
+    edges = np.linspace(0, x.size, size + 1)
+    picks = np.floor(edges[:-1] + rng.random(size) * np.diff(edges))
+    return x[picks.astype(np.int64)]
+
+
+class NormalityTester:
+    """
+    Service running the normality tests of a column on a capped sample.
+
+    The tests run on a stratified sample of at most `sample_size` values,
+    drawn with a fixed seed so the results are reproducible, since the
+    Shapiro-Wilk p-value is not valid above 5000 values and the other tests
+    reject normality for any deviation on large samples. The results are
+    cached by dataset version, column and sampling parameters, in a cache
+    that the threads of the sessions share under a lock.
+
+    Parameters
+    ----------
+    sample_size : int
+        The maximum number of values tested.
+    seed : int
+        The seed of the sampling.
+    cache_size : int
+        The number of (dataset, column, test) results kept.
+
+    Methods
+    -------
+    sample(data, column)
+        The tested sample of a column.
+    run(data, column, tests=None, concurrent=False, version=None)
+        Run normality tests on a column.
+    """
+
+    TESTS = {
+        'Shapiro-Wilk': shapiro_test,
+        'Kolmogorov-Smirnov': ks_test,
+        'Anderson-Darling': ad_test
+    }
+
+    def __init__(self, sample_size=5000, seed=0, cache_size=64):
+        self.sample_size = sample_size
+        self.seed = seed
+        self._cache = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+
+    def sample(self, data, column):
+        """
+        The tested sample of a column.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            The dataset.
+        column : str
+            The tested column.
+
+        Returns
+        -------
+        pd.DataFrame
+            The sample, in a DataFrame with the tested column.
+        """
+        values = data[column].dropna().to_numpy()
+        return pd.DataFrame({
+            column: stratified_sample(values, self.sample_size, self.seed)
+        })
+
+    def run(self, data, column, tests=None, concurrent=False, version=None):
+        """
+        Run normality tests on a column.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            The dataset.
+        column : str
+            The tested column.
+        tests : list, optional
+            The names of the tests, among `TESTS`. Defaults to all tests.
+        concurrent : bool
+            Whether the tests missing from the cache run in parallel
+            threads.
+        version : str, optional
+            The version of the dataset column, its fingerprint if not
+            given. Pass the version computed when the dataset was loaded,
+            to avoid hashing the column on every call.
+
+        Returns
+        -------
+        dict
+            The result of each test, by name.
+        """
+        tests = list(self.TESTS) if tests is None else list(tests)
+        unknown = set(tests) - set(self.TESTS)
+        if unknown:
+            raise ValueError(f"Unknown normality tests: {sorted(unknown)}")
+        if version is None:
+            version = data_fingerprint(data[column])
+        keys = {
+            name: (version, column, name, self.sample_size, self.seed)
+            for name in tests
+        }
+        with self._lock:
+            results = {
+                name: self._cache[keys[name]] for name in tests
+                if keys[name] in self._cache
+            }
+        missing = [name for name in tests if name not in results]
+        if missing:
+            sample = self.sample(data, column)
+            logger.info(
+                f"Running {missing} on {len(sample)} values of {column}"
+            )
+            if concurrent and len(missing) > 1:
+                with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+                    computed = list(pool.map(
+                        lambda name: self.TESTS[name](sample, column),
+                        missing
+                    ))
+            else:
+                computed = [self.TESTS[name](sample, column)
+                            for name in missing]
+            with self._lock:
+                for name, result in zip(missing, computed):
+                    self._cache[keys[name]] = result
+            results.update(zip(missing, computed))
+        return {name: results[name] for name in tests}
+
+
 def skewness(data, column):
     """
     Calculate the skewness of the data.
@@ -167,6 +957,57 @@ def kurtosis(data, column):
         raise
 
 
+_label_distribution_cache = LRUCache(maxsize=32)
+# Streamlit runs the sessions in threads, which share the cache
+_label_distribution_lock = threading.Lock()
+
+
+def label_distribution(data, column='label', version=None):
+    """
+    Count the recipes of each Nutri-Score label in a single pass.
+
+    The labels are counted with one categorical `value_counts`, and the
+    result is cached by dataset version, under a lock.
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        DataFrame with the Nutri-Score labels.
+    column: str
+        Column name with the labels.
+    version: str, optional
+        Version of the dataset, the fingerprint of the labels if not given.
+
+    Returns
+    -------
+    pd.DataFrame
+        The 'count' and 'share' of each label, indexed from A to E.
+    """
+    try:
+        if version is None:
+            version = data_fingerprint(data[column])
+        key = (version, column)
+        with _label_distribution_lock:
+            distribution = _label_distribution_cache.get(key)
+        if distribution is None:
+            counts = pd.Categorical(
+                data[column], categories=list(LABELS[::-1])
+            ).value_counts()
+            # Shares of all recipes, as missing labels are not counted
+            total = len(data)
+            distribution = pd.DataFrame({
+                'count': counts.to_numpy(),
+                'share': counts.to_numpy() / total if total else 0.0
+            }, index=pd.Index(counts.index.astype(str), name='label'))
+            with _label_distribution_lock:
+                _label_distribution_cache[key] = distribution
+            logger.info("Label distribution calculated successfully.")
+        return distribution.copy()
+    except Exception as e:
+        logger.error(f"Error in label_distribution: {e}")
+        raise
+
+
 def label_percentage(data, label):
     """
     Calculate the percentage of recipes with a specific Nutri-Score label.
@@ -183,7 +1024,8 @@ def label_percentage(data, label):
     label_percent: float
     """
     try:
-        label_percent = data[data['label'] == label].shape[0] / data.shape[0]
+        # A label outside A to E has no recipe
+        label_percent = label_distribution(data)['share'].get(label, 0.0)
         logger.info(f"Label percentage for {label} calculated successfully.")
         return label_percent
     except Exception as e:
@@ -279,8 +1121,8 @@ def main():
         logger.info("Plot for Nutriscore label distribution with outliers \
                     created successfully.")
 
-        for label in ['A', 'B', 'C', 'D', 'E']:
-            label_percent = label_percentage(data_with_outliers, label)
+        labels_with_outliers = label_distribution(data_with_outliers)
+        for label, label_percent in labels_with_outliers['share'].items():
             logger.debug(
                 f"The percentage of recipes with Nutriscore {label} with \
                     outliers is "
@@ -344,8 +1186,8 @@ def main():
         logger.info("Plot for Nutriscore label distribution without outliers \
                     created successfully.")
 
-        for label in ['A', 'B', 'C', 'D', 'E']:
-            label_percent = label_percentage(data_no_outliers, label)
+        labels_no_outliers = label_distribution(data_no_outliers)
+        for label, label_percent in labels_no_outliers['share'].items():
             logger.debug(
                 f"The percentage of recipes with Nutriscore {label} without \
                     outliers "
@@ -1,10 +1,16 @@
 import pandas as pd
-import plotly.express as px
 import streamlit as st
 import toml
 import logging
 from db.db_instance import db_instance
 from db.streamlit_todb import Database
+from chart_aggregates import (
+    box_stats,
+    box_figure,
+    dataset_version,
+    histogram,
+    histogram_figure
+)
 
 logger = logging.getLogger("pages.Outliers")
 # Set the page layout to wide
@@ -33,6 +39,28 @@ def get_cached_data(_db_instance: Database, queries):
         return {}
 
 
+@st.cache_data
+def get_dataset_versions(_db_instance: Database, queries):
+    """
+    Compute the version of each dataset once, when it is loaded.
+
+    The versions key the cached chart aggregates, so the datasets are not
+    hashed again on every rerun of the page.
+
+    Args:
+        db_instance: Instance of the database connection.
+        queries (dict): Dictionary of SQL queries.
+
+    Returns:
+        dict: The version of each fetched DataFrame.
+    """
+    data = get_cached_data(_db_instance, queries)
+    return {
+        key: dataset_version(df) for key, df in data.items()
+        if isinstance(df, pd.DataFrame)
+    }
+
+
 def display_introduction():
     """
     Displays the introduction and structure of the page in the
@@ -212,7 +240,8 @@ def apply_z_score_method(outliers_size):
 def visualize_data_distribution(
     normalized_data: pd.DataFrame,
     prefiltre_data: pd.DataFrame,
-    nutrition_noOutliers: pd.DataFrame
+    nutrition_noOutliers: pd.DataFrame,
+    versions: dict = None
 ):
     """
     Visualizes data distribution using interactive graphs.
@@ -221,6 +250,9 @@ def visualize_data_distribution(
         normalized_data (DataFrame): Unfiltered data.
         prefiltre_data (DataFrame): Pre-filtered data.
         nutrition_noOutliers (DataFrame): Data without outliers.
+        versions (dict): The version of each dataset, by the keys
+            "normalized_data", "prefiltre_data" and "nutrition_noOutliers".
+            Computed from the data when missing.
     """
     options = {
         'Calories distribution': 'dv_calories_%',
@@ -247,11 +279,11 @@ def visualize_data_distribution(
 
     # Select data based on chosen option
     if data_option == 'Unfiltered data':
-        data = normalized_data
+        data, data_key = normalized_data, "normalized_data"
     elif data_option == 'Pre-filtered data':
-        data = prefiltre_data
+        data, data_key = prefiltre_data, "prefiltre_data"
     else:
-        data = nutrition_noOutliers
+        data, data_key = nutrition_noOutliers, "nutrition_noOutliers"
 
     # Add an x-scale slider
     x_min, x_max = st.slider(
@@ -261,27 +293,35 @@ def visualize_data_distribution(
         value=(float(data[y_column].min()), float(data[y_column].max())),
     )
 
-    # Filter data based on selected range
-    filtered_data = data[(data[y_column] >= x_min) & (data[y_column] <= x_max)]
+    # Aggregate the selected range server-side, only the counts and the
+    # box statistics are sent to the browser
+    version = (versions or {}).get(data_key) or dataset_version(data)
+    hist = histogram(
+        data, y_column, bins=50, value_range=(x_min, x_max), version=version
+    )
+    stats = box_stats(
+        data, y_column, value_range=(x_min, x_max), version=version
+    )
 
     # Use columns to display side-by-side graphs
     col1, col2 = st.columns(2)
     with col1:
         st.write(f"### {selected_option}")
-        fig = px.histogram(
-            filtered_data, x=y_column, title=selected_option
-        )
+        fig = histogram_figure(hist, title=selected_option)
+        fig.update_layout(xaxis_title=y_column, yaxis_title='count')
         st.plotly_chart(fig)
 
     with col2:
         st.write(f"### {selected_option} - Box Plot")
-        fig_box = px.box(
-            filtered_data, y=y_column, title=f"Box Plot - {selected_option}"
+        fig_box = box_figure(
+            stats, title=f"Box Plot - {selected_option}", name=y_column
         )
         st.plotly_chart(fig_box)
 
     # Calculate the number of valid and invalid recipes
-    valid_recipes_count = filtered_data.shape[0]
+    # The box statistics keep the bounds of the range, which a histogram of
+    # a single value widens
+    valid_recipes_count = stats['count']
     invalid_recipes_count = data.shape[0] - valid_recipes_count
 
     # Display this information in Streamlit
@@ -372,6 +412,7 @@ def main():
     logger.info(outliers_data)
     nutrition_noOutliers = data.get("nutrition_noOutliers")
     prefiltre_data = data.get("prefiltre_data")
+    versions = get_dataset_versions(db_instance, QUERIES)
 
     logger.debug("Calculate the number of outliers")
     outliers_size = outliers_data.shape[0]
@@ -386,7 +427,7 @@ def main():
     identify_outliers_with_manual_filters()
     apply_z_score_method(outliers_size)
     visualize_data_distribution(
-        normalized_data, prefiltre_data, nutrition_noOutliers
+        normalized_data, prefiltre_data, nutrition_noOutliers, versions
     )
 
     logger.debug("Main function executed successfully.")
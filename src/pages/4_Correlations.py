@@ -33,6 +33,92 @@ def get_cached_data(_db_instance: Database, queries):
         st.error("Error while fetching data from the database.")
         return {}
 
+
+@st.cache_data(max_entries=1)
+def get_interaction_aggregates(_db_instance: Database, watermark):
+    """
+    Fetch the interaction aggregates and cache them until their next refresh.
+
+    Args:
+        _db_instance: Instance of the database connection.
+        watermark (str): The watermark of the aggregates. It keys the cache,
+            so the aggregates are fetched again once they are refreshed.
+
+    Returns:
+        pd.DataFrame: The aggregated interactions of each recipe.
+
+    Raises:
+        RuntimeError: If the aggregates cannot be fetched, so that the
+            failure is not cached.
+    """
+    aggregates = _db_instance.fetch_data(
+        'SELECT * FROM "interaction_aggregates";'
+    )
+    if aggregates is None:
+        raise RuntimeError("Failed to fetch the interaction aggregates")
+    return aggregates
+
+
+@st.cache_data(ttl=3600, max_entries=1)
+def get_raw_interactions(_db_instance: Database):
+    """
+    Fetch all the raw interactions, cached for an hour.
+
+    They are only read until the aggregates are built, and the cache
+    expires so that the aggregates are picked up within the hour.
+
+    Args:
+        _db_instance: Instance of the database connection.
+
+    Returns:
+        pd.DataFrame: All the interactions.
+
+    Raises:
+        RuntimeError: If the interactions cannot be fetched, so that the
+            failure is not cached.
+    """
+    interactions = _db_instance.fetch_data(
+        'SELECT * FROM "RAW_interactions";'
+    )
+    if interactions is None:
+        raise RuntimeError("Failed to fetch the interactions")
+    return interactions
+
+
+def load_interaction_data(_db_instance: Database):
+    """
+    Load the interactions, aggregated per recipe when possible.
+
+    The aggregates are kept up to date by
+    `interaction_correlation_analysis.py --refresh`. Until they are built,
+    the raw interactions are read instead, from a cache that expires after
+    an hour. The page is stopped if neither can be fetched.
+
+    Args:
+        _db_instance: Instance of the database connection.
+
+    Returns:
+        pd.DataFrame: The interaction aggregates, or the raw interactions.
+    """
+    watermark = _db_instance.fetch_data(
+        'SELECT watermark FROM "interaction_aggregates_watermark";'
+    )
+    if watermark is not None and not watermark.empty:
+        try:
+            return get_interaction_aggregates(
+                _db_instance, str(watermark['watermark'].iloc[0])
+            )
+        except RuntimeError as e:
+            logger.error(e)
+    logger.warning("No interaction aggregates, reading all interactions")
+    try:
+        return get_raw_interactions(_db_instance)
+    except RuntimeError as e:
+        logger.error(e)
+        st.error("Error while fetching the interactions from the database.")
+        st.stop()
+
+
 def display_header():
     """
     Display the header of the page.
@@ -221,7 +307,8 @@ def display_interaction_correlation(
     Parameters
     ----------
     interaction_data: DataFrame
-        The interaction data.
+        The interaction data, or their per-recipe aggregates (with
+        'rating_sum').
     nutriscore_data: DataFrame
         The nutriscore data.
 
@@ -248,7 +335,10 @@ def display_interaction_correlation(
         unsafe_allow_html=True
     )
     
-    int_data = InteractionData(data=interaction_data)
+    if 'rating_sum' in interaction_data.columns:
+        int_data = InteractionData.from_aggregates(interaction_data)
+    else:
+        int_data = InteractionData(data=interaction_data)
     label_analysis = LabelAnalysis()
 
     columns_to_keep_interaction = [
@@ -356,9 +446,6 @@ def main():
             INNER JOIN "NS_noOutliers" ns 
             ON rr.id=ns.id;
         """,
-        "raw_interactions": """
-            SELECT * FROM "RAW_interactions";
-        """,
         "nutriscore": """
             SELECT * FROM "NS_noOutliers";
         """
@@ -367,7 +454,7 @@ def main():
     data = get_cached_data(db_instance, QUERIES)
 
     filtered_data = data.get("filtered_data")
-    interaction_data = data.get("raw_interactions")
+    interaction_data = load_interaction_data(db_instance)
     nutriscore_data = data.get("nutriscore")
     display_header()
     "---"
@@ -1,7 +1,10 @@
+import re
 import logging
 import streamlit as st
 import plotly.express as px
+import plotly.graph_objects as go
 import tags_nutriscore_correlation
+from tag_query import TagQuery, TagQuerySyntaxError, normalize_tag
 from core.asset_manager import get_asset_path
 
 
@@ -25,7 +28,8 @@ def display_datatable(all_recipes, label_choice='A'):
                      hide_index=True)
 
 
-def display_choosing_labels(all_recipes_proccessed, all_recipes):
+def display_choosing_labels(all_recipes_proccessed, all_recipes,
+                            aggregates=None, tag=None):
     """
     Display the choosing labels section
 
@@ -33,6 +37,9 @@ def display_choosing_labels(all_recipes_proccessed, all_recipes):
         all_recipes_proccessed (pd.DataFrame): DataFrame of all recipes
         processed have only the nutrient columns
         all_recipes (pd.DataFrame): DataFrame of all recipes
+        aggregates (TagAggregates): The precomputed aggregates of the tags,
+        used instead of the recipes for a single tag
+        tag (str): The single tag served from the aggregates
 
     Returns:
         None
@@ -60,6 +67,8 @@ def display_choosing_labels(all_recipes_proccessed, all_recipes):
         choix = st.radio('', labels, index=0)
         if choix:
             with col1:
+                if aggregates is not None:
+                    all_recipes = aggregates.first_recipes(tag, choix)
                 display_datatable(all_recipes, choix)
     st.markdown(
         """
@@ -76,8 +85,14 @@ def display_choosing_labels(all_recipes_proccessed, all_recipes):
         f'Statistical description of the recipes with the {choix} label'
     )
 
-    df_choix = all_recipes_proccessed[all_recipes_proccessed['label'] == choix]
-    dfsort_stats = display_statistical_description(df_choix, choix)
+    if aggregates is not None:
+        dfsort_stats = aggregates.nutrient_stats(tag, choix)
+        st.table(dfsort_stats.round(2))
+    else:
+        df_choix = all_recipes_proccessed[
+            all_recipes_proccessed['label'] == choix
+        ]
+        dfsort_stats = display_statistical_description(df_choix, choix)
 
     display_bar_chart(dfsort_stats)
 
@@ -155,7 +170,8 @@ def display_bar_chart(dfsort_stats):
 def select_to_process(all_recipes,
                       all_recipes_proccessed,
                       highest_recipes,
-                      tags_input):
+                      tags_input,
+                      aggregates=None):
     """
     Processing after the tags are selected
 
@@ -167,12 +183,17 @@ def select_to_process(all_recipes,
         highest_recipes (pd.DataFrame): DataFrame of the recipes that have
         the highest nutriscore
         tags_input (str): The selected tags to process
+        aggregates (TagAggregates): The precomputed aggregates of the tags,
+        used instead of the recipes when tags_input is a single tag
 
     Returns:
         None"""
     if tags_input:
         try:
-            display_boxplot(all_recipes, tags_input)
+            if aggregates is not None:
+                display_boxplot_aggregates(aggregates, tags_input)
+            else:
+                display_boxplot(all_recipes, tags_input)
             st.write(
                 """
                 The boxplot above represents the main distribution of recipes
@@ -183,7 +204,8 @@ def select_to_process(all_recipes,
 
             st.subheader('Learning more with label study')
 
-            display_choosing_labels(all_recipes_proccessed, all_recipes)
+            display_choosing_labels(all_recipes_proccessed, all_recipes,
+                                    aggregates, tags_input)
 
             st.write(
                 """
@@ -308,9 +330,30 @@ def display_select_tools():
 
     if 'other' in selected_options:
         custom_input = st.text_input(
-            'Entry your tags here (using only comma to separate tags):'
+            'Entry your tags here (using comma to separate tags, or a query '
+            'with AND, OR, NOT and parentheses, e.g. '
+            '"vegetarian AND (low carb OR low sodium) NOT dessert"):'
         )
         st.write(f'_You entered_: {custom_input}')
+        if not custom_input.strip():
+            st.warning('Please enter at least one tag')
+            st.stop()
+        is_query = TagQuery.is_boolean(custom_input)
+        if is_query:
+            try:
+                TagQuery(custom_input)
+            except TagQuerySyntaxError as e:
+                st.error(f'Invalid tag query: {e}')
+                st.stop()
+        else:
+            custom_input = ','.join(
+                normalize_tag(tag) for tag in custom_input.split(',')
+            )
+        unknown = display_tag_suggestions(custom_input)
+        if unknown:
+            st.warning(f'Unknown tags: {", ".join(unknown)}')
+            if not is_query:
+                st.stop()
         tags_input = custom_input
     else:
         tags_input = ','.join(selected_options)
@@ -319,6 +362,58 @@ def display_select_tools():
     return tags_input
 
 
+def display_tag_suggestions(custom_input):
+    """
+    Display the most frequent tags completing the tag being typed
+
+    Args:
+        custom_input (str): The tags or the tag query typed by the user
+
+    Returns:
+        list: The tags of the input missing from the vocabulary
+    """
+    vocabulary = tags_nutriscore_correlation.get_tag_vocabulary()
+    # The tag being typed follows the last operator, comma or parenthesis
+    fragment = re.split(r'[(),]|\b(?:AND|OR|NOT)\b', custom_input)[-1]
+    completions = vocabulary.complete(fragment, k=8)
+    if completions:
+        st.caption('Suggestions: ' + ', '.join(
+            f'{tag} ({count} recipes)' for tag, count in completions
+        ))
+    if TagQuery.is_boolean(custom_input):
+        tags = TagQuery(custom_input).tags
+    else:
+        tags = {tag for tag in custom_input.split(',') if tag}
+    return sorted(tag for tag in tags if tag not in vocabulary)
+
+
+def display_related_tags(tags_input, k=5):
+    """
+    Display the expected number of recipes of the selected tags and the
+    tags most often combined with them
+
+    Args:
+        tags_input (str): The selected tags, separated by commas
+        k (int): The maximum number of related tags
+
+    Returns:
+        list: The related tags and their expected number of recipes
+    """
+    if not tags_input or TagQuery.is_boolean(tags_input):
+        return []
+    tags = [tag for tag in tags_input.split(',') if tag]
+    cooccurrence = tags_nutriscore_correlation.get_tag_cooccurrence()
+    size = cooccurrence.expected_size(tags)
+    bound = 'at most ' if len(set(tags)) > 2 else ''
+    related = cooccurrence.related(tags, k=k)
+    st.caption(f'Expected result: {bound}{size} recipes')
+    if related:
+        st.caption('Related tags: ' + ', '.join(
+            f'{tag} ({count} recipes together)' for tag, count in related
+        ))
+    return related
+
+
 def display_boxplot(all_recipes, tags_input):
     """
     Display the boxplot of the nutriscore & label of recipes having the tags
@@ -345,6 +440,41 @@ def display_boxplot(all_recipes, tags_input):
         """, unsafe_allow_html=True)
 
 
+def display_boxplot_aggregates(aggregates, tag):
+    """
+    Display the boxplot of the nutriscore & label of recipes having a tag,
+    from the precomputed aggregates of the tag
+
+    Args:
+        aggregates (TagAggregates): The precomputed aggregates of the tags
+        tag (str): The selected tag
+
+    Returns:
+        None
+    """
+    stats = aggregates.box_stats(tag)
+    fig = go.Figure(go.Box(
+        x=stats.index.tolist(),
+        q1=stats['q1'], median=stats['median'], q3=stats['q3'],
+        mean=stats['mean'], lowerfence=stats['lowerfence'],
+        upperfence=stats['upperfence']
+    ))
+    fig.update_layout(
+        title=f"""
+        <i>Distribution of nutriscore of all recipes having
+        <span style='background-color: #FFFF00'>{tag}</span>
+        and their labels associated</i>""",
+        xaxis_title='label', yaxis_title='nutriscore',
+        width=500, height=400
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.markdown(
+        f"""<div style="text-align: right; font-size:12px"><i>
+        {aggregates.count(tag)} recipes in total
+        </i></div>
+        """, unsafe_allow_html=True)
+
+
 def main():
     """
     Main function to display the tags
@@ -362,11 +492,19 @@ def main():
         display_tagscloud()
     with left:
         tags_input = display_select_tools()
+        display_related_tags(tags_input)
     "----"
 
-    all_recipes, all_recipes_proccessed, highest_recipes = (
-        tags_nutriscore_correlation.main(tags_input)
-    )
+    # A single tag is served from the precomputed aggregates
+    aggregates = tags_nutriscore_correlation.get_tag_aggregates()
+    if aggregates is not None and tags_input in aggregates:
+        logger.info(f"Tag {tags_input} served from the tag aggregates")
+        all_recipes = all_recipes_proccessed = highest_recipes = None
+    else:
+        aggregates = None
+        all_recipes, all_recipes_proccessed, highest_recipes = (
+            tags_nutriscore_correlation.main(tags_input)
+        )
     st.markdown(
         f"""<h2 style='text-align: center;'>Visualisation of the recipes with
         <span style='background-color: #FFFF00'>{tags_input}</span></h2>""",
@@ -375,7 +513,8 @@ def main():
     select_to_process(all_recipes,
                       all_recipes_proccessed,
                       highest_recipes,
-                      tags_input)
+                      tags_input,
+                      aggregates)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
+import plotly.express as px
 import logging
+from calcul_nutriscore import GrilleExplorer
 from core.asset_manager import get_asset_path
+from core.fingerprint import data_fingerprint
 from db.db_instance import db_instance
 
 logger = logging.getLogger("pages.appendix")
@@ -36,6 +39,52 @@ def get_cached_data(_db_instance, query):
         return None
 
 
+@st.cache_data
+def get_data_version(_db_instance, query):
+    """
+    Compute the version of the fetched data once, when it is loaded
+
+    Parameters
+    ----------
+    _db_instance: db_instance
+        The database instance object
+
+    query: str
+        The query to fetch the data from the database
+
+    Returns
+    -------
+    str
+        The fingerprint of the data, None if it could not be fetched
+    """
+    data = get_cached_data(_db_instance, query)
+    return None if data is None else data_fingerprint(data)
+
+
+@st.cache_resource
+def get_grille_explorer(_data, dataset, version):
+    """
+    Build the what-if grille explorer once for all sessions.
+
+    Parameters
+    ----------
+    _data: pd.DataFrame
+        The nutritional values of all recipes
+    dataset: str
+        The name of the dataset
+    version: str
+        The version of the data. With the name of the dataset, it keys the
+        cache, so new data gets a new explorer
+
+    Returns
+    -------
+    GrilleExplorer
+        The explorer of the dataset
+    """
+    logger.debug(f"Building the grille explorer of {dataset} {version}")
+    return GrilleExplorer(_data)
+
+
 def display_header():
     """
     Display the header of the page, with the title "Appendix"
@@ -163,6 +212,63 @@ def display_example_calculation(df2: pd.DataFrame):
     logger.debug("Example of Nutriscore calculation displayed")
 
 
+def display_whatif_explorer(data_with_outliers: pd.DataFrame,
+                            version: str = None):
+    """
+    Display an editable grille and the label distribution of all recipes
+    calculated with it.
+
+    Parameters
+    ----------
+    data_with_outliers: pd.DataFrame
+        The DataFrame containing the nutritional values of all recipes
+    version: str, optional
+        The version of the data, its fingerprint if not given
+
+    Returns
+    -------
+    None
+    """
+    st.write("### What-if grid explorer")
+    st.write(
+        """
+        Edit the thresholds or the points of the grid below to see how the
+        labels of all the recipes would change.
+        """
+    )
+    grille = pd.read_csv(
+        get_asset_path("data/nutrient_table.csv"), encoding='utf-8-sig'
+    )
+    edited_grille = st.data_editor(grille, key="whatif_grille")
+
+    if version is None:
+        version = data_fingerprint(data_with_outliers)
+    explorer = get_grille_explorer(
+        data_with_outliers, "NS_withOutliers", version
+    )
+    try:
+        reference = explorer.label_distribution(grille)
+        whatif = explorer.label_distribution(edited_grille)
+    except ValueError as e:
+        st.error(f"Invalid grid: {e}")
+        return
+
+    distribution = pd.concat(
+        {'Current grid': reference['share'], 'Edited grid': whatif['share']},
+        names=['grid']
+    ).reset_index()
+    fig = px.bar(
+        distribution,
+        x='label',
+        y='share',
+        color='grid',
+        barmode='group',
+        title='Nutri-Score label distribution of all recipes'
+    )
+    fig.update_layout(yaxis_tickformat='.0%')
+    st.plotly_chart(fig)
+    logger.debug(f"What-if label distribution displayed: {whatif}")
+
 
 def display_references():
     """
@@ -202,6 +308,9 @@ def main():
     display_nutriscore_description()
     display_nutriscore_grid()
     display_example_calculation(data_with_outliers)
+    display_whatif_explorer(
+        data_with_outliers, get_data_version(db_instance, query)
+    )
     display_references()
     logger.info("Appendix page fully displayed")
 
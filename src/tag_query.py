@@ -0,0 +1,326 @@
+import re
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("tag_query")
+
+# Operators of the query language, in upper case to be told from tag words
+OPERATORS = ('AND', 'OR', 'NOT')
+TOKEN_PATTERN = re.compile(r'\(|\)|,|[^\s(),]+')
+
+
+class TagQuerySyntaxError(ValueError):
+    """Error raised for a malformed tag query."""
+
+
+def normalize_tag(tag):
+    """
+    Normalize a tag as in the exploded tag table: lower case, hyphens
+    replaced by spaces and single spaces between words.
+
+    Args:
+        tag (str): The tag typed by the user.
+
+    Returns:
+        str: The normalized tag.
+    """
+    return ' '.join(tag.lower().replace('-', ' ').split())
+
+
+def tokenize(text):
+    """
+    Split a query into operators, parentheses and tags.
+
+    Consecutive words which are not operators form one tag, so that
+    multi-word tags such as `low carb` need no quotes. A comma is an AND.
+
+    Args:
+        text (str): The query.
+
+    Returns:
+        list: The tokens, as (kind, value) tuples.
+    """
+    tokens = []
+    words = []
+    for token in TOKEN_PATTERN.findall(text):
+        if token in OPERATORS or token in '(),':
+            if words:
+                tokens.append(('tag', normalize_tag(' '.join(words))))
+                words = []
+            kind = 'AND' if token == ',' else token
+            tokens.append((kind, token))
+        else:
+            words.append(token)
+    if words:
+        tokens.append(('tag', normalize_tag(' '.join(words))))
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent parser of the tag query grammar:
+
+        query   := and_expr (OR and_expr)*
+        and_expr := unary ((AND unary) | (NOT unary))*
+        unary   := NOT unary | '(' query ')' | tag
+
+    A NOT between two operands means AND NOT.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+        return None
+
+    def take(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise TagQuerySyntaxError("Empty tag query")
+        tree = self.query()
+        if self.peek() is not None:
+            raise TagQuerySyntaxError(
+                f"Unexpected '{self.tokens[self.position][1]}'"
+            )
+        return tree
+
+    def query(self):
+        children = [self.and_expr()]
+        while self.peek() == 'OR':
+            self.take()
+            children.append(self.and_expr())
+        return children[0] if len(children) == 1 else ('or', children)
+
+    def and_expr(self):
+        children = [self.unary()]
+        while self.peek() in ('AND', 'NOT'):
+            if self.take()[0] == 'NOT':
+                children.append(('not', self.unary()))
+            else:
+                children.append(self.unary())
+        return children[0] if len(children) == 1 else ('and', children)
+
+    def unary(self):
+        kind = self.peek()
+        if kind == 'NOT':
+            self.take()
+            return ('not', self.unary())
+        if kind == '(':
+            self.take()
+            tree = self.query()
+            if self.peek() != ')':
+                raise TagQuerySyntaxError("Missing closing parenthesis")
+            self.take()
+            return tree
+        if kind == 'tag':
+            return self.take()
+        if kind is None:
+            raise TagQuerySyntaxError("Unexpected end of the tag query")
+        raise TagQuerySyntaxError(
+            f"Unexpected '{self.tokens[self.position][1]}'"
+        )
+
+
+class TagQuery:
+    """
+    Boolean query over recipe tags, such as
+    `vegetarian AND (low carb OR low sodium) NOT dessert`.
+
+    The query is parsed once into a tree of ('tag', name), ('and', nodes),
+    ('or', nodes) and ('not', node) tuples. It is evaluated against a
+    `TagIndex`: the operands of each AND are ordered by estimated postings
+    size, smallest first, so the rows of the most selective tag are
+    filtered by bit lookups in the other operands, and the negations are
+    applied last. OR and NOT are word-wise operations on bitmaps.
+
+    Args:
+        text (str): The query. Operators are AND, OR and NOT in upper
+    case, with parentheses, and a comma is an AND.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tree = _Parser(tokenize(text)).parse()
+
+    @staticmethod
+    def is_boolean(text):
+        """
+        Tell whether a tag input uses operators or parentheses, rather than
+        a plain comma-separated list of tags.
+
+        Args:
+            text (str): The tag input.
+
+        Returns:
+            bool: True if the input is a boolean query.
+        """
+        return any(value in OPERATORS + ('(', ')')
+                   for _, value in tokenize(text))
+
+    @property
+    def tags(self):
+        """set: The tags of the query."""
+        tags = set()
+
+        def collect(node):
+            if node[0] == 'tag':
+                tags.add(node[1])
+            elif node[0] == 'not':
+                collect(node[1])
+            else:
+                for child in node[1]:
+                    collect(child)
+        collect(self.tree)
+        return tags
+
+    @property
+    def canonical(self):
+        """
+        tuple: The query tree with the operands of each AND and OR sorted,
+        equal for the queries which only differ by the order of operands.
+        """
+        def sort(node):
+            if node[0] == 'tag':
+                return node
+            if node[0] == 'not':
+                return ('not', sort(node[1]))
+            return (node[0], tuple(sorted(map(sort, node[1]), key=repr)))
+        return sort(self.tree)
+
+    def estimate(self, node, index):
+        """
+        Estimate the number of recipes matching a node of the query.
+
+        Args:
+            node (tuple): The node of the query.
+            index (TagIndex): The tag index.
+
+        Returns:
+            int: The upper bound of the number of matching recipes.
+        """
+        n = len(index.recipes)
+        kind = node[0]
+        if kind == 'tag':
+            return index.postings_size(node[1])
+        if kind == 'not':
+            return n
+        if kind == 'or':
+            return min(n, sum(self.estimate(c, index) for c in node[1]))
+        return min([n] + [self.estimate(c, index)
+                          for c in node[1] if c[0] != 'not'])
+
+    def plan(self, index, node=None):
+        """
+        Order the operands of the query for evaluation.
+
+        Args:
+            index (TagIndex): The tag index.
+            node (tuple): The node to plan, the whole query by default.
+
+        Returns:
+            tuple: The query tree with the positive operands of each AND
+        sorted by estimated size, followed by the negated operands.
+        """
+        node = self.tree if node is None else node
+        kind = node[0]
+        if kind == 'tag':
+            return node
+        if kind == 'not':
+            return ('not', self.plan(index, node[1]))
+        children = [self.plan(index, child) for child in node[1]]
+        if kind == 'or':
+            return ('or', children)
+        positives = sorted(
+            (c for c in children if c[0] != 'not'),
+            key=lambda c: self.estimate(c, index)
+        )
+        negatives = [c for c in children if c[0] == 'not']
+        return ('and', positives + negatives)
+
+    def _bitmap(self, node, index):
+        """
+        Evaluate a planned node to a bitmap of recipe rows.
+        """
+        kind = node[0]
+        if kind == 'tag':
+            return index.tag_bitmap(node[1])
+        if kind == 'or':
+            bitmap = np.zeros(index.n_words, dtype=np.uint64)
+            for child in node[1]:
+                bitmap |= self._bitmap(child, index)
+            return bitmap
+        if kind == 'not':
+            bitmap = ~self._bitmap(node[1], index)
+            # Clear the padding bits after the last recipe
+            padding = index.n_words * 64 - len(index.recipes)
+            if padding:
+                bitmap[-1] &= np.uint64((1 << (64 - padding)) - 1)
+            return bitmap
+        rows = self._and_rows(node, index)
+        if rows is not None:
+            return index.to_bitmap(rows)
+        bitmap = self._bitmap(node[1][0], index).copy()
+        for child in node[1][1:]:
+            if not bitmap.any():
+                break
+            bitmap &= self._bitmap(child, index)
+        return bitmap
+
+    def _and_rows(self, node, index):
+        """
+        Evaluate a planned AND node by filtering the rows of its smallest
+        operand, if that operand is a tag stored as sorted rows.
+
+        Returns None if the smallest operand is not such a tag.
+        """
+        first = node[1][0]
+        if first[0] != 'tag' or index.positions.get(first[1]) in \
+                index.bitmaps:
+            return None
+        rows = index.tag_rows(first[1])
+        for child in node[1][1:]:
+            if not len(rows):
+                break
+            negate = child[0] == 'not'
+            operand = child[1] if negate else child
+            if operand[0] == 'tag' and not negate and \
+                    index.positions.get(operand[1]) not in index.bitmaps:
+                rows = np.intersect1d(
+                    rows, index.tag_rows(operand[1]), assume_unique=True
+                )
+                continue
+            words = self._bitmap(operand, index)[rows >> 6]
+            bits = (words >> (rows & 63).astype(np.uint64)) & np.uint64(1)
+            rows = rows[bits == (0 if negate else 1)]
+        return rows
+
+    def evaluate(self, index):
+        """
+        Get the recipes matching the query.
+
+        Args:
+            index (TagIndex): The tag index.
+
+        Returns:
+            np.ndarray: The sorted ids of the matching recipes.
+        """
+        plan = self.plan(index)
+        logger.debug(f"Plan of the tag query {self.text!r}: {plan}")
+        rows = None
+        if plan[0] == 'tag':
+            rows = index.tag_rows(plan[1])
+        elif plan[0] == 'and':
+            rows = self._and_rows(plan, index)
+        if rows is None:
+            rows = index.from_bitmap(self._bitmap(plan, index))
+        ids = index.recipes[rows]
+        logger.info(f"Tag query {self.text!r} matches {len(ids)} recipes")
+        return ids
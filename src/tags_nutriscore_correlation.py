@@ -3,11 +3,16 @@ import os
 import pandas as pd
 import numpy as np
 import sys
+import time
+import threading
 import argparse
+from bisect import bisect_left
+from cachetools import LRUCache
 import logging
-from functools import reduce
 import streamlit as st
+from scipy import sparse
 from db.db_instance import db_instance
+from tag_query import TagQuery, normalize_tag
 sys.path.append(os.path.abspath(
     os.path.join(os.path.dirname(__file__), '..', 'utils')))
 
@@ -95,62 +100,1369 @@ class Utils:
 class PreprocessTags:
     """Class for preprocessing tags in the dataset."""
 
+    # Words of the tag lists, as in Utils.get_text_from_string
+    TAG_PATTERN = r'[a-zA-Z0-9-]+'
+    # Separator of the recipes when their tag lists are parsed at once
+    RECIPE_SEPARATOR = '\x00'
+
     def __init__(self, data):
         """
-        Initialize the PreprocessTags class.
+        Initialize the PreprocessTags class.
+
+        Args:
+            data (DataFrame): The input dataset containing tags.
+        """
+        self.data = data
+        rows, tags = self.parse_tags(data)
+        self.idrecipes = data['id'].tolist()
+        self.exploded = self._to_frame(data, rows, tags)
+        # Per-recipe lists of the preprocessed tags
+        lengths = np.bincount(rows[:len(tags)], minlength=len(data))
+        self.tags = [
+            part.tolist() for part in np.split(tags, np.cumsum(lengths)[:-1])
+        ] if len(data) else []
+
+    @staticmethod
+    def normalize_tags(tags):
+        """
+        Preprocess tags by putting them in lowercase and replacing hyphens
+        with spaces, with vectorized string methods.
+
+        Args:
+            tags (Series): The raw tags, one per row.
+
+        Returns:
+            Series: The preprocessed tags.
+        """
+        return tags.str.lower().str.replace('-', ' ', regex=False)
+
+    @classmethod
+    def parse_tags(cls, data):
+        """
+        Extract and preprocess the tags of raw recipes in a single compiled
+        pass.
+
+        The tag lists of all recipes are joined with a separator and split
+        into words by one regular expression. The words are then
+        dictionary-encoded, so only the few hundred distinct tags are
+        preprocessed.
+
+        Args:
+            data (DataFrame): The raw recipes, with 'tags'.
+
+        Returns:
+            tuple: The position of the recipe of each tag, and the
+        preprocessed tags. The positions of the recipes without tags are
+        appended after the tags.
+        """
+        texts = data['tags'].fillna('').tolist()
+        # Each recipe starts with a separator, so the separator has code 0
+        words = re.findall(
+            f'{cls.TAG_PATTERN}|{cls.RECIPE_SEPARATOR}',
+            ''.join(cls.RECIPE_SEPARATOR + text for text in texts)
+        )
+        codes, uniques = pd.factorize(np.array(words, dtype=object))
+        separator = codes == 0
+        rows = np.cumsum(separator)[~separator] - 1
+        tags = cls.normalize_tags(
+            pd.Series(uniques, dtype=object)
+        ).to_numpy()[codes[~separator]]
+        empty = np.flatnonzero(np.bincount(rows, minlength=len(texts)) == 0)
+        return np.concatenate([rows, empty]), tags
+
+    @staticmethod
+    def _to_frame(data, rows, tags):
+        """
+        Build the exploded tag table of parsed tags, in the order of the
+        recipes, with a missing tag for the recipes without tags, as
+        DataFrame.explode.
+        """
+        values = np.concatenate(
+            [tags, np.full(len(rows) - len(tags), np.nan, dtype=object)]
+        )
+        order = np.argsort(rows, kind='stable')
+        return pd.DataFrame({
+            'idrecipes': data['id'].to_numpy()[rows[order]],
+            'tags': values[order]
+        })
+
+    @classmethod
+    def explode_tags(cls, data):
+        """
+        Extract, explode and preprocess the tags of raw recipes, without
+        building per-recipe lists.
+
+        Args:
+            data (DataFrame): The raw recipes, with 'id' and 'tags'.
+
+        Returns:
+            DataFrame: One row per recipe and tag, with 'idrecipes' and
+        'tags', as formatter_tags_data.
+        """
+        rows, tags = cls.parse_tags(data)
+        return cls._to_frame(data, rows, tags)
+
+    def split_text_tag(self):
+        """
+        Preprocess recipe tags by putting them in lowercase and
+        removing hyphens.
+
+        Returns:
+            list: Preprocessed tags.
+        """
+        distinct = pd.unique(pd.Series(
+            [tag for tags in self.tags for tag in tags], dtype=object
+        ))
+        normalized = dict(zip(
+            distinct, self.normalize_tags(pd.Series(distinct, dtype=object))
+        ))
+        self.tags = [[normalized[tag] for tag in tags] for tags in self.tags]
+        return self.tags
+
+    def get_rawdata_tags(self):
+        """
+        Extract raw tags and ids from the dataset.
+
+        Returns:
+            tuple: A tuple containing lists of tags and ids.
+        """
+        tags = self.data['tags'].str.findall(self.TAG_PATTERN).tolist()
+        idrecipes = self.data['id'].tolist()
+        return tags, idrecipes
+
+    def formatter_tags_data(self):
+        """
+        Format the tags data for further processing.
+
+        Returns:
+            DataFrame: A DataFrame with formatted tags data.
+        """
+        return self.exploded.copy()
+
+
+def rebuild_tag_table(database=db_instance, source_table='raw_recipes',
+                      target_table='explodetags', chunksize=50000):
+    """
+    Rebuild the exploded tag table from the raw recipes, chunk by chunk.
+
+    The raw recipes are streamed from the database, the tags of each chunk
+    are exploded and preprocessed in a single regular expression pass and
+    bulk loaded into the staging table `<target_table>_staging`. Once every
+    chunk is written, the staging table replaces the target table in a
+    single transaction, so readers never see a partial tag table.
+
+    Args:
+        database (Database): The database connection.
+        source_table (str): The table of the raw recipes.
+        target_table (str): The exploded tag table to rebuild.
+        chunksize (int): The number of recipes of each chunk.
+
+    Returns:
+        int: The number of rows written to the target table.
+    """
+    start = time.perf_counter()
+    staging_table = f'{target_table}_staging'
+    n_rows = 0
+    # The staging table left by a failed run is replaced
+    if_exists = 'replace'
+    for chunk in database.fetch_chunks(
+            f'SELECT id, tags FROM "{source_table}";', chunksize):
+        exploded = PreprocessTags.explode_tags(chunk)
+        database.write_data(exploded, staging_table, if_exists=if_exists)
+        if_exists = 'append'
+        n_rows += len(exploded)
+        logger.info(f"{n_rows} tag rows written to {staging_table}")
+    if if_exists == 'replace':
+        logger.warning(f"No recipes in {source_table}, {target_table} kept")
+        return 0
+    database.replace_table(staging_table, target_table)
+    logger.info(
+        f"{target_table} rebuilt with {n_rows} rows in "
+        f"{time.perf_counter() - start:.1f} s"
+    )
+    return n_rows
+
+
+class EncodedTags:
+    """
+    Exploded tags (one pair per recipe and tag) in dictionary-encoded form.
+
+    Instead of one Python string per pair, each pair is an int32 recipe row
+    and an int16 tag code. The rows point into the sorted int32 recipe ids,
+    and the codes into the sorted tag dictionary, which only holds the few
+    hundred distinct tags.
+
+    Args:
+        rows (np.ndarray): The recipe row of each pair.
+        codes (np.ndarray): The tag code of each pair.
+        recipes (np.ndarray): The sorted recipe ids of the rows.
+        tags (list): The sorted distinct tags of the codes.
+    """
+
+    def __init__(self, rows, codes, recipes, tags):
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.codes = np.asarray(codes, dtype=np.int16)
+        self.recipes = np.asarray(recipes, dtype=np.int32)
+        self.tags = list(tags)
+
+    @classmethod
+    def from_ids(cls, ids, codes, tags):
+        """
+        Encode pairs of recipe ids and tag codes.
+
+        Args:
+            ids (np.ndarray): The recipe id of each pair.
+            codes (np.ndarray): The tag code of each pair.
+            tags (list): The sorted distinct tags of the codes.
+
+        Returns:
+            EncodedTags: The encoded tags.
+        """
+        if len(tags) > np.iinfo(np.int16).max:
+            raise ValueError(f"Too many distinct tags: {len(tags)}")
+        ids = np.asarray(ids, dtype=np.int32)
+        if len(ids) and (ids[1:] >= ids[:-1]).all():
+            # Stored pairs are sorted by recipe: the rows are the running
+            # count of recipe changes, without sorting again
+            starts = np.empty(len(ids), dtype=bool)
+            starts[0] = True
+            np.not_equal(ids[1:], ids[:-1], out=starts[1:])
+            recipes = ids[starts]
+            rows = np.cumsum(starts, dtype=np.int32) - 1
+        else:
+            recipes, rows = np.unique(ids, return_inverse=True)
+        return cls(rows, codes, recipes, tags)
+
+    @classmethod
+    def from_exploded(cls, tagsdata, tag_column='tags',
+                      id_column='idrecipes'):
+        """
+        Encode an exploded tag table, such as the explodetags table.
+
+        Args:
+            tagsdata (DataFrame): The exploded tag table.
+            tag_column (str): The column of the tags.
+            id_column (str): The column of the recipe ids.
+
+        Returns:
+            EncodedTags: The encoded tags.
+        """
+        pairs = tagsdata[[tag_column, id_column]].dropna()
+        codes, tags = pd.factorize(pairs[tag_column], sort=True)
+        encoded = cls.from_ids(pairs[id_column].to_numpy(), codes, tags)
+        logger.info(
+            f"Tags encoded: {len(encoded)} pairs, {len(tags)} tags, "
+            f"{encoded.nbytes} bytes"
+        )
+        return encoded
+
+    @classmethod
+    def from_preprocessed(cls, preprocessed):
+        """
+        Encode the tags of preprocessed raw recipes.
+
+        Args:
+            preprocessed (PreprocessTags): The preprocessed recipes.
+
+        Returns:
+            EncodedTags: The encoded tags.
+        """
+        return cls.from_exploded(preprocessed.formatter_tags_data())
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def nbytes(self):
+        """int: The memory used by the arrays and the tag dictionary."""
+        tags = sum(sys.getsizeof(tag) for tag in self.tags)
+        return sum([self.rows.nbytes, self.codes.nbytes, self.recipes.nbytes,
+                    tags])
+
+    def to_frame(self):
+        """
+        Decode the pairs to an exploded tag table.
+
+        Returns:
+            DataFrame: The 'idrecipes' and 'tags' of each pair.
+        """
+        return pd.DataFrame({
+            'idrecipes': self.recipes[self.rows].astype(np.int64),
+            'tags': np.asarray(self.tags, dtype=object)[self.codes]
+        })
+
+    def to_arrow(self):
+        """
+        Convert the pairs to an Arrow table sorted by recipe, with the
+        recipe ids as int32 and the tags as a dictionary column with int16
+        codes.
+
+        Returns:
+            pyarrow.Table: The encoded pairs.
+        """
+        import pyarrow as pa
+
+        order = np.argsort(self.rows, kind='stable')
+        return pa.table({
+            'idrecipes': pa.array(self.recipes[self.rows[order]], pa.int32()),
+            'tags': pa.DictionaryArray.from_arrays(
+                pa.array(self.codes[order], pa.int16()),
+                pa.array(self.tags, pa.string())
+            )
+        })
+
+    def to_parquet(self, path):
+        """
+        Write the encoded pairs to a Parquet file, in a single row group so
+        that each column is read back as a single Arrow chunk.
+
+        Args:
+            path (str): The path of the Parquet file.
+        """
+        import pyarrow.parquet as pq
+
+        table = self.to_arrow()
+        pq.write_table(table, path, row_group_size=max(len(table), 1))
+        logger.info(f"Encoded tags written to {path}")
+
+    @classmethod
+    def read_parquet(cls, path):
+        """
+        Read encoded pairs from a Parquet file written by `to_parquet`.
+
+        The file is memory-mapped and its pages are decoded by Arrow. The
+        recipe ids are taken as a numpy view of the decoded int32 buffer.
+        The tag codes come back as int32 dictionary indices and are copied
+        once to int16. The tags are not decoded to one string per pair,
+        only the dictionary is.
+
+        Args:
+            path (str): The path of the Parquet file.
+
+        Returns:
+            EncodedTags: The encoded tags.
+        """
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, memory_map=True)
+        ids = table.column('idrecipes').combine_chunks()
+        tags = table.column('tags').combine_chunks()
+        return cls.from_ids(
+            ids.to_numpy(zero_copy_only=True),
+            tags.indices.to_numpy(zero_copy_only=True),
+            tags.dictionary.to_pylist()
+        )
+
+    def to_database(self, database, table_name='explodetags_encoded'):
+        """
+        Store the encoded pairs in two tables: the pairs (recipe id and tag
+        code) and the tag dictionary, suffixed '_dictionary'.
+
+        Args:
+            database (Database): The database connection.
+            table_name (str): The name of the table of the pairs.
+        """
+        order = np.argsort(self.rows, kind='stable')
+        database.write_data(
+            pd.DataFrame({
+                'idrecipes': self.recipes[self.rows[order]],
+                'tag_code': self.codes[order]
+            }),
+            table_name,
+            if_exists='replace'
+        )
+        database.write_data(
+            pd.DataFrame({
+                'tag_code': np.arange(len(self.tags), dtype=np.int16),
+                'tag': self.tags
+            }),
+            f'{table_name}_dictionary',
+            if_exists='replace'
+        )
+        logger.info(f"Encoded tags stored in {table_name}")
+
+    @classmethod
+    def from_database(cls, database, table_name='explodetags_encoded'):
+        """
+        Load encoded pairs stored by `to_database`.
+
+        Args:
+            database (Database): The database connection.
+            table_name (str): The name of the table of the pairs.
+
+        Returns:
+            EncodedTags: The encoded tags.
+        """
+        pairs = database.fetch_data(
+            f'SELECT idrecipes, tag_code FROM "{table_name}" '
+            'ORDER BY idrecipes;'
+        )
+        dictionary = database.fetch_data(
+            f'SELECT tag_code, tag FROM "{table_name}_dictionary" '
+            'ORDER BY tag_code;'
+        )
+        return cls.from_ids(
+            pairs['idrecipes'].to_numpy(),
+            pairs['tag_code'].to_numpy(),
+            dictionary['tag'].tolist()
+        )
+
+
+class TagIndex:
+    """
+    Inverted index of the recipes of each tag, in CSR form.
+
+    The distinct tags are sorted and numbered. The recipe ids of the tag
+    number i are the sorted, unique int32 values
+    `recipe_ids[offsets[i]:offsets[i + 1]]`, so a lookup costs the size of
+    the postings of the tag instead of a scan of the exploded tag table.
+    The arrays are read-only, lookups return views on them.
+
+    For intersections, the recipe ids are also encoded as dense row
+    numbers. As in roaring bitmaps, a tag whose postings take more memory
+    as int32 rows than as one bit per recipe is stored as a bitmap of
+    uint64 words, so multi-tag intersections of popular tags are word-wise
+    AND operations.
+
+    Args:
+        tags (np.ndarray): The sorted distinct tags.
+        offsets (np.ndarray): The start of the postings of each tag, with
+    the total number of postings appended.
+        recipe_ids (np.ndarray): The recipe ids of all tags, concatenated.
+    """
+
+    def __init__(self, tags, offsets, recipe_ids):
+        self.tags = np.asarray(tags, dtype=object)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.recipe_ids = np.asarray(recipe_ids, dtype=np.int32)
+        # Dense row numbers of the recipes, in the order of their ids
+        self.recipes = np.unique(self.recipe_ids)
+        self.rows = np.searchsorted(
+            self.recipes, self.recipe_ids).astype(np.int32)
+        self.n_words = -(-len(self.recipes) // 64)
+        for array in (self.tags, self.offsets, self.recipe_ids,
+                      self.recipes, self.rows):
+            array.flags.writeable = False
+        self.positions = {tag: i for i, tag in enumerate(self.tags)}
+        # Bitmaps of the tags smaller as bits than as int32 rows
+        sizes = np.diff(self.offsets)
+        self.bitmaps = {
+            i: self.to_bitmap(self.rows[self.offsets[i]:self.offsets[i + 1]])
+            for i in np.flatnonzero(sizes * 32 >= len(self.recipes))
+        }
+        for bitmap in self.bitmaps.values():
+            bitmap.flags.writeable = False
+
+    @classmethod
+    def from_exploded(cls, tagsdata, tag_column='tags',
+                      id_column='idrecipes'):
+        """
+        Build the index from an exploded tag table (one row per recipe and
+        tag), such as the explodetags table.
+
+        Args:
+            tagsdata (DataFrame): The exploded tag table.
+            tag_column (str): The column of the tags.
+            id_column (str): The column of the recipe ids.
+
+        Returns:
+            TagIndex: The index of the tags.
+        """
+        pairs = tagsdata[[tag_column, id_column]].dropna()
+        codes, tags = pd.factorize(pairs[tag_column], sort=True)
+        ids = pairs[id_column].to_numpy().astype(np.int32)
+        return cls.from_codes(tags, codes, ids)
+
+    @classmethod
+    def from_codes(cls, tags, codes, ids):
+        """
+        Build the index from tag codes and recipe ids.
+
+        Args:
+            tags (array-like): The sorted distinct tags.
+            codes (np.ndarray): The code of the tag of each pair, the
+        position of the tag in tags.
+            ids (np.ndarray): The recipe id of each pair.
+
+        Returns:
+            TagIndex: The index of the tags.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int32)
+        # Sort by tag then recipe id, and drop the duplicated pairs
+        order = np.lexsort((ids, codes))
+        codes, ids = codes[order], ids[order]
+        keep = np.ones(len(ids), dtype=bool)
+        keep[1:] = (codes[1:] != codes[:-1]) | (ids[1:] != ids[:-1])
+        codes, ids = codes[keep], ids[keep]
+        offsets = np.zeros(len(tags) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(tags)), out=offsets[1:])
+        logger.info(
+            f"Tag index built: {len(tags)} tags, {len(ids)} postings"
+        )
+        return cls(np.asarray(tags, dtype=object), offsets, ids)
+
+    @classmethod
+    def from_encoded(cls, encoded):
+        """
+        Build the index from dictionary-encoded exploded tags.
+
+        Args:
+            encoded (EncodedTags): The encoded tags.
+
+        Returns:
+            TagIndex: The index of the tags.
+        """
+        return cls.from_codes(
+            encoded.tags, encoded.codes, encoded.recipes[encoded.rows]
+        )
+
+    @classmethod
+    def from_preprocessed(cls, preprocessed):
+        """
+        Build the index from preprocessed raw recipes.
+
+        Args:
+            preprocessed (PreprocessTags): The preprocessed recipes.
+
+        Returns:
+            TagIndex: The index of the tags.
+        """
+        return cls.from_exploded(preprocessed.formatter_tags_data())
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __contains__(self, tag):
+        return tag in self.positions
+
+    def lookup(self, tag):
+        """
+        Get the recipes having a tag.
+
+        Args:
+            tag (str): The tag.
+
+        Returns:
+            np.ndarray: The sorted ids of the recipes having the tag, empty
+        if the tag is unknown.
+        """
+        i = self.positions.get(tag)
+        if i is None:
+            return self.recipe_ids[:0]
+        return self.recipe_ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def postings_size(self, tag):
+        """
+        Get the number of recipes having a tag.
+
+        Args:
+            tag (str): The tag.
+
+        Returns:
+            int: The number of recipes having the tag.
+        """
+        i = self.positions.get(tag)
+        return 0 if i is None else int(self.offsets[i + 1] - self.offsets[i])
+
+    def to_bitmap(self, rows):
+        """
+        Encode recipe rows as a bitmap.
+
+        Args:
+            rows (np.ndarray): The rows of the recipes.
+
+        Returns:
+            np.ndarray: The bitmap, as uint64 words.
+        """
+        bits = np.zeros(self.n_words * 64, dtype=bool)
+        bits[rows] = True
+        return np.packbits(bits, bitorder='little').view('<u8')
+
+    def from_bitmap(self, bitmap):
+        """
+        Decode a bitmap to recipe rows.
+
+        Args:
+            bitmap (np.ndarray): The bitmap, as uint64 words.
+
+        Returns:
+            np.ndarray: The sorted rows of the recipes.
+        """
+        bits = np.unpackbits(bitmap.view(np.uint8), bitorder='little')
+        return np.flatnonzero(bits).astype(np.int32)
+
+    def tag_rows(self, tag):
+        """
+        Get the rows of the recipes having a tag.
+
+        Args:
+            tag (str): The tag.
+
+        Returns:
+            np.ndarray: The sorted rows of the recipes, empty if the tag is
+        unknown.
+        """
+        i = self.positions.get(tag)
+        if i is None:
+            return self.rows[:0]
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def tag_bitmap(self, tag):
+        """
+        Get the bitmap of the recipes having a tag.
+
+        Args:
+            tag (str): The tag.
+
+        Returns:
+            np.ndarray: The bitmap of the recipes, as uint64 words. Stored
+        bitmaps are returned as is and must not be modified.
+        """
+        i = self.positions.get(tag)
+        if i in self.bitmaps:
+            return self.bitmaps[i]
+        return self.to_bitmap(self.tag_rows(tag))
+
+    def intersect(self, tags):
+        """
+        Get the recipes having all the tags.
+
+        The tags are intersected from the smallest postings. Sorted rows
+        are intersected with each other by merge, tested against bitmaps
+        by bit lookups, and bitmaps are combined by word-wise AND.
+
+        Args:
+            tags (list): The tags.
+
+        Returns:
+            np.ndarray: The sorted ids of the recipes having all the tags.
+        """
+        codes = [self.positions.get(tag) for tag in tags]
+        if not codes or None in codes:
+            return self.recipe_ids[:0].copy()
+        codes = sorted(set(codes),
+                       key=lambda i: self.offsets[i + 1] - self.offsets[i])
+        first = codes[0]
+        if first in self.bitmaps:
+            # All the other tags are larger, so they are bitmaps too
+            bitmap = self.bitmaps[first].copy()
+            for i in codes[1:]:
+                bitmap &= self.bitmaps[i]
+            rows = self.from_bitmap(bitmap)
+        else:
+            rows = self.rows[self.offsets[first]:self.offsets[first + 1]]
+            for i in codes[1:]:
+                if i in self.bitmaps:
+                    words = self.bitmaps[i][rows >> 6]
+                    bits = words >> (rows & 63).astype(np.uint64)
+                    rows = rows[bits & np.uint64(1) == 1]
+                else:
+                    rows = np.intersect1d(
+                        rows, self.rows[self.offsets[i]:self.offsets[i + 1]],
+                        assume_unique=True
+                    )
+                if not len(rows):
+                    break
+        return self.recipes[rows]
+
+
+@st.cache_resource
+def load_tag_index(_tagsdata, table_name='explodetags'):
+    """
+    Build the tag index of a table once, shared by all the sessions.
+
+    Args:
+        _tagsdata (DataFrame): The exploded tag table, not hashed.
+        table_name (str): The name of the table, used as cache key.
+
+    Returns:
+        TagIndex: The index of the tags.
+    """
+    logger.info(f"Building the tag index of {table_name}")
+    return TagIndex.from_exploded(_tagsdata)
+
+
+class TagVocabulary:
+    """
+    Vocabulary of the tags with their number of recipes, for completion.
+
+    Every word start of every tag ('low carb' and 'carb' for the tag
+    'low carb') is kept in a sorted list, so the tags completing a prefix
+    are found by binary search, and ranked by number of recipes.
+
+    Args:
+        tags (list): The distinct tags.
+        counts (list): The number of recipes of each tag.
+    """
+
+    def __init__(self, tags, counts):
+        self.tags = list(tags)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.positions = {tag: i for i, tag in enumerate(self.tags)}
+        keys = []
+        for i, tag in enumerate(self.tags):
+            words = tag.split(' ')
+            keys.extend(
+                (' '.join(words[start:]), i) for start in range(len(words))
+            )
+        keys.sort()
+        self.keys = [key for key, _ in keys]
+        self.key_tags = np.array([i for _, i in keys], dtype=np.int32)
+
+    @classmethod
+    def from_index(cls, index):
+        """
+        Build the vocabulary of a tag index.
+
+        Args:
+            index (TagIndex): The tag index.
+
+        Returns:
+            TagVocabulary: The vocabulary of the indexed tags.
+        """
+        return cls(index.tags.tolist(), np.diff(index.offsets))
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __contains__(self, tag):
+        return tag in self.positions
+
+    def count(self, tag):
+        """
+        Get the number of recipes of a tag.
+
+        Args:
+            tag (str): The tag.
+
+        Returns:
+            int: The number of recipes having the tag, 0 if unknown.
+        """
+        i = self.positions.get(tag)
+        return 0 if i is None else int(self.counts[i])
+
+    def complete(self, prefix, k=10):
+        """
+        Get the most frequent tags with a word starting with a prefix.
+
+        Args:
+            prefix (str): The beginning of the tag typed by the user.
+            k (int): The maximum number of completions.
+
+        Returns:
+            list: The (tag, number of recipes) completions, most frequent
+        first.
+        """
+        prefix = prefix.lower().replace('-', ' ').lstrip()
+        prefix = ' '.join(prefix.split()) + (' ' if prefix[-1:] == ' ' else '')
+        if not prefix.strip():
+            candidates = np.arange(len(self.tags))
+        else:
+            start = bisect_left(self.keys, prefix)
+            stop = bisect_left(self.keys, prefix + '\uffff', lo=start)
+            candidates = np.unique(self.key_tags[start:stop])
+        if len(candidates) > k:
+            top = np.argpartition(-self.counts[candidates], k - 1)[:k]
+            candidates = candidates[top]
+        # Most frequent first, then alphabetical
+        candidates = sorted(
+            candidates, key=lambda i: (-self.counts[i], self.tags[i])
+        )
+        return [(self.tags[i], int(self.counts[i])) for i in candidates]
+
+
+@st.cache_resource
+def get_tag_vocabulary(table_name='explodetags'):
+    """
+    Load the tag vocabulary once, shared by all the sessions.
+
+    Args:
+        table_name (str): The name of the exploded tag table.
+
+    Returns:
+        TagVocabulary: The vocabulary of the tags.
+    """
+    tagsdata = DatabaseTable(table_name).apply_streamlit_db()
+    return TagVocabulary.from_index(load_tag_index(tagsdata, table_name))
+
+
+class TagCooccurrence:
+    """
+    Number of recipes shared by each pair of tags.
+
+    The recipes and their tags form a sparse recipe x tag matrix X in CSR
+    form, and the co-occurrence counts are the product X.T @ X, computed
+    once. There are only a few hundred distinct tags, so the counts are
+    kept as a dense matrix and the count of a pair is a single lookup. The
+    diagonal holds the number of recipes of each tag.
+
+    Args:
+        tags (np.ndarray): The sorted distinct tags.
+        counts (np.ndarray): The tag x tag co-occurrence counts.
+    """
+
+    def __init__(self, tags, counts):
+        self.tags = np.asarray(tags, dtype=object)
+        self.counts = np.asarray(counts, dtype=np.int32)
+        self.positions = {tag: i for i, tag in enumerate(self.tags)}
+
+    @staticmethod
+    def recipe_tag_matrix(index):
+        """
+        Build the recipe x tag incidence matrix of a tag index.
+
+        Args:
+            index (TagIndex): The tag index.
+
+        Returns:
+            sparse.csr_matrix: One row per recipe, in the order of
+        index.recipes, and one column per tag, with ones where the recipe
+        has the tag.
+        """
+        codes = np.repeat(
+            np.arange(len(index.tags), dtype=np.int32),
+            np.diff(index.offsets)
+        )
+        return sparse.csr_matrix(
+            (np.ones(len(codes), dtype=np.int32), (index.rows, codes)),
+            shape=(len(index.recipes), len(index.tags))
+        )
+
+    @classmethod
+    def from_index(cls, index):
+        """
+        Compute the co-occurrence counts of the tags of an index.
+
+        Args:
+            index (TagIndex): The tag index.
+
+        Returns:
+            TagCooccurrence: The co-occurrence counts.
+        """
+        matrix = cls.recipe_tag_matrix(index)
+        counts = (matrix.T @ matrix).toarray()
+        logger.info(
+            f"Co-occurrence of {len(index.tags)} tags computed from "
+            f"{matrix.nnz} recipe tags"
+        )
+        return cls(index.tags, counts)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __contains__(self, tag):
+        return tag in self.positions
+
+    def _codes(self, tags):
+        """
+        Get the numbers of the known tags.
+        """
+        return [self.positions[tag] for tag in tags if tag in self.positions]
+
+    def expected_size(self, tags):
+        """
+        Get the expected number of recipes having all the tags.
+
+        The count is exact for one or two tags. For more tags, it is the
+        smallest count of a pair, an upper bound of the intersection.
+
+        Args:
+            tags (list): The tags.
+
+        Returns:
+            int: The number of recipes, 0 if a tag is unknown.
+        """
+        unique_tags = set(tags)
+        codes = self._codes(unique_tags)
+        if not codes or len(codes) < len(unique_tags):
+            return 0
+        return int(self.counts[np.ix_(codes, codes)].min())
+
+    def related(self, tags, k=5):
+        """
+        Get the tags most often combined with a set of tags.
+
+        Each other tag is scored by the number of recipes it shares with
+        every tag of the set, the expected size of the result if it is
+        added to the selection.
 
         Args:
-            data (DataFrame): The input dataset containing tags.
+            tags (list): The selected tags.
+            k (int): The maximum number of related tags.
+
+        Returns:
+            list: The (tag, expected size) pairs, largest first, without
+        the tags sharing no recipe with the selection.
         """
-        self.data = data
-        self.tags, self.idrecipes = self.get_rawdata_tags()
-        self.tags = self.split_text_tag()
+        codes = self._codes(tags)
+        if not codes:
+            return []
+        scores = self.counts[codes].min(axis=0)
+        scores[codes] = 0
+        best = np.argsort(-scores, kind='stable')[:k]
+        return [(self.tags[i], int(scores[i])) for i in best if scores[i]]
 
-    def split_text_tag(self):
+
+@st.cache_resource
+def get_tag_cooccurrence(table_name='explodetags'):
+    """
+    Compute the tag co-occurrence counts once, shared by all the sessions.
+
+    Args:
+        table_name (str): The name of the exploded tag table.
+
+    Returns:
+        TagCooccurrence: The co-occurrence counts of the tags.
+    """
+    tagsdata = DatabaseTable(table_name).apply_streamlit_db()
+    return TagCooccurrence.from_index(load_tag_index(tagsdata, table_name))
+
+
+class RecipeTable:
+    """
+    Recipes without outliers joined once with their raw name and tags,
+    sorted by recipe id.
+
+    The join is made on the recipe ids, so that the rows are aligned by key
+    whatever the order of the source tables. A query then gathers its rows
+    by position, found with a binary search of its ids, without scanning
+    the tables.
+
+    Args:
+        data (DataFrame): The joined recipes, one row per id.
+        nutrition_columns (list): The columns of the recipes without
+    outliers, in their order.
+    """
+
+    # Raw columns of the recipes, before the nutrition scores
+    RAW_COLUMNS = ['name', 'id', 'tags']
+
+    def __init__(self, data, nutrition_columns):
+        self.data = data.sort_values('id', kind='stable') \
+            .reset_index(drop=True)
+        self.ids = self.data['id'].to_numpy()
+        self.nutrition_columns = list(nutrition_columns)
+
+    @classmethod
+    def from_tables(cls, raw_recipes, nutrition):
         """
-        Preprocess recipe tags by putting them in lowercase and
-        removing hyphens.
+        Join the raw recipes and the recipes without outliers on their id.
+
+        Args:
+            raw_recipes (DataFrame): The raw recipes, with 'name', 'id' and
+        'tags'.
+            nutrition (DataFrame): The recipes without outliers, with 'id',
+        the nutrients, 'nutriscore' and 'label'.
 
         Returns:
-            list: Preprocessed tags.
+            RecipeTable: The joined recipes, without the recipes missing
+        from either table.
         """
-        # put text in lowercase
-        self.tags = list(map(lambda x: [tag.lower() for tag in x], self.tags))
-        # Remove hyphens
-        self.tags = list(map(
-            lambda x: [tag.replace('-', ' ') for tag in x], self.tags))
-        return self.tags
+        raw = raw_recipes[cls.RAW_COLUMNS].drop_duplicates('id')
+        data = nutrition.merge(raw, on='id', how='inner', validate='m:1')
+        return cls(data, nutrition.columns)
 
-    def get_rawdata_tags(self):
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, ids):
         """
-        Extract raw tags and ids from the dataset.
+        Get the positions of recipes in the table.
+
+        Args:
+            ids (array-like): The recipe ids.
 
         Returns:
-            tuple: A tuple containing lists of tags and ids.
+            np.ndarray: The sorted positions of the ids found in the table.
         """
-        tags = self.data['tags'].apply(Utils.get_text_from_string).tolist()
-        idrecipes = self.data['id'].tolist()
-        return tags, idrecipes
+        ids = np.unique(np.asarray(ids, dtype=self.ids.dtype))
+        rows = np.searchsorted(self.ids, ids)
+        found = rows < len(self.ids)
+        found[found] = self.ids[rows[found]] == ids[found]
+        return rows[found]
 
-    def formatter_tags_data(self):
+    def gather(self, ids, columns=None):
         """
-        Format the tags data for further processing.
+        Get the recipes of ids, in increasing id order.
+
+        Args:
+            ids (array-like): The recipe ids.
+            columns (list): The columns to keep, all by default.
 
         Returns:
-            DataFrame: A DataFrame with formatted tags data.
+            DataFrame: The recipes found in the table.
+        """
+        data = self.data if columns is None else self.data[columns]
+        return data.take(self.rows(ids)).reset_index(drop=True)
+
+    def recipes_with_scores(self, ids):
+        """
+        Get the name, id, tags, nutriscore and label of recipes.
+        """
+        return self.gather(ids, self.RAW_COLUMNS + ['nutriscore', 'label'])
+
+    def recipes_with_nutrients(self, ids):
+        """
+        Get the nutrients and scores of recipes, followed by their name.
+        """
+        return self.gather(ids, self.nutrition_columns + ['name'])
+
+
+@st.cache_resource
+def load_recipe_table(_raw_recipes, _nutrition,
+                      table_names=('raw_recipes', 'NS_noOutliers')):
+    """
+    Join the recipe tables once, shared by all the sessions.
+
+    Args:
+        _raw_recipes (DataFrame): The raw recipes, not hashed.
+        _nutrition (DataFrame): The recipes without outliers, not hashed.
+        table_names (tuple): The names of the tables, used as cache key.
+
+    Returns:
+        RecipeTable: The joined recipes.
+    """
+    logger.info(f"Joining the recipe tables {table_names}")
+    return RecipeTable.from_tables(_raw_recipes, _nutrition)
+
+
+def get_recipe_table():
+    """
+    Load the raw recipes and the recipes without outliers, and join them
+    once.
+
+    Returns:
+        RecipeTable: The joined recipes.
+    """
+    q1 = 'SELECT name, id, tags FROM "raw_recipes";'
+    df_raw = DatabaseTable('raw_recipes', query=q1).apply_streamlit_db()
+    logger.info(
+        f"Raw data loaded successfully, there are {df_raw.shape[0]} rows"
+    )
+    df_nooutlier = DatabaseTable('NS_noOutliers').apply_streamlit_db()
+    logger.info(
+        f"""
+        Data no outlier loaded successfully, there are
+        {df_nooutlier.shape[0]} rows"""
+    )
+    return load_recipe_table(df_raw, df_nooutlier)
+
+
+class TagAggregates:
+    """
+    NutriScore aggregates of the recipes of every tag, computed offline.
+
+    The table has one row per tag and label, and one row per tag with the
+    label 'all' for all its recipes. Each row holds the number of recipes,
+    the quartiles and whiskers of their nutriscore and the mean, std, min
+    and max of each nutrient (nutriscore included). The first recipes of
+    each tag and label, by increasing id as in the recipes of a tag query,
+    are kept with their name, tags, nutriscore and label. A single-tag query
+    is answered from its six rows and these recipes, without joining the
+    recipes of the tag.
+
+    Args:
+        data (DataFrame): The aggregates, indexed by tag and label.
+        recipes (DataFrame): The first recipes of each tag and label, with
+    the columns of RecipeTable.recipes_with_scores, indexed by tag.
+    """
+
+    LABELS = ['A', 'B', 'C', 'D', 'E']
+    ALL = 'all'
+    BOX_COLUMNS = ['q1', 'median', 'q3', 'lowerfence', 'upperfence']
+    STATISTICS = ['mean', 'std', 'min', 'max']
+
+    RECIPE_COLUMNS = RecipeTable.RAW_COLUMNS + ['nutriscore', 'label']
+
+    def __init__(self, data, recipes):
+        self.data = data.sort_index()
+        self.recipes = recipes.sort_index(kind='stable')
+        self.nutrients = [
+            column[:-len('_mean')] for column in data.columns
+            if column.endswith('_mean')
+        ]
+        self.tags = set(self.data.index.get_level_values('tag'))
+
+    @classmethod
+    def build(cls, index, recipe_table, n_recipes=10):
+        """
+        Compute the aggregates of all the tags of an index.
+
+        Args:
+            index (TagIndex): The tag index.
+            recipe_table (RecipeTable): The recipes, with their nutrients,
+        nutriscore and label.
+            n_recipes (int): The number of recipes kept per tag and label.
+
+        Returns:
+            TagAggregates: The aggregates of the tags.
+        """
+        start = time.perf_counter()
+        nutrients = [column for column in recipe_table.nutrition_columns
+                     if column not in ('id', 'label')]
+        # One row per tag and recipe, joined with the recipe columns
+        codes = np.repeat(np.arange(len(index.tags)), np.diff(index.offsets))
+        rows = np.searchsorted(recipe_table.ids, index.recipe_ids)
+        found = rows < len(recipe_table)
+        found[found] = \
+            recipe_table.ids[rows[found]] == index.recipe_ids[found]
+        joined = recipe_table.data.iloc[rows[found]].reset_index(drop=True)
+        pairs = joined[['id', 'label'] + nutrients]
+        pairs.insert(0, 'tag', index.tags[codes[found]])
+        # The postings are sorted by tag then id, so the first recipes of
+        # each label are those listed first by a query of the tag
+        recipes = joined[cls.RECIPE_COLUMNS].assign(tag=pairs['tag']) \
+            .groupby(['tag', 'label']).head(n_recipes).set_index('tag')
+        pairs = pd.concat([pairs, pairs.assign(label=cls.ALL)],
+                          ignore_index=True)
+
+        groups = pairs.groupby(['tag', 'label'])
+        scores = groups['nutriscore']
+        q1 = scores.transform('quantile', 0.25)
+        q3 = scores.transform('quantile', 0.75)
+        # The whiskers end at the extreme scores within 1.5 IQR, as plotly
+        inside = pairs['nutriscore'].where(
+            pairs['nutriscore'].between(q1 - 1.5 * (q3 - q1),
+                                        q3 + 1.5 * (q3 - q1))
+        )
+        box = pd.DataFrame({
+            'count': groups.size(),
+            'q1': scores.quantile(0.25),
+            'median': scores.median(),
+            'q3': scores.quantile(0.75),
+            'lowerfence': inside.groupby([pairs['tag'], pairs['label']])
+            .min(),
+            'upperfence': inside.groupby([pairs['tag'], pairs['label']])
+            .max()
+        })
+        statistics = groups[nutrients].agg(cls.STATISTICS)
+        statistics.columns = [f'{nutrient}_{statistic}'
+                              for nutrient, statistic in statistics.columns]
+
+        data = pd.concat([box, statistics], axis=1)
+        logger.info(
+            f"Aggregates of {len(index)} tags computed in "
+            f"{time.perf_counter() - start:.1f} s"
+        )
+        return cls(data, recipes)
+
+    @classmethod
+    def from_frame(cls, frame, recipes):
+        """
+        Read the aggregates from their flat table form.
+
+        Args:
+            frame (DataFrame): The aggregates table written by to_frame.
+            recipes (DataFrame): The recipes table written by to_frame.
+
+        Returns:
+            TagAggregates: The aggregates of the tags.
+        """
+        return cls(frame.set_index(['tag', 'label']),
+                   recipes.set_index('tag'))
+
+    def to_frame(self):
+        """
+        Get the aggregates and the first recipes as flat tables.
+
+        Returns:
+            tuple: The aggregates, one row per tag and label, and the first
+        recipes of each tag and label, one row per tag and recipe.
+        """
+        return self.data.reset_index(), self.recipes.reset_index()
+
+    def to_database(self, database, table_name='tag_aggregates'):
+        """
+        Write the aggregates and the first recipes to two tables of the
+        database, `<table_name>` and `<table_name>_recipes`, replacing them
+        in a single transaction.
+
+        Args:
+            database (Database): The database connection.
+            table_name (str): The name of the aggregates table.
+        """
+        frame, recipes = self.to_frame()
+        database.write_tables({
+            table_name: frame,
+            f'{table_name}_recipes': recipes
+        }, if_exists='replace')
+        logger.info(f"{len(self.data)} tag aggregates written to "
+                    f"{table_name}")
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __contains__(self, tag):
+        return tag in self.tags
+
+    def _rows(self, tag):
+        """
+        Get the rows of a tag, one per label.
+        """
+        return self.data.loc[tag].reindex(self.LABELS + [self.ALL])
+
+    def count(self, tag):
+        """
+        Get the number of recipes of a tag.
+
+        Args:
+            tag (str): The tag.
+
+        Returns:
+            int: The number of recipes without outliers having the tag.
+        """
+        if tag not in self:
+            return 0
+        return int(self.data.loc[(tag, self.ALL), 'count'])
+
+    def label_distribution(self, tag):
+        """
+        Get the number and the share of the recipes of a tag in each label.
+
+        Args:
+            tag (str): The tag.
+
+        Returns:
+            DataFrame: The 'count' and 'share' of each label, indexed by
+        label, as nutriscore_analysis.label_distribution.
         """
-        df = pd.DataFrame({
-            'idrecipes': self.idrecipes,
-            'tags': self.tags
+        counts = self._rows(tag)['count'].loc[self.LABELS] \
+            .fillna(0).astype(int)
+        distribution = pd.DataFrame({
+            'count': counts,
+            'share': counts / max(self.count(tag), 1)
         })
-        formatted_data = df.explode('tags').reset_index(drop=True)
-        return formatted_data
+        distribution.index.name = 'label'
+        return distribution
+
+    def box_stats(self, tag):
+        """
+        Get the box plot statistics of the nutriscore of a tag per label.
+
+        Args:
+            tag (str): The tag.
+
+        Returns:
+            DataFrame: The quartiles, mean and whiskers of the labels having
+        recipes, indexed by label.
+        """
+        rows = self._rows(tag).loc[self.LABELS]
+        rows = rows[rows['count'] > 0]
+        stats = rows[self.BOX_COLUMNS].copy()
+        stats['mean'] = rows['nutriscore_mean']
+        return stats
+
+    def nutrient_stats(self, tag, label):
+        """
+        Get the mean, std, min and max of the nutrients of the recipes of a
+        tag and label.
+
+        Args:
+            tag (str): The tag.
+            label (str): The label, or 'all'.
+
+        Returns:
+            DataFrame: The statistics of each nutrient, indexed by nutrient,
+        as describe().T[['mean', 'std', 'min', 'max']].
+        """
+        row = self._rows(tag).loc[label]
+        return pd.DataFrame(
+            [[row[f'{nutrient}_{statistic}']
+              for statistic in self.STATISTICS]
+             for nutrient in self.nutrients],
+            index=self.nutrients, columns=self.STATISTICS, dtype=float
+        )
+
+    def first_recipes(self, tag, label):
+        """
+        Get the name, id, tags, nutriscore and label of the first recipes
+        of a tag and label, the same as the first recipes of the label in
+        the recipes of a query of the tag.
+
+        Args:
+            tag (str): The tag.
+            label (str): The label.
+
+        Returns:
+            DataFrame: The recipes, by increasing id.
+        """
+        if tag not in self:
+            return pd.DataFrame(columns=self.RECIPE_COLUMNS)
+        recipes = self.recipes.loc[[tag]]
+        return recipes[recipes['label'] == label].reset_index(drop=True)
+
+
+@st.cache_resource
+def load_tag_aggregates(table_name='tag_aggregates'):
+    """
+    Load the tag aggregates once, shared by all the sessions.
+
+    Args:
+        table_name (str): The name of the aggregates table.
+
+    Returns:
+        TagAggregates: The aggregates of the tags.
+
+    Raises:
+        LookupError: If the tables are not available. The failure is not
+    cached, so the tables are read again on the next call.
+    """
+    data = db_instance.fetch_data(f'SELECT * FROM "{table_name}";')
+    recipes = db_instance.fetch_data(
+        f'SELECT * FROM "{table_name}_recipes";'
+    )
+    if data is None or data.empty or recipes is None:
+        raise LookupError(
+            f"Tag aggregates table {table_name} is not available"
+        )
+    return TagAggregates.from_frame(data, recipes)
+
+
+def get_tag_aggregates(table_name='tag_aggregates'):
+    """
+    Get the tag aggregates shared by all the sessions, if they are built.
+
+    Args:
+        table_name (str): The name of the aggregates table.
+
+    Returns:
+        TagAggregates: The aggregates of the tags, or None if the table is
+    not available.
+    """
+    try:
+        return load_tag_aggregates(table_name)
+    except LookupError as e:
+        logger.warning(e)
+        return None
+
+
+def build_tag_aggregates(database=db_instance, table_name='tag_aggregates',
+                         n_recipes=10):
+    """
+    Compute the aggregates of all the tags and store them in the database.
+
+    Args:
+        database (Database): The database connection.
+        table_name (str): The name of the aggregates table.
+        n_recipes (int): The number of recipes kept per tag and label.
+
+    Returns:
+        TagAggregates: The aggregates of the tags.
+    """
+    recipe_table = get_recipe_table()
+    tagsdata = DatabaseTable('explodetags').apply_streamlit_db()
+    aggregates = TagAggregates.build(
+        load_tag_index(tagsdata), recipe_table, n_recipes=n_recipes
+    )
+    aggregates.to_database(database, table_name)
+    return aggregates
 
 
 class Tags:
     """Class for handling tags and extracting recipes based on tags."""
 
-    def __init__(self, tagsdata, tag_target):
+    def __init__(self, tagsdata, tag_target, index=None):
         """
         Initialize the Tags class.
 
@@ -158,11 +1470,21 @@ class Tags:
             tagsdata (DataFrame): The input dataset containing tags and
         recipe IDs.
             tag_target (str): The target tag(s) for extraction.
+            index (TagIndex): The index of the tags of tagsdata, built
+        on the first lookup if not given.
         """
         self.tags = tagsdata['tags']
         self.idrecipes = tagsdata['idrecipes']
         self.tagsdata = tagsdata
         self.tag_target = tag_target
+        self._index = index
+
+    @property
+    def index(self):
+        """TagIndex: The index of the tags of tagsdata."""
+        if self._index is None:
+            self._index = TagIndex.from_exploded(self.tagsdata)
+        return self._index
 
     def extract_tag(self, tag):
         """
@@ -172,68 +1494,182 @@ class Tags:
             tag (str): The target tag to extract recipes for.
 
         Returns:
-            list: A list of recipe IDs that have the target tag.
+            np.ndarray: The sorted IDs of the recipes that have the target
+        tag.
         """
-        t = self.tagsdata
-        # ids_target = self.tags[self.tags == tag].index.tolist()
-        if (t['tags'] == tag).any():
-            ids_target = (
-                t.where(t['tags'] == tag)
-                .dropna()['idrecipes']
-                .astype(int)
-                .to_list()
-                )
-            ids_target = np.unique(ids_target)
-        else:
-            ids_target = []
-        return ids_target
+        return self.index.lookup(tag)
 
     def get_recipes_from_tags(self):
         """
-        Extract recipes with multiple target tags.
+        Extract recipes with multiple target tags, or matching a boolean
+        tag query such as `vegetarian AND (low carb OR low sodium)`.
 
         Returns:
-            list: A list of recipe IDs that have all the target tags.
+            np.ndarray: The sorted IDs of the recipes that have all the
+        target tags, empty if no recipe has them.
         """
-        ids_target = []
+        if TagQuery.is_boolean(self.tag_target):
+            logger.info(f"boolean tag query : {self.tag_target}")
+            return TagQuery(self.tag_target).evaluate(self.index)
         tag_target = self.tag_target.split(',')
 
-        if isinstance(tag_target, list):
-            if len(tag_target) == 1:
-                logger.info(f"single tag target : tag = {tag_target[0]}")
-                ids_target = self.extract_tag(tag_target[0])
-                if ids_target.any():
-                    return ids_target
-                else:
-                    logger.error("Any recipe have this tag")
-            else:
-                for tag in tag_target:
-                    tmp = self.extract_tag(tag)
-                    ids_target.append(tmp)
-                    logger.info(
-                        f"multiple tags target : tag = {tag}, len = {len(tmp)}"
-                        )
-                # Union or intersection of recipes with tags
-                # list recipes have all tags target
-                intersection = list(reduce(
-                    lambda x, y: set(x) & set(y), ids_target))
-                logger.info(
-                    f"""
-                    recipes with all multiple tags target :
-                    len = {len(intersection)}"""
-                    )
-                return intersection
-
-        elif isinstance(tag_target, str):
-            logger.info(f"single tag target : tag = {tag_target}")
-            ids_target = self.extract_tag(tag_target)
-            if ids_target.any():
-                return ids_target
-            else:
+        if len(tag_target) == 1:
+            logger.info(f"single tag target : tag = {tag_target[0]}")
+            ids_target = self.extract_tag(tag_target[0])
+            if not len(ids_target):
                 logger.error("Any recipe have this tag")
+            return ids_target
+
+        for tag in tag_target:
+            logger.info(
+                f"multiple tags target : tag = {tag}, "
+                f"len = {self.index.postings_size(tag)}"
+            )
+        # list recipes have all tags target
+        intersection = self.index.intersect(tag_target)
+        logger.info(
+            f"""
+            recipes with all multiple tags target :
+            len = {len(intersection)}"""
+        )
+        return intersection
+
+
+def query_key(tags_input):
+    """
+    Get the canonical form of a tag input, used as the cache key of its
+    results.
+
+    Args:
+        tags_input (str): The tags separated by commas, or a boolean tag
+    query.
+
+    Returns:
+        tuple: ('tags', sorted normalized tags) for a list of tags, or
+    ('query', canonical tree) for a boolean query.
+    """
+    if TagQuery.is_boolean(tags_input):
+        return ('query', TagQuery(tags_input).canonical)
+    return ('tags', tuple(sorted({
+        normalize_tag(tag) for tag in tags_input.split(',') if tag.strip()
+    })))
+
+
+def result_nbytes(result):
+    """
+    Get the memory size of the results of a tag query.
+
+    Args:
+        result (tuple): The DataFrames returned by main.
+
+    Returns:
+        int: The size in bytes, strings included.
+    """
+    return int(sum(
+        frame.memory_usage(index=True, deep=True).sum() for frame in result
+    ))
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of the results of tag queries, shared by all the
+    sessions.
+
+    The results are keyed by the canonical form of the query, so that the
+    same tags in another order or case hit the same entry, and the cache
+    is bounded by the memory size of the results rather than by their
+    number. The cached DataFrames are shared, callers must not modify
+    them.
+
+    Args:
+        maxsize (int): The maximum size of the cached results, in bytes.
+    """
+
+    def __init__(self, maxsize=256 * 1024 ** 2):
+        self.cache = LRUCache(maxsize=maxsize, getsizeof=result_nbytes)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        """
+        Get the results of a query, computing them on a miss.
+
+        Args:
+            key (tuple): The canonical form of the query.
+            compute (callable): The function computing the results.
+
+        Returns:
+            tuple: The results of the query.
+        """
+        with self.lock:
+            result = self.cache.get(key)
+            if result is not None:
+                self.hits += 1
+                return result
+            self.misses += 1
+        result = compute()
+        with self.lock:
+            try:
+                self.cache[key] = result
+            except ValueError:
+                # cachetools refuses a value larger than the whole cache
+                logger.warning(f"Results of {key} too large to be cached")
+        logger.debug(f"Tag query cache: {self.info()}")
+        return result
+
+    @property
+    def hit_rate(self):
+        """float: The share of the lookups found in the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def info(self):
+        """
+        Get the counters of the cache.
+
+        Returns:
+            dict: The hits, misses, hit rate, number of entries and the
+        current and maximum sizes in bytes.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'entries': len(self.cache),
+            'currsize': self.cache.currsize,
+            'maxsize': self.cache.maxsize
+        }
+
+    def clear(self):
+        """Remove all the results and reset the counters."""
+        with self.lock:
+            self.cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+query_cache = QueryCache()
 
 
 def main(arg):
+    """
+    Get the recipes of a tag input, from the shared cache of query results
+    when the same tags were queried before.
+
+    Args:
+        arg (str): The tags separated by commas, or a boolean tag query.
+
+    Returns:
+        tuple: The recipes with their scores, the recipes with their
+    nutrients and the recipes with the highest score.
+    """
+    key = query_key(arg)
+    tags_reference = ','.join(key[1]) if key[0] == 'tags' else arg
+    return query_cache.get(key, lambda: run_tag_query(tags_reference))
+
+
+def run_tag_query(arg):
     tags_reference = arg
     # create test directory to save test output
 
@@ -242,19 +1678,8 @@ def main(arg):
     # load raw data
     logger.info("Loading data from the database ...")
     # path = os.path.join(PARENT_DIR, 'dataset/RAW_recipes.csv')
-    q1 = 'SELECT name, id, tags FROM "raw_recipes";'
-    df_raw = DatabaseTable('raw_recipes', query=q1).apply_streamlit_db()
-    logger.info(
-        f"Raw data loaded successfully, there are {df_raw.shape[0]} rows"
-        )
-
-    # load dataset no outlier
-    df_nooutlier = DatabaseTable('NS_noOutliers').apply_streamlit_db()
-    logger.info(
-        f"""
-        Data no outlier loaded successfully, there are
-        {df_nooutlier.shape[0]} rows"""
-        )
+    # join the raw data and the dataset no outlier once on the recipe ids
+    recipe_table = get_recipe_table()
 
     # load tag data with raw recipes with outliers
     new_data_tags = DatabaseTable('explodetags').apply_streamlit_db()
@@ -266,49 +1691,38 @@ def main(arg):
 
     logger.info(f"Get tags reference from user, there are {tags_reference}")
     # get recipes with tags target
-    tags_instance = Tags(new_data_tags, tags_reference)
+    tags_instance = Tags(
+        new_data_tags, tags_reference, index=load_tag_index(new_data_tags)
+    )
     ids_recipes_target = np.array(tags_instance.get_recipes_from_tags())
     logger.info(
         'number of recipes with tags target: %d', len(ids_recipes_target)
         )
-    try:
-        len(ids_recipes_target) > len(tags_reference.split(','))
-        # convert to pandas series or to list of integer values
-        ids_recipes_target = pd.Series(ids_recipes_target.T)
+    if len(ids_recipes_target) == 0:
+        # No recipe to look up, the empty tables keep their columns
+        logger.error('Any recipes have these tags target')
+        recipes_tags = recipe_table.data.iloc[:0][
+            RecipeTable.RAW_COLUMNS + ['nutriscore', 'label']
+        ]
+        dfsortinner = recipe_table.data.iloc[:0][
+            recipe_table.nutrition_columns + ['name']
+        ]
+        return recipes_tags, dfsortinner, recipes_tags.copy()
 
-        # combine two tables to get recipes from tags target
-        raw_recipes_nutrition = (
-            df_raw.iloc[np.where(df_nooutlier['id'].isin(df_raw['id']))])
-        logger.info(
-            f"""
-            Shape of all tags without outliers:
-            {raw_recipes_nutrition.shape}"""
-            )
-        raw_recipes_nutrition['nutriscore'] = df_nooutlier['nutriscore']
-        raw_recipes_nutrition.loc[:,'label'] = df_nooutlier['label'].values
-        ids_common = ids_recipes_target[
-            ids_recipes_target.isin(df_nooutlier['id'])
-            ]
-        recipes_tags = raw_recipes_nutrition[
-            raw_recipes_nutrition['id'].isin(ids_common)
-            ]
-
-        # get highest score and top 3 scores
-        maxscore = np.unique(recipes_tags['nutriscore'])[-1]
-
-        # get recipes with highest score and top 3 scores
-        recipes_highestscore = recipes_tags[
-            recipes_tags['nutriscore'] == maxscore
-            ]
-
-        # Prepare dataset for analysis
-        ids_recipes_target = ids_recipes_target.astype(int)
-        dfsort = df_nooutlier[df_nooutlier['id'].isin(ids_recipes_target)]
-        dfsortname = df_raw[
-            df_raw['id'].isin(ids_recipes_target)][['name', 'id']]
-        dfsortinner = pd.merge(dfsort, dfsortname, on='id', how='inner')
-
-    except AssertionError:
+    # gather the rows of the target ids
+    logger.info(
+        f"Shape of all tags without outliers: {recipe_table.data.shape}"
+    )
+    recipes_tags = recipe_table.recipes_with_scores(ids_recipes_target)
+
+    # get recipes with highest score
+    recipes_highestscore = recipes_tags[
+        recipes_tags['nutriscore'] == recipes_tags['nutriscore'].max()
+    ]
+
+    # Prepare dataset for analysis
+    dfsortinner = recipe_table.recipes_with_nutrients(ids_recipes_target)
+    if recipes_tags.empty:
         logger.error('Any recipes have these tags target')
     return recipes_tags, dfsortinner, recipes_highestscore
 
@@ -319,7 +1733,28 @@ if __name__ == '__main__':
         '--tags_reference',
         '-t',
         type=str,
-        required=True,
         help='tags reference separated by comma')
+    parser.add_argument(
+        '--rebuild_tags',
+        action='store_true',
+        help='rebuild the explodetags table from raw_recipes')
+    parser.add_argument(
+        '--build_aggregates',
+        action='store_true',
+        help='compute the tag_aggregates table of all the tags')
+    parser.add_argument(
+        '--chunksize',
+        type=int,
+        default=50000,
+        help='number of recipes per chunk when rebuilding the tags')
     args = parser.parse_args()
-    main(args.tags_reference)
+    if args.rebuild_tags:
+        rebuild_tag_table(chunksize=args.chunksize)
+    elif args.build_aggregates:
+        build_tag_aggregates()
+    elif args.tags_reference:
+        main(args.tags_reference)
+    else:
+        parser.error(
+            '--tags_reference, --rebuild_tags or --build_aggregates is '
+            'required')
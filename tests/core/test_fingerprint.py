@@ -0,0 +1,48 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Add the 'src' directory to the system path for importing modules
+sys.path.insert(
+    0,
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src'))
+)
+
+from core.fingerprint import data_fingerprint  # noqa: E402
+
+
+def test_data_fingerprint_stable():
+    """
+    Test that equal data and parameters give the same fingerprint.
+    """
+    df1 = pd.DataFrame({"a": [1, 2], "b": [0.5, 1.5]})
+    df2 = pd.DataFrame({"a": [1, 2], "b": [0.5, 1.5]})
+
+    assert data_fingerprint(df1, 20) == data_fingerprint(df2, 20)
+    assert len(data_fingerprint(df1)) == 64
+
+
+def test_data_fingerprint_changes():
+    """
+    Test that a change of values, columns or parameters changes the
+    fingerprint.
+    """
+    df = pd.DataFrame({"a": [1, 2], "b": [0.5, 1.5]})
+    reference = data_fingerprint(df, 20)
+
+    assert data_fingerprint(df.assign(b=[0.5, 2.5]), 20) != reference
+    assert data_fingerprint(df.rename(columns={"b": "c"}), 20) != reference
+    assert data_fingerprint(df, 21) != reference
+    assert data_fingerprint(df["a"]) != data_fingerprint(df["a"].rename("z"))
+
+
+def test_data_fingerprint_array():
+    """
+    Test the fingerprint of numpy arrays, including their dtype.
+    """
+    values = np.arange(4)
+
+    assert data_fingerprint(values) == data_fingerprint(np.arange(4))
+    assert data_fingerprint(values) != data_fingerprint(values.astype(float))
@@ -1,15 +1,18 @@
+import os
+import sys
 import pytest
 from sqlalchemy import create_engine
 from unittest.mock import MagicMock, patch
 import pandas as pd
-from db.streamlit_todb import Database
 
 # Add the 'src' directory to the system path for importing modules
 sys.path.insert(
     0,
-    os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '../../src'))
 )
 
+from db.streamlit_todb import Database  # noqa: E402
+
 @pytest.fixture
 def mock_database():
     """
@@ -84,3 +87,72 @@ def test_close_connection(mock_database):
         mock_database.close_connection()
         mock_dispose.assert_called_once()
 
+
+def test_fetch_chunks(mock_database):
+    """
+    Test fetch_chunks method yields every chunk of the query.
+    """
+    query = "SELECT * FROM test_table;"
+    chunks = [
+        pd.DataFrame({"id": [1, 2]}),
+        pd.DataFrame({"id": [3]}),
+    ]
+
+    with patch("pandas.read_sql_query",
+               return_value=iter(chunks)) as mock_read_sql:
+        results = list(mock_database.fetch_chunks(query, chunksize=2))
+        assert mock_read_sql.call_args.kwargs["chunksize"] == 2
+        assert len(results) == 2
+        assert results[1].equals(chunks[1])
+
+
+def test_write_data(mock_database):
+    """
+    Test write_data method writes the DataFrame with multi-row inserts.
+    """
+    data = pd.DataFrame({"id": [1, 2]})
+
+    with patch.object(pd.DataFrame, "to_sql") as mock_to_sql:
+        mock_database.write_data(data, "test_table", if_exists="replace")
+        mock_to_sql.assert_called_once_with(
+            "test_table",
+            mock_database.engine,
+            if_exists="replace",
+            index=False,
+            method="multi",
+            chunksize=10000
+        )
+
+
+def test_write_tables(mock_database):
+    """
+    Test write_tables method writes every table in one transaction.
+    """
+    tables = {
+        "table1": pd.DataFrame({"id": [1, 2]}),
+        "table2": pd.DataFrame({"id": [3]}),
+    }
+    conn = mock_database.engine.begin.return_value.__enter__.return_value
+
+    with patch.object(pd.DataFrame, "to_sql") as mock_to_sql:
+        mock_database.write_tables(tables)
+        mock_database.engine.begin.assert_called_once()
+        assert [c.args for c in mock_to_sql.call_args_list] == [
+            ("table1", conn), ("table2", conn)
+        ]
+
+
+def test_replace_table(mock_database):
+    """
+    Test replace_table method drops the target and renames the source in
+    one transaction.
+    """
+    conn = mock_database.engine.begin.return_value.__enter__.return_value
+
+    mock_database.replace_table("table_staging", "table")
+    mock_database.engine.begin.assert_called_once()
+    statements = [str(c.args[0]) for c in conn.execute.call_args_list]
+    assert statements == [
+        'DROP TABLE IF EXISTS "table"',
+        'ALTER TABLE "table_staging" RENAME TO "table"'
+    ]
@@ -111,25 +111,70 @@ def test_apply_z_score_method():
 def test_visualize_data_distribution():
     """
     Test the visualize_data_distribution function to ensure it renders
-    histograms, box plots, and charts with the correct data.
+    histograms, box plots, and charts built from aggregates of the selected
+    range.
     """
     with patch('streamlit.selectbox', return_value='Calories distribution'), \
          patch('streamlit.radio', return_value='Filtered data'), \
          patch('streamlit.slider', return_value=(1500, 2000)), \
-         patch('plotly.express.histogram') as mock_hist, \
-         patch('plotly.express.box') as mock_box, \
+         patch('streamlit.markdown') as mock_markdown, \
          patch('streamlit.plotly_chart') as mock_chart:
         mock_normalized_data = pd.DataFrame({'dv_calories_%': [1500, 1800]})
         mock_prefiltre_data = pd.DataFrame({'dv_calories_%': [1200, 1700]})
-        mock_nutrition_noOutliers = pd.DataFrame({'dv_calories_%': [1000, 1600]})
+        mock_nutrition_noOutliers = pd.DataFrame(
+            {'dv_calories_%': [1000, 1600, 1900]}
+        )
         module_2_Outliers.visualize_data_distribution(
             mock_normalized_data,
             mock_prefiltre_data,
             mock_nutrition_noOutliers
         )
-        mock_hist.assert_called()
-        mock_box.assert_called()
-        mock_chart.assert_called()
+        assert mock_chart.call_count == 2
+        fig_hist = mock_chart.call_args_list[0][0][0]
+        fig_box = mock_chart.call_args_list[1][0][0]
+        assert fig_hist.data[0].type == 'bar'
+        assert sum(fig_hist.data[0].y) == 2
+        assert fig_box.data[0].type == 'box'
+        assert fig_box.data[0].median == (1750,)
+        summary = mock_markdown.call_args[0][0].split()
+        assert summary[summary.index('range)**:') + 1] == '2'
+
+
+def test_visualize_data_distribution_single_value_range():
+    """
+    Test that a range reduced to one value only counts the recipes having
+    that value as valid.
+    """
+    data = pd.DataFrame({'dv_calories_%': [1000, 1500, 1500, 1500.3]})
+    with patch('streamlit.selectbox', return_value='Calories distribution'), \
+         patch('streamlit.radio', return_value='Filtered data'), \
+         patch('streamlit.slider', return_value=(1500, 1500)), \
+         patch('streamlit.markdown') as mock_markdown, \
+         patch('streamlit.plotly_chart'):
+        module_2_Outliers.visualize_data_distribution(data, data, data)
+        summary = mock_markdown.call_args[0][0].split()
+        counts = [summary[i + 1] for i, word in enumerate(summary)
+                  if word == 'range)**:']
+        assert counts == ['2', '2']
+
+
+def test_visualize_data_distribution_versions():
+    """
+    Test that the versions computed at load time key the aggregates, so the
+    dataset is not hashed on a rerun.
+    """
+    data = pd.DataFrame({'dv_calories_%': [1000, 1600, 1900]})
+    with patch('streamlit.selectbox', return_value='Calories distribution'), \
+         patch('streamlit.radio', return_value='Filtered data'), \
+         patch('streamlit.slider', return_value=(1500, 2000)), \
+         patch('streamlit.markdown'), \
+         patch('streamlit.plotly_chart'), \
+         patch.object(module_2_Outliers, 'dataset_version') \
+            as mock_dataset_version:
+        module_2_Outliers.visualize_data_distribution(
+            data, data, data, {'nutrition_noOutliers': 'v1'}
+        )
+        mock_dataset_version.assert_not_called()
 
 
 def test_display_conclusion():
@@ -140,7 +185,8 @@ def test_display_conclusion():
         assert mock_markdown.call_count == 2  
         
 
-def test_main():
+@patch.object(module_2_Outliers, "get_dataset_versions")
+def test_main(mock_get_dataset_versions):
     with patch.object(module_2_Outliers, "get_cached_data") \
         as mock_get_cached_data, patch.object(
             module_2_Outliers, "display_introduction") \
@@ -191,13 +237,15 @@ def test_main():
         mock_visualize_data_distribution.assert_called_once_with(
             mock_get_cached_data.return_value["normalized_data"],
             mock_get_cached_data.return_value["prefiltre_data"],
-            mock_get_cached_data.return_value["nutrition_noOutliers"]
+            mock_get_cached_data.return_value["nutrition_noOutliers"],
+            mock_get_dataset_versions.return_value
         )
         mock_display_conclusion.assert_called_once()
         mock_st_error.assert_not_called()
 
 
-def test_main_edge_cases():
+@patch.object(module_2_Outliers, "get_dataset_versions")
+def test_main_edge_cases(mock_get_dataset_versions):
     with patch.object(module_2_Outliers, "get_cached_data") \
             as mock_get_cached_data, \
         patch.object(module_2_Outliers, \
@@ -298,6 +346,7 @@ def test_main_edge_cases():
         mock_visualize_data_distribution.assert_called_once_with(
             mock_get_cached_data.return_value["normalized_data"],
             mock_get_cached_data.return_value["prefiltre_data"],
-            mock_get_cached_data.return_value["nutrition_noOutliers"]
+            mock_get_cached_data.return_value["nutrition_noOutliers"],
+            mock_get_dataset_versions.return_value
         )
         mock_display_conclusion.assert_called_once()
\ No newline at end of file
@@ -2,7 +2,7 @@ import sys
 import os
 import pytest
 import pandas as pd
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 import importlib.util
 sys.path.insert(
     0,
@@ -115,6 +115,7 @@ def test_display_interaction_correlation(
 
 
 @patch.object(correlations, 'get_cached_data')
+@patch.object(correlations, 'load_interaction_data')
 @patch.object(correlations, 'display_header')
 @patch.object(correlations, 'display_recipe_correlation')
 @patch.object(correlations, 'display_interaction_correlation')
@@ -122,6 +123,7 @@ def test_main(
     mock_display_interaction_correlation,
     mock_display_recipe_correlation,
     mock_display_header,
+    mock_load_interaction_data,
     mock_get_cached_data
 ):
     # Créer des mocks pour les données simulées (par exemple, des DataFrames vides ou fictifs)
@@ -132,9 +134,9 @@ def test_main(
     # Configurer le mock de get_cached_data pour renvoyer un dictionnaire plutôt qu'un tuple
     mock_get_cached_data.return_value = {
         "filtered_data": mock_filtered_data,
-        "raw_interactions": mock_interaction_data,
         "nutriscore": mock_nutriscore_data,
     }
+    mock_load_interaction_data.return_value = mock_interaction_data
 
     # Appeler la fonction main
     correlations.main()
@@ -143,3 +145,72 @@ def test_main(
     assert mock_display_header.call_count == 1
     assert mock_display_recipe_correlation.call_count == 1
     assert mock_display_interaction_correlation.call_count == 1
+    assert mock_get_cached_data.call_count == 1
+    assert mock_display_interaction_correlation.call_args[0][0] == \
+        mock_interaction_data
+
+
+@patch('streamlit.write')
+@patch('streamlit.pyplot')
+@patch('streamlit.multiselect')
+@patch('streamlit.dataframe')
+def test_display_interaction_correlation_aggregates(
+    mock_dataframe,
+    mock_multiselect,
+    mock_pyplot,
+    mock_write,
+    mock_nutriscore_data
+):
+    mock_multiselect.return_value = ['average_rating', 'nutriscore']
+    aggregates = pd.DataFrame({
+        'recipe_id': [1, 2, 3],
+        'interaction_count': [2, 1, 4],
+        'rating_sum': [9.0, 4.0, 12.0]
+    })
+    correlations.display_interaction_correlation(
+        aggregates,
+        mock_nutriscore_data
+    )
+    label_analysis = mock_dataframe.call_args[0][0]
+    assert label_analysis['interaction_count'].tolist() == [2, 1, 4]
+    assert label_analysis['average_rating'].tolist() == [4.5, 4.0, 3.0]
+
+
+@patch('streamlit.stop', side_effect=RuntimeError)
+@patch('streamlit.error')
+def test_load_interaction_data(mock_error, mock_stop):
+    """
+    Test that the aggregates are cached per watermark, the raw interactions
+    are cached until the aggregates exist, and the page stops when nothing
+    can be fetched.
+    """
+    aggregates = pd.DataFrame({
+        'recipe_id': [1], 'interaction_count': [2], 'rating_sum': [9.0]
+    })
+    raw = pd.DataFrame({'recipe_id': [1, 1], 'rating': [4, 5]})
+    db = MagicMock()
+    correlations.get_interaction_aggregates.clear()
+    correlations.get_raw_interactions.clear()
+
+    db.fetch_data.side_effect = [None, raw, None]
+    pd.testing.assert_frame_equal(correlations.load_interaction_data(db), raw)
+    pd.testing.assert_frame_equal(correlations.load_interaction_data(db), raw)
+
+    db.fetch_data.side_effect = [
+        pd.DataFrame({'watermark': ['2020-01-03']}), aggregates,
+        pd.DataFrame({'watermark': ['2020-01-03']}),
+        pd.DataFrame({'watermark': ['2020-01-04']}), aggregates,
+    ]
+    for _ in range(3):
+        result = correlations.load_interaction_data(db)
+        pd.testing.assert_frame_equal(result, aggregates)
+    queries = [c.args[0] for c in db.fetch_data.call_args_list]
+    assert queries.count('SELECT * FROM "RAW_interactions";') == 1
+    assert queries.count('SELECT * FROM "interaction_aggregates";') == 2
+
+    correlations.get_raw_interactions.clear()
+    db.fetch_data.side_effect = [None, None]
+    with pytest.raises(RuntimeError):
+        correlations.load_interaction_data(db)
+    mock_error.assert_called_once()
+    correlations.get_raw_interactions.clear()
@@ -192,6 +192,129 @@ class TestRecipesApp(unittest.TestCase):
             'Nutrition of the recipes on bar chart with the selected label'
         )
 
+    @patch('tags_nutriscore_correlation.get_tag_vocabulary')
+    @patch('streamlit.stop')
+    @patch('streamlit.error')
+    @patch('streamlit.write')
+    @patch('streamlit.text_input')
+    @patch('streamlit.multiselect')
+    @patch('streamlit.markdown')
+    def test_display_select_tools_query(self,
+                                        mock_markdown,
+                                        mock_multiselect,
+                                        mock_text_input,
+                                        mock_write,
+                                        mock_error,
+                                        mock_stop,
+                                        mock_get_tag_vocabulary):
+        """
+        Test that a boolean tag query is accepted and a malformed one is
+        reported.
+
+        Returns:
+            None
+        """
+        mock_get_tag_vocabulary.return_value = \
+            tags_nutriscore_correlation.TagVocabulary(
+                ['dessert', 'low carb', 'vegetarian'], [5, 3, 8]
+            )
+        mock_multiselect.return_value = ['other']
+        mock_text_input.return_value = 'vegetarian AND (low carb OR dessert)'
+        self.assertEqual(
+            app.display_select_tools(), 'vegetarian AND (low carb OR dessert)'
+        )
+        mock_error.assert_not_called()
+
+        # st.stop interrupts the script run
+        mock_stop.side_effect = RuntimeError
+        mock_text_input.return_value = 'vegetarian AND (low carb'
+        with self.assertRaises(RuntimeError):
+            app.display_select_tools()
+        mock_error.assert_called_once()
+        mock_stop.assert_called_once()
+
+    @patch('tags_nutriscore_correlation.get_tag_vocabulary')
+    @patch('streamlit.stop')
+    @patch('streamlit.warning')
+    @patch('streamlit.caption')
+    @patch('streamlit.write')
+    @patch('streamlit.text_input')
+    @patch('streamlit.multiselect')
+    @patch('streamlit.markdown')
+    def test_display_select_tools_suggestions(self,
+                                              mock_markdown,
+                                              mock_multiselect,
+                                              mock_text_input,
+                                              mock_write,
+                                              mock_caption,
+                                              mock_warning,
+                                              mock_stop,
+                                              mock_get_tag_vocabulary):
+        """
+        Test the completions of the typed tag and the check of unknown
+        tags.
+
+        Returns:
+            None
+        """
+        mock_get_tag_vocabulary.return_value = \
+            tags_nutriscore_correlation.TagVocabulary(
+                ['dessert', 'low carb', 'low sodium', 'vegetarian'],
+                [5, 3, 9, 8]
+            )
+        mock_multiselect.return_value = ['other']
+        mock_text_input.return_value = 'Vegetarian, lo'
+        app.display_select_tools()
+        mock_caption.assert_called_once_with(
+            'Suggestions: low sodium (9 recipes), low carb (3 recipes)'
+        )
+        mock_warning.assert_called_once_with('Unknown tags: lo')
+        mock_stop.assert_called_once()
+
+        mock_warning.reset_mock()
+        mock_text_input.return_value = 'Vegetarian, Low-Carb'
+        self.assertEqual(app.display_select_tools(), 'vegetarian,low carb')
+        mock_warning.assert_not_called()
+
+        # An empty input stops the page before any query
+        mock_stop.side_effect = RuntimeError
+        mock_text_input.return_value = ' '
+        with self.assertRaises(RuntimeError):
+            app.display_select_tools()
+        mock_warning.assert_called_once_with('Please enter at least one tag')
+
+    @patch('tags_nutriscore_correlation.get_tag_cooccurrence')
+    @patch('streamlit.caption')
+    def test_display_related_tags(self, mock_caption,
+                                  mock_get_tag_cooccurrence):
+        """
+        Test the expected size and the related tags of the selection.
+
+        Returns:
+            None
+        """
+        index = tags_nutriscore_correlation.TagIndex.from_exploded(
+            pd.DataFrame({
+                'idrecipes': [1, 1, 1, 2, 2, 3],
+                'tags': ['low carb', 'vegetarian', 'dessert',
+                         'low carb', 'vegetarian', 'dessert']
+            })
+        )
+        mock_get_tag_cooccurrence.return_value = \
+            tags_nutriscore_correlation.TagCooccurrence.from_index(index)
+
+        related = app.display_related_tags('low carb')
+        self.assertEqual(related, [('vegetarian', 2), ('dessert', 1)])
+        mock_caption.assert_any_call('Expected result: 2 recipes')
+
+        mock_caption.reset_mock()
+        self.assertEqual(
+            app.display_related_tags('low carb AND NOT dessert'), []
+        )
+        mock_caption.assert_not_called()
+
+    @patch('tags_nutriscore_correlation.get_tag_cooccurrence')
+    @patch('tags_nutriscore_correlation.get_tag_aggregates')
     @patch('streamlit.write')
     @patch('tags_nutriscore_correlation.main')
     @patch('streamlit.multiselect')
@@ -199,18 +322,21 @@ class TestRecipesApp(unittest.TestCase):
     @patch('streamlit.markdown')
     @patch('streamlit.set_page_config')
     def test_main(self,
-                mock_set_page_config,
-                mock_markdown,
-                mock_columns,
-                mock_multiselect,
-                mock_tags_nutriscore_main,
-                mock_write):
+                  mock_set_page_config,
+                  mock_markdown,
+                  mock_columns,
+                  mock_multiselect,
+                  mock_tags_nutriscore_main,
+                  mock_write,
+                  mock_get_tag_aggregates,
+                  mock_get_tag_cooccurrence):
         """
         Test main function.
 
         Returns:
             None
         """
+        mock_get_tag_aggregates.return_value = None
 
         mock_multiselect.return_value = ['course']
         mock_tags_nutriscore_main.return_value = (
@@ -225,5 +351,76 @@ class TestRecipesApp(unittest.TestCase):
         mock_multiselect.assert_called_once()
         mock_tags_nutriscore_main.assert_called_once()
 
+    @patch('tags_nutriscore_correlation.get_tag_cooccurrence')
+    @patch('tags_nutriscore_correlation.get_recipe_table')
+    @patch('tags_nutriscore_correlation.get_tag_aggregates')
+    @patch('tags_nutriscore_correlation.main')
+    @patch('streamlit.table')
+    @patch('streamlit.dataframe')
+    @patch('streamlit.radio')
+    @patch('streamlit.plotly_chart')
+    @patch('streamlit.write')
+    @patch('streamlit.multiselect')
+    @patch('streamlit.columns')
+    @patch('streamlit.markdown')
+    @patch('streamlit.set_page_config')
+    def test_main_single_tag_aggregates(self,
+                                        mock_set_page_config,
+                                        mock_markdown,
+                                        mock_columns,
+                                        mock_multiselect,
+                                        mock_write,
+                                        mock_plotly_chart,
+                                        mock_radio,
+                                        mock_dataframe,
+                                        mock_table,
+                                        mock_tags_nutriscore_main,
+                                        mock_get_tag_aggregates,
+                                        mock_get_recipe_table,
+                                        mock_get_tag_cooccurrence):
+        """
+        Test that a single tag is served from the tag aggregates, without
+        loading or joining its recipes.
+
+        Returns:
+            None
+        """
+        raw = pd.DataFrame({
+            'name': ['Recipe1', 'Recipe2'],
+            'id': [1, 2],
+            'tags': ['course', 'course']
+        })
+        nutrition = pd.DataFrame({
+            'id': [1, 2],
+            'dv_calories_%': [20.0, 30.0],
+            'nutriscore': [50.0, 45.0],
+            'label': ['A', 'A']
+        })
+        table = tags_nutriscore_correlation.RecipeTable.from_tables(
+            raw, nutrition
+        )
+        index = tags_nutriscore_correlation.TagIndex.from_exploded(
+            pd.DataFrame({'idrecipes': [1, 2], 'tags': ['course', 'course']})
+        )
+        mock_get_tag_aggregates.return_value = \
+            tags_nutriscore_correlation.TagAggregates.build(index, table)
+        mock_multiselect.return_value = ['course']
+        mock_columns.return_value = (MagicMock(), MagicMock())
+        mock_radio.return_value = 'A'
+
+        app.main()
+
+        mock_tags_nutriscore_main.assert_not_called()
+        mock_get_recipe_table.assert_not_called()
+        mock_dataframe.assert_called_once()
+        self.assertEqual(
+            mock_dataframe.call_args[0][0]['name'].tolist(),
+            ['Recipe1', 'Recipe2']
+        )
+        stats = mock_table.call_args[0][0]
+        self.assertEqual(stats.loc['dv_calories_%', 'mean'], 25.0)
+        self.assertGreaterEqual(mock_plotly_chart.call_count, 2)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -69,15 +69,90 @@ def test_display_references(mock_write):
     module_6_Appendix.display_references()
     assert mock_write.called
 
+
+@patch('streamlit.plotly_chart')
+@patch('streamlit.data_editor')
+@patch('streamlit.write')
+def test_display_whatif_explorer(mock_write, mock_data_editor,
+                                 mock_plotly_chart):
+    grille = pd.read_csv(
+        module_6_Appendix.get_asset_path("data/nutrient_table.csv"),
+        encoding='utf-8-sig'
+    )
+    edited_grille = grille.copy()
+    edited_grille['points'] = 0
+    mock_data_editor.return_value = edited_grille
+    data = pd.DataFrame({
+        'dv_calories_%': [10, 50, 80],
+        'dv_sat_fat_%': [10, 100, 200],
+        'dv_sugar_%': [10, 100, 200],
+        'dv_sodium_%': [10, 100, 300],
+        'dv_protein_%': [100, 50, 10]
+    })
+    module_6_Appendix.display_whatif_explorer(data)
+    assert mock_plotly_chart.called
+    fig = mock_plotly_chart.call_args[0][0]
+    edited_shares = [trace for trace in fig.data
+                     if trace.name == 'Edited grid'][0].y
+    assert list(edited_shares) == [1, 0, 0, 0, 0]
+
+
+def test_get_grille_explorer_version():
+    """
+    Test that the explorer is rebuilt when the data changes.
+    """
+    data = pd.DataFrame({
+        'dv_calories_%': [10, 50],
+        'dv_sat_fat_%': [10, 100],
+        'dv_sugar_%': [10, 100],
+        'dv_sodium_%': [10, 100],
+        'dv_protein_%': [100, 50]
+    })
+    explorer = module_6_Appendix.get_grille_explorer(
+        data, "NS_withOutliers", module_6_Appendix.data_fingerprint(data)
+    )
+    assert explorer.n_recipes == 2
+    more = pd.concat([data, data])
+    explorer = module_6_Appendix.get_grille_explorer(
+        more, "NS_withOutliers", module_6_Appendix.data_fingerprint(more)
+    )
+    assert explorer.n_recipes == 4
+
+
+@patch('streamlit.error')
+@patch('streamlit.data_editor')
+@patch('streamlit.write')
+def test_display_whatif_explorer_invalid(mock_write, mock_data_editor,
+                                         mock_error):
+    grille = pd.read_csv(
+        module_6_Appendix.get_asset_path("data/nutrient_table.csv"),
+        encoding='utf-8-sig'
+    )
+    grille.loc[0, 'dv_sugar_%'] = 500
+    mock_data_editor.return_value = grille
+    data = pd.DataFrame({
+        'dv_calories_%': [10],
+        'dv_sat_fat_%': [10],
+        'dv_sugar_%': [10],
+        'dv_sodium_%': [10],
+        'dv_protein_%': [100]
+    })
+    module_6_Appendix.display_whatif_explorer(data)
+    assert mock_error.called
+
 @patch.object(module_6_Appendix, 'display_header')
 @patch.object(module_6_Appendix, 'display_nutriscore_description')
 @patch.object(module_6_Appendix, 'display_nutriscore_grid')
 @patch.object(module_6_Appendix, 'display_example_calculation')
+@patch.object(module_6_Appendix, 'display_whatif_explorer')
 @patch.object(module_6_Appendix, 'display_references')
 @patch.object(module_6_Appendix, 'get_cached_data')
+@patch.object(module_6_Appendix, 'get_data_version')
 def test_main(
+    mock_get_data_version,
     mock_get_cached_data,
     mock_display_references,
+    mock_display_whatif_explorer,
     mock_display_example_calculation,
     mock_display_nutriscore_grid,
     mock_display_nutriscore_description,
@@ -96,4 +171,6 @@ def test_main(
     assert mock_display_nutriscore_description.called
     assert mock_display_nutriscore_grid.called
     assert mock_display_example_calculation.called
+    assert mock_display_whatif_explorer.call_args[0][1] == \
+        mock_get_data_version.return_value
     assert mock_display_references.called
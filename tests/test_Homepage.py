@@ -90,6 +90,18 @@ def test_display_header(mock_page_link, mock_write, mock_markdown):
     mock_write.assert_called()
 
 
+def test_get_score_distribution():
+    """
+    Test that the Nutri-Scores are counted on the 0.25 point grid
+    """
+    distribution = Homepage.get_score_distribution(
+        pd.Series([1, 2.25, 2.25, 14], name='nutriscore')
+    )
+    assert distribution.count == 4
+    assert distribution.counts[9] == 2
+    assert distribution.summary().median == 2.25
+
+
 def test_analyze_data():
     """
     Test the analyze_data function
@@ -106,6 +118,9 @@ def test_analyze_data():
     assert 'Min' in result.columns
     assert 'Skewness' in result.columns
     assert 'Kurtosis' in result.columns
+    assert result.loc['With outliers', 'Mean'] == 2.5
+    assert result.loc['Without outliers', 'Median'] == 2.5
+    assert result.loc['With outliers', 'Kurtosis'] == pytest.approx(1.64)
 
 
 @patch('streamlit.slider')
@@ -155,13 +170,9 @@ def test_display_histograms(
 @patch('streamlit.selectbox')
 @patch('streamlit.write')
 @patch('streamlit.divider')
-@patch('Homepage.shapiro_test')
-@patch('Homepage.ks_test')
-@patch('Homepage.ad_test')
+@patch.object(Homepage, 'get_normality_tester')
 def test_display_distribution_analysis(
-    mock_ad_test,
-    mock_ks_test,
-    mock_shapiro_test,
+    mock_get_normality_tester,
     mock_divider,
     mock_write,
     mock_selectbox
@@ -170,9 +181,7 @@ def test_display_distribution_analysis(
     Test the display_distribution_analysis function
 
     Args:
-        mock_ad_test (fixture): Mock the ad_test function
-        mock_ks_test (fixture): Mock the ks_test function
-        mock_shapiro_test (fixture): Mock the shapiro_test function
+        mock_get_normality_tester (fixture): Mock the normality tester
         mock_divider (fixture): Mock the divider function
         mock_write (fixture): Mock the write function
         mock_selectbox (fixture): Mock the selectbox function
@@ -183,16 +192,66 @@ def test_display_distribution_analysis(
     data_with_outliers = pd.DataFrame({'nutriscore': [1, 2, 3, 4]})
     data_no_outliers = pd.DataFrame({'nutriscore': [1, 2, 3, 4]})
     mock_selectbox.return_value = "Shapiro-Wilk"
-    mock_shapiro_test.return_value = (0.9, 0.05)
+    tester = mock_get_normality_tester.return_value
+    tester.run.return_value = {"Shapiro-Wilk": (0.9, 0.05)}
     Homepage.display_distribution_analysis(
         data_with_outliers,
-        data_no_outliers
+        data_no_outliers,
+        ("v1", "v2")
     )
     mock_selectbox.assert_called()
-    mock_write.assert_called()
+    mock_write.assert_any_call(
+        "Shapiro-Wilk test for the Nutri-Score with outliers: (0.9, 0.05)"
+    )
+    assert [c.kwargs['version'] for c in tester.run.call_args_list] == [
+        "v1", "v2"
+    ]
     mock_divider.assert_called()
 
 
+@patch.object(Homepage, 'get_cached_data')
+def test_get_nutriscore_versions(mock_get_cached_data):
+    """
+    Test that the versions fingerprint the Nutri-Scores of each dataset
+    """
+    data = pd.DataFrame({'nutriscore': [1.0, 2.5], 'id': [3, 4]})
+    mock_get_cached_data.return_value = (data, None)
+    versions = Homepage.get_nutriscore_versions(
+        MagicMock(), "SELECT 1;", "SELECT 2;"
+    )
+    assert versions == (
+        Homepage.data_fingerprint(data['nutriscore']), None
+    )
+
+
+@patch.object(Homepage, 'get_cached_data')
+def test_get_label_versions(mock_get_cached_data):
+    """
+    Test that the versions fingerprint the labels of each dataset
+    """
+    data = pd.DataFrame({'label': ['A', 'C'], 'id': [3, 4]})
+    mock_get_cached_data.return_value = (None, data)
+    versions = Homepage.get_label_versions(
+        MagicMock(), "SELECT 3;", "SELECT 4;"
+    )
+    assert versions == (None, Homepage.data_fingerprint(data['label']))
+
+
+def test_get_normality_tester():
+    """
+    Test that the normality tests run on a capped sample
+    """
+    tester = Homepage.get_normality_tester()
+    data = pd.DataFrame({'nutriscore': [float(i % 57) / 4
+                                        for i in range(20000)]})
+    results = tester.run(data, 'nutriscore')
+    assert len(tester.sample(data, 'nutriscore')) == \
+        Homepage.NORMALITY_SAMPLE_SIZE
+    assert set(results) == {
+        "Shapiro-Wilk", "Kolmogorov-Smirnov", "Anderson-Darling"
+    }
+
+
 @patch('streamlit.plotly_chart')
 @patch('streamlit.image')
 @patch('streamlit.write')
@@ -221,3 +280,14 @@ def test_display_label_distribution(
     mock_subheader.assert_called()
     mock_image.assert_called()
     mock_plotly_chart.assert_called()
+    fig = mock_plotly_chart.call_args[0][0]
+    assert list(fig.data[0]['values']) == [1, 1, 1, 1, 1]
+
+    # The given versions key the cached distributions
+    with patch.object(Homepage, 'label_distribution',
+                      wraps=Homepage.label_distribution) as mock_distribution:
+        Homepage.display_label_distribution(
+            data_with_outliers, data_no_outliers, ("l1", "l2")
+        )
+    assert [c.kwargs['version'] for c in mock_distribution.call_args_list] \
+        == ["l1", "l2"]
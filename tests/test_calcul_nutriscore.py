@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 import pandas as pd
 import toml
 import os
@@ -10,7 +11,21 @@ from unittest.mock import patch, MagicMock
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 
                                              '..', 'src')))
 
-from calcul_nutriscore import NutriScore, Plot, main
+from calcul_nutriscore import (  # noqa: E402
+    NutriScore,
+    NutriScoreBatchJob,
+    CompiledGrille,
+    GrilleExplorer,
+    Plot,
+    main,
+    score_one,
+    score_many,
+    assign_labels,
+    render_batch,
+    GRILLECOLNAME
+)
+import calcul_nutriscore  # noqa: E402
+from core.asset_manager import get_asset_path  # noqa: E402
 from db.db_instance import db_instance
 
 query1 = 'SELECT * FROM "nutrition_withOutliers"'
@@ -174,6 +189,213 @@ def test_calcul_nutriscore(sample_data, sample_grille, sample_configs):
           "NutriScore should be of type float."
 
 
+def legacy_nutriscore(data, grille, grillecolname):
+    """
+    Reference row-range implementation of the NutriScore calculation.
+
+    It loops over the grille rows with one mask per range, as the scorer did
+    before the grille was compiled.
+    """
+    score = pd.Series(14.0, index=data.index)
+    for nutrient in grillecolname:
+        if nutrient not in grille.columns:
+            continue
+        values = data[nutrient].values
+        if nutrient == "dv_protein_%":
+            values = -values
+        for i, grille_row in grille.iterrows():
+            prev_value = -np.inf if i == 0 else grille[nutrient].iloc[i - 1]
+            if np.isnan(grille_row[nutrient]):
+                score[values > prev_value] -= grille_row['points']
+                break
+            mask = (values > prev_value) & (values <= grille_row[nutrient])
+            score[mask] -= grille_row['points']
+    return score
+
+
+def test_calcul_nutriscore_matches_legacy(sample_configs):
+    """
+    Test the compiled grille against the row-range implementation.
+
+    The values are drawn around the thresholds of the real nutrient table,
+    including the thresholds themselves and missing values.
+
+    Parameters
+    ----------
+    sample_configs : dict
+        Sample database configuration for testing.
+
+    Returns
+    -------
+    None
+    """
+    grille = pd.read_csv(
+        get_asset_path("data/nutrient_table.csv"), encoding='utf-8-sig'
+    )
+    rng = np.random.default_rng(0)
+    data = {}
+    for nutrient in sample_configs['grillecolname']:
+        thresholds = grille[nutrient].dropna().abs().to_numpy()
+        values = np.concatenate([
+            rng.uniform(0, 300, 2000 - thresholds.size),
+            thresholds,
+            [0, np.nan, 1e6]
+        ])
+        data[nutrient] = rng.permutation(values)
+    data = pd.DataFrame(data)
+
+    result = NutriScore(data, grille, sample_configs).nutriscore
+    expected = legacy_nutriscore(
+        data, grille, sample_configs['grillecolname']
+    )
+    np.testing.assert_array_equal(result['nutriscore'].values, expected)
+
+
+def test_compiled_grille_unsorted(sample_grille):
+    """
+    Test that a grille with unsorted thresholds is rejected.
+
+    Parameters
+    ----------
+    sample_grille : pd.DataFrame
+        Sample nutrient table for testing.
+
+    Returns
+    -------
+    None
+    """
+    grille = sample_grille.copy()
+    grille['dv_sugar_%'] = [84, 114, 101]
+    with pytest.raises(ValueError):
+        CompiledGrille(grille, ['dv_sugar_%'])
+
+
+def test_keep_bin_codes(sample_data, sample_grille, sample_configs):
+    """
+    Test the scores recalculated from the kept bin codes.
+
+    Rescoring with the grille points must give the calculated scores, and
+    rescoring with new points must match a full calculation.
+
+    Parameters
+    ----------
+    sample_data : pd.DataFrame
+        Sample data for testing.
+    sample_grille : pd.DataFrame
+        Sample nutrient table for testing.
+    sample_configs : dict
+        Sample database configuration for testing.
+
+    Returns
+    -------
+    None
+    """
+    data = sample_data.assign(**{
+        'dv_calories_%': [10, 40, 45, 60],
+        'dv_sugar_%': [90, 100, 110, 50],
+        'dv_protein_%': [95, 80, 60, 10]
+    })
+    nutri_score = NutriScore(
+        data, sample_grille, sample_configs, keep_bin_codes=True
+    )
+    assert nutri_score.bin_codes.dtype == np.uint8
+    assert nutri_score.bin_codes.shape == (4, 5)
+    np.testing.assert_array_equal(
+        nutri_score.rescore(sample_grille['points']),
+        nutri_score.nutriscore['nutriscore']
+    )
+
+    new_points = [0.5, 2, 3]
+    new_grille = sample_grille.assign(points=new_points)
+    expected = NutriScore(data, new_grille, sample_configs)
+    np.testing.assert_array_equal(
+        nutri_score.rescore(new_points),
+        expected.nutriscore['nutriscore']
+    )
+
+    breakdown = nutri_score.points_breakdown()
+    assert list(breakdown.columns) == sample_configs['grillecolname']
+    np.testing.assert_array_equal(
+        14 - breakdown.sum(axis=1), nutri_score.nutriscore['nutriscore']
+    )
+
+
+def test_rescore_without_bin_codes(sample_data, sample_grille,
+                                   sample_configs):
+    """
+    Test that rescoring requires the bin codes to be kept.
+
+    Parameters
+    ----------
+    sample_data : pd.DataFrame
+        Sample data for testing.
+    sample_grille : pd.DataFrame
+        Sample nutrient table for testing.
+    sample_configs : dict
+        Sample database configuration for testing.
+
+    Returns
+    -------
+    None
+    """
+    nutri_score = NutriScore(sample_data, sample_grille, sample_configs)
+    with pytest.raises(ValueError):
+        nutri_score.rescore([0, 1, 1.25])
+
+
+def test_score_one_and_score_many(sample_configs):
+    """
+    Test the single-recipe scoring API against the NutriScore class.
+
+    Parameters
+    ----------
+    sample_configs : dict
+        Sample database configuration for testing.
+
+    Returns
+    -------
+    None
+    """
+    grille = pd.read_csv(
+        get_asset_path("data/nutrient_table.csv"), encoding='utf-8-sig'
+    )
+    rng = np.random.default_rng(1)
+    data = pd.DataFrame({
+        nutrient: rng.uniform(0, 300, 200).round()
+        for nutrient in GRILLECOLNAME
+    })
+    expected = NutriScore(data, grille, sample_configs).nutriscore_label
+
+    many = score_many(data[GRILLECOLNAME].to_numpy())
+    np.testing.assert_array_equal(
+        many['nutriscore'], expected['nutriscore']
+    )
+    np.testing.assert_array_equal(many['label'], expected['label'])
+    assert many['points'].shape == (200, 5)
+
+    for i, row in data.iterrows():
+        result = score_one(row.to_dict())
+        assert result['nutriscore'] == expected['nutriscore'][i]
+        assert result['label'] == expected['label'][i]
+        assert list(result['points']) == GRILLECOLNAME
+
+
+def test_score_one_missing_value():
+    """
+    Test that a missing nutrient value is worth 0 points.
+
+    Returns
+    -------
+    None
+    """
+    values = dict.fromkeys(GRILLECOLNAME, 0)
+    values['dv_sugar_%'] = np.nan
+    result = score_one(values)
+    assert result['points']['dv_sugar_%'] == 0
+    with pytest.raises(ValueError):
+        score_many(np.zeros((2, 3)))
+
+
 def test_set_scorelabel(sample_data, sample_grille, sample_configs):
     """
     Test the labeling logic based on NutriScore values.
@@ -200,6 +422,209 @@ def test_set_scorelabel(sample_data, sample_grille, sample_configs):
         "Invalid NutriScore labels detected."
 
 
+def test_set_scorelabel_categorical(sample_data, sample_grille,
+                                    sample_configs):
+    """
+    Test the categorical labels and that the scores are not modified.
+
+    Parameters
+    ----------
+    sample_data : pd.DataFrame
+        Sample data for testing.
+    sample_grille : pd.DataFrame
+        Sample nutrient table for testing.
+    sample_configs : dict
+        Sample database configuration for testing.
+
+    Returns
+    -------
+    None
+    """
+    nutri_score = NutriScore(sample_data, sample_grille, sample_configs)
+    result = nutri_score.set_scorelabel()
+    assert 'label' not in nutri_score.nutriscore.columns
+    assert result['label'].dtype == 'category'
+    assert result['label'].cat.ordered
+    assert list(result['label'].cat.categories) == ['A', 'B', 'C', 'D', 'E']
+
+    relabelled = nutri_score.relabel([3, 6, 9, 15])
+    assert (relabelled == 'B').all()
+
+
+def test_missing_nutrients_labelled(sample_grille, sample_configs):
+    """
+    Test that recipes with missing nutrients still get a score and a label,
+    so the scores are never missing.
+
+    Parameters
+    ----------
+    sample_grille : pd.DataFrame
+        Sample nutrient table for testing.
+    sample_configs : dict
+        Sample database configuration for testing.
+
+    Returns
+    -------
+    None
+    """
+    data = pd.DataFrame({
+        column: [10.0, np.nan] for column in sample_configs['grillecolname']
+    })
+    result = NutriScore(data, sample_grille, sample_configs).nutriscore_label
+    assert result['nutriscore'].notna().all()
+    assert result['label'].notna().all()
+
+
+def test_assign_labels():
+    """
+    Test the labels of the scores at and around the cut points.
+
+    Returns
+    -------
+    None
+    """
+    scores = [0, 2.75, 3, 5.75, 6, 8.75, 9, 11.75, 12, 14, np.nan]
+    labels = assign_labels(scores)
+    assert list(labels[:-1]) == \
+        ['E', 'E', 'D', 'D', 'C', 'C', 'B', 'B', 'A', 'A']
+    assert pd.isna(labels[-1])
+    with pytest.raises(ValueError):
+        assign_labels(scores, cuts=[3, 6, 9])
+    with pytest.raises(ValueError):
+        assign_labels(scores, cuts=[3, 9, 6, 12])
+
+
+def test_grille_explorer(sample_configs):
+    """
+    Test the what-if explorer against a full calculation.
+
+    Parameters
+    ----------
+    sample_configs : dict
+        Sample database configuration for testing.
+
+    Returns
+    -------
+    None
+    """
+    grille = pd.read_csv(
+        get_asset_path("data/nutrient_table.csv"), encoding='utf-8-sig'
+    )
+    rng = np.random.default_rng(2)
+    data = pd.DataFrame({
+        nutrient: rng.uniform(0, 300, 500).round()
+        for nutrient in GRILLECOLNAME
+    })
+    explorer = GrilleExplorer(data)
+
+    edited = grille.copy()
+    edited.loc[0, 'dv_sugar_%'] = 50
+    edited['points'] = edited['points'] * 2
+    expected = NutriScore(data, edited, sample_configs).nutriscore_label
+    np.testing.assert_array_equal(
+        explorer.score(edited), expected['nutriscore']
+    )
+
+    distribution = explorer.label_distribution(edited)
+    assert list(distribution.index) == ['A', 'B', 'C', 'D', 'E']
+    assert distribution['count'].sum() == 500
+    for label, count in distribution['count'].items():
+        assert count == (expected['label'] == label).sum()
+    # The second call is served from the cache
+    assert len(explorer._cache) == 1
+    explorer.label_distribution(edited)
+    assert len(explorer._cache) == 1
+
+    counts = explorer.bin_counts(grille)
+    assert (counts.sum() == 500).all()
+
+
+class FakeDatabase:
+    """In-memory database streaming a table in chunks."""
+
+    def __init__(self, data):
+        self.data = data
+        self.written = []
+        self.replaced = []
+
+    def fetch_chunks(self, query, chunksize):
+        for start in range(0, len(self.data), chunksize):
+            yield self.data.iloc[start:start + chunksize]
+
+    def write_data(self, data, table_name, if_exists='append'):
+        self.written.append((table_name, if_exists, data))
+
+    def replace_table(self, source, target):
+        self.replaced.append((source, target))
+
+
+def test_batch_job(sample_data, sample_grille, sample_configs, tmp_path):
+    """
+    Test the chunked scoring against the NutriScore class.
+
+    The first chunk must replace the staging table and the next ones be
+    appended, the staging table must then replace the target table, and
+    the Parquet file must hold the same rows.
+
+    Parameters
+    ----------
+    sample_data : pd.DataFrame
+        Sample data for testing.
+    sample_grille : pd.DataFrame
+        Sample nutrient table for testing.
+    sample_configs : dict
+        Sample database configuration for testing.
+    tmp_path : pathlib.Path
+        Temporary directory for the Parquet file.
+
+    Returns
+    -------
+    None
+    """
+    data = sample_data.assign(**{'dv_calories_%': [10, 40, 45, 60]})
+    database = FakeDatabase(data)
+    job = NutriScoreBatchJob(sample_grille, chunksize=3, database=database)
+    parquet_path = str(tmp_path / 'NS_withOutliers.parquet')
+
+    n_rows = job.run(
+        'nutrition_withOutliers',
+        target_table='NS_withOutliers',
+        parquet_path=parquet_path
+    )
+
+    assert n_rows == 4
+    assert [(table, if_exists) for table, if_exists, _ in database.written] \
+        == [('NS_withOutliers_staging', 'replace'),
+            ('NS_withOutliers_staging', 'append')]
+    assert database.replaced == [
+        ('NS_withOutliers_staging', 'NS_withOutliers')
+    ]
+    result = pd.concat([chunk for _, _, chunk in database.written])
+    expected = NutriScore(data, sample_grille, sample_configs)
+    pd.testing.assert_series_equal(
+        result['nutriscore'], expected.nutriscore_label['nutriscore']
+    )
+    assert list(result['label']) == \
+        list(expected.nutriscore_label['label'])
+    assert len(pd.read_parquet(parquet_path)) == 4
+
+    with pytest.raises(ValueError):
+        job.run('nutrition_withOutliers')
+
+    # A failed chunk leaves the target table and file untouched
+    database = FakeDatabase(data)
+    job = NutriScoreBatchJob(sample_grille, chunksize=3, database=database)
+    failed_path = str(tmp_path / 'failed.parquet')
+    with patch.object(job, 'score_chunk',
+                      side_effect=[job.score_chunk(data.iloc[:3]),
+                                   RuntimeError('chunk failed')]):
+        with pytest.raises(RuntimeError):
+            job.run('nutrition_withOutliers', 'NS_withOutliers', failed_path)
+    assert len(database.written) == 1
+    assert database.replaced == []
+    assert not os.path.exists(failed_path)
+
+
 def test_stock_database_real(db_connection):
     """
     Test to verify real table sizes in the database.
@@ -258,31 +683,34 @@ def test_init_plot():
     assert plot_instance.output_path == output_path
 
 
-def test_plot_distribution():
+def test_plot_distribution(tmp_path):
     """
     Test the plot distribution function.
     
-    The method should plot the distribution of the data and save it to the
-    output path.
+    The method should render the histogram headlessly, without pyplot, and
+    save it to the output path.
 
     Returns
     -------
     None
     """
     data = [1, 2, 3, 4, 5]
+    output_path = tmp_path / "test.png"
     plot = Plot(data, title="Test Title", xlabel="X-Axis", ylabel="Y-Axis", 
-                output_path="test.png")
-    with patch('matplotlib.pyplot.savefig') as savefig_mock:
-        plot.plot_distribution()
-        savefig_mock.assert_called_once_with("test.png")
+                output_path=str(output_path))
+    with patch('matplotlib.pyplot.show') as show_mock:
+        image = plot.plot_distribution()
+        show_mock.assert_not_called()
+    assert image.startswith(b'\x89PNG')
+    assert output_path.read_bytes() == image
 
 
-def test_plot_distribution_label():
+def test_plot_distribution_label(tmp_path):
     """
     Test the label distribution plotting function.
     
-    The method should plot the distribution of the labels and save it to the
-    output path.
+    The method should render the count plot headlessly, without pyplot,
+    and save it to the output path.
 
     Returns
     -------
@@ -290,11 +718,59 @@ def test_plot_distribution_label():
     """
     data = ['A', 'B', 'C', 'D', 'E']
     labels = ['A', 'B', 'C', 'D', 'E']
+    output_path = tmp_path / "test_label.png"
     plot = Plot(data, title="Test Title", xlabel="X-Axis", ylabel="Y-Axis", 
-                output_path="test_label.png")
-    with patch('matplotlib.pyplot.savefig') as savefig_mock:
-        plot.plot_distribution_label(labels)
-        savefig_mock.assert_called_once_with("test_label.png")
+                output_path=str(output_path))
+    with patch('matplotlib.pyplot.show') as show_mock:
+        image = plot.plot_distribution_label(labels)
+        show_mock.assert_not_called()
+    assert image.startswith(b'\x89PNG')
+    assert output_path.read_bytes() == image
+
+
+def test_render_cache():
+    """
+    Test that rendered plots are cached by data and parameters.
+
+    Returns
+    -------
+    None
+    """
+    data = pd.Series([1.0, 2.5, 2.5, 4.0])
+    plot = Plot(data, title="Cached")
+    with patch('calcul_nutriscore.Figure', wraps=calcul_nutriscore.Figure) \
+            as figure_mock:
+        first = plot.render_distribution(fmt='svg')
+        second = Plot(data.copy(), title="Cached").render_distribution(
+            fmt='svg'
+        )
+        assert figure_mock.call_count == 1
+        plot.render_distribution(bins=5, fmt='svg')
+        assert figure_mock.call_count == 2
+    assert first == second
+    assert first.startswith(b'<?xml')
+    with pytest.raises(ValueError):
+        plot.render_distribution(fmt='gif')
+
+
+def test_render_batch(tmp_path):
+    """
+    Test the rendering of many plots in one call.
+
+    Returns
+    -------
+    None
+    """
+    outputs = render_batch([
+        {'data': [1, 2, 3], 'title': 'Scores',
+         'output_path': str(tmp_path / 'scores.json')},
+        {'data': ['A', 'B', 'B'], 'title': 'Labels',
+         'labels': ['A', 'B', 'C', 'D', 'E']}
+    ], fmt='plotly')
+    assert len(outputs) == 2
+    assert '"Scores"' in outputs[0]
+    assert (tmp_path / 'scores.json').read_text() == outputs[0]
+
 
 class TestNutriScoreCalculation(unittest.TestCase):
 
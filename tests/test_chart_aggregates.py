@@ -0,0 +1,106 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import patch
+
+sys.path.insert(
+    0,
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+)
+
+import chart_aggregates  # noqa: E402
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.normal(8, 1, 5000), [-20, 40, 50]])
+    return pd.DataFrame({'nutriscore': values})
+
+
+def test_histogram(data):
+    """
+    Test that the histogram counts match np.histogram and respect the range.
+    """
+    hist = chart_aggregates.histogram(data, 'nutriscore', bins=30)
+    counts, edges = np.histogram(data['nutriscore'], bins=30)
+
+    assert np.array_equal(hist['counts'], counts)
+    assert np.allclose(hist['edges'], edges)
+    assert hist['count'] == len(data)
+
+    hist = chart_aggregates.histogram(
+        data, 'nutriscore', bins=10, value_range=(0, 14)
+    )
+    in_range = data['nutriscore'].between(0, 14)
+    assert hist['count'] == in_range.sum()
+    assert hist['edges'][0] == 0 and hist['edges'][-1] == 14
+
+
+def test_histogram_cache(data):
+    """
+    Test that a histogram is computed once per version, column and bins.
+    """
+    version = chart_aggregates.dataset_version(data)
+    with patch('chart_aggregates.np.histogram',
+               wraps=np.histogram) as mock_histogram:
+        chart_aggregates.histogram(data, 'nutriscore', 7, version=version)
+        chart_aggregates.histogram(data, 'nutriscore', 7, version=version)
+        chart_aggregates.histogram(data, 'nutriscore', 8, version=version)
+
+    assert mock_histogram.call_count == 2
+
+
+def test_cached_arrays_read_only(data):
+    """
+    Test that the cached arrays cannot be modified by a caller.
+    """
+    hist = chart_aggregates.histogram(data, 'nutriscore', bins=9)
+    with pytest.raises(ValueError):
+        hist['counts'][0] = -1
+    hist['count'] = -1
+    again = chart_aggregates.histogram(data, 'nutriscore', bins=9)
+    assert again['count'] == len(data)
+
+    stats = chart_aggregates.box_stats(data, 'nutriscore')
+    assert not stats['outliers'].flags.writeable
+
+
+def test_box_stats(data):
+    """
+    Test the box plot statistics and the cap on the outliers.
+    """
+    stats = chart_aggregates.box_stats(data, 'nutriscore')
+    values = data['nutriscore'].to_numpy()
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    outliers = (values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)
+
+    assert stats['median'] == median
+    assert stats['upperfence'] == values[~outliers].max()
+    assert stats['lowerfence'] == values[~outliers].min()
+    assert stats['n_outliers'] == outliers.sum()
+    assert stats['count'] == len(data)
+
+    capped = chart_aggregates.box_stats(data, 'nutriscore', max_outliers=5)
+    assert len(capped['outliers']) == 5
+    assert capped['outliers'].min() == -20
+    assert capped['outliers'].max() == 50
+
+
+def test_figures(data):
+    """
+    Test that the figures are built from the aggregates only.
+    """
+    hist = chart_aggregates.histogram(data, 'nutriscore', bins=12)
+    fig = chart_aggregates.histogram_figure(hist, title='t', color='#741B47')
+    assert fig.data[0].type == 'bar'
+    assert len(fig.data[0].y) == 12
+
+    stats = chart_aggregates.box_stats(data, 'nutriscore', max_outliers=3)
+    fig = chart_aggregates.box_figure(stats, name='nutriscore')
+    assert [trace.type for trace in fig.data] == ['box', 'scatter']
+    assert len(fig.data[1].y) == 3
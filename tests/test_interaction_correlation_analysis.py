@@ -4,14 +4,16 @@ import pytest
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 # to be able to import the module from the src folder
 sys.path.insert(0, os.path.abspath(os.path.join
                                    (os.path.dirname(__file__), '../src')
                                    ))
 from interaction_correlation_analysis import (
     InteractionData,
+    InteractionAggregator,
     LabelAnalysis,
+    refresh_interaction_aggregates,
     main
 )
 
@@ -168,6 +170,119 @@ def test_interactions_df(test_interaction_data):
         "The output is not correct"
 
 
+def test_interactions_df_missing_values(test_interaction_data):
+    """
+    Test that interactions without rating or review are ignored
+    """
+    data = pd.concat([test_interaction_data, pd.DataFrame({
+        'user_id': [5, 6],
+        'recipe_id': [1, 2],
+        'date': ['2020-01-05', '2020-01-06'],
+        'rating': [None, 1],
+        'review': ['Good', None]
+    })], ignore_index=True)
+    result = InteractionData(data=data).interactions_df()
+    assert result['interaction_count'].tolist() == [1, 1, 2]
+    assert result['average_rating'].tolist() == [5.0, 4.0, 2.5]
+
+
+def test_interaction_aggregator(test_interaction_data):
+    """
+    Test that merged partial aggregates equal interactions_df
+    """
+    expected = InteractionData(data=test_interaction_data).interactions_df()
+    first = InteractionAggregator().update(test_interaction_data.iloc[:3])
+    second = InteractionAggregator().update(test_interaction_data.iloc[3:])
+    pd.testing.assert_frame_equal(second.merge(first).result(), expected)
+    pd.testing.assert_frame_equal(
+        InteractionAggregator.from_chunks(
+            [test_interaction_data.iloc[:1], test_interaction_data.iloc[1:]]
+        ).result(),
+        expected
+    )
+
+
+def test_interaction_aggregator_sources(test_interaction_data, tmp_path):
+    """
+    Test the aggregation of CSV, Parquet and database chunks
+    """
+    expected = InteractionData(data=test_interaction_data).interactions_df()
+
+    csv_path = tmp_path / 'interactions.csv'
+    test_interaction_data.to_csv(csv_path, index=False)
+    pd.testing.assert_frame_equal(
+        InteractionAggregator.from_csv(csv_path, chunksize=3).result(),
+        expected
+    )
+
+    parquet_path = tmp_path / 'interactions.parquet'
+    test_interaction_data.to_parquet(parquet_path, row_group_size=1)
+    pd.testing.assert_frame_equal(
+        InteractionAggregator.from_parquet(parquet_path, workers=2).result(),
+        expected
+    )
+
+    database = MagicMock()
+    database.fetch_chunks.return_value = iter([
+        test_interaction_data[['recipe_id', 'rating']].iloc[:2],
+        test_interaction_data[['recipe_id', 'rating']].iloc[2:]
+    ])
+    pd.testing.assert_frame_equal(
+        InteractionAggregator.from_database(database).result(), expected
+    )
+    assert 'IS NOT NULL' in database.fetch_chunks.call_args[0][0]
+
+    # Without a watermark, a refresh would add the whole history again
+    database.fetch_chunks.return_value = iter(
+        [test_interaction_data[['recipe_id', 'rating']]]
+    )
+    with pytest.raises(ValueError):
+        InteractionAggregator.from_database(database).save(database)
+    database.write_tables.assert_not_called()
+
+
+def test_refresh_interaction_aggregates(test_interaction_data):
+    """
+    Test that a refresh folds only the interactions after the watermark
+    """
+    def new_rows(data):
+        return data.assign(has_review=data['review'].notna())[
+            ['recipe_id', 'rating', 'has_review', 'date']
+        ]
+
+    database = MagicMock()
+    database.fetch_data.return_value = None
+    database.fetch_chunks.return_value = iter(
+        [new_rows(test_interaction_data.iloc[:3])]
+    )
+    aggregator = refresh_interaction_aggregates(database, until='2020-01-04')
+    assert aggregator.watermark == '2020-01-03'
+    query = database.fetch_chunks.call_args[0][0]
+    assert "date < '2020-01-04'" in query and 'date >' not in query
+
+    # The persisted aggregates are loaded and only the new day is read
+    (tables,), _ = database.write_tables.call_args
+    database.write_data.assert_not_called()
+    assert list(tables) == [
+        'interaction_aggregates', 'interaction_aggregates_watermark'
+    ]
+    database.fetch_data.side_effect = list(tables.values())
+    database.fetch_chunks.return_value = iter(
+        [new_rows(test_interaction_data.iloc[3:])]
+    )
+    aggregator = refresh_interaction_aggregates(database, until='2020-01-05')
+    assert "date > '2020-01-03'" in database.fetch_chunks.call_args[0][0]
+    assert aggregator.watermark == '2020-01-04'
+
+    expected = InteractionData(data=test_interaction_data).interactions_df()
+    pd.testing.assert_frame_equal(aggregator.result(), expected)
+    pd.testing.assert_frame_equal(
+        InteractionData.from_aggregates(aggregator.to_frame())
+        .interactions_df(),
+        expected
+    )
+
+
 def test_merge_interaction_nutriscore(
         test_interaction_data,
         test_nutriscore_data,
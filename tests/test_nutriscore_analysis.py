@@ -1,6 +1,7 @@
 import sys
 import os
 import pytest
+import numpy as np
 import pandas as pd
 from unittest.mock import patch, MagicMock
 import logging
@@ -57,6 +58,7 @@ def test_label_percentage():
     data = pd.DataFrame({'label': ['A', 'B', 'A', 'C']})
     result = nutriscore_analysis.label_percentage(data, 'A')
     assert result == 0.5
+    assert nutriscore_analysis.label_percentage(data, 'F') == 0
 
 @patch('nutriscore_analysis.pd.read_csv')
 @patch('nutriscore_analysis.Plot')
@@ -68,3 +70,198 @@ def test_main(mock_plot, mock_read_csv):
     mock_plot_instance = MagicMock()
     mock_plot.return_value = mock_plot_instance
     nutriscore_analysis.main()
+
+
+def test_summary_stats():
+    """
+    Test that the summary statistics match pandas and scipy.
+    """
+    data = pd.DataFrame({'nutriscore': [1, 2, 3, 4, 4, 9.5, None]})
+    stats = nutriscore_analysis.summary_stats(data['nutriscore'])
+    x = data['nutriscore'].dropna()
+
+    assert stats.count == 6
+    assert stats.mean == pytest.approx(x.mean())
+    assert stats.median == x.median()
+    assert stats.maximum == 9.5
+    assert stats.minimum == 1
+    assert stats.std == pytest.approx(x.std())
+    assert stats.skewness == pytest.approx(
+        nutriscore_analysis.skewness(data.dropna(), 'nutriscore'))
+    assert stats.kurtosis == pytest.approx(
+        nutriscore_analysis.kurtosis(data.dropna(), 'nutriscore'))
+    assert stats.quantile([0.1, 0.75]) == pytest.approx(
+        x.quantile([0.1, 0.75]).to_numpy())
+
+
+def test_summary_stats_merge():
+    """
+    Test that the statistics merged across chunks equal those of the whole
+    sample.
+    """
+    rng = np.random.default_rng(0)
+    x = np.round(rng.normal(8, 2, 1001) * 4) / 4
+    whole = nutriscore_analysis.summary_stats(x)
+    chunked = nutriscore_analysis.summary_stats(x, chunksize=97)
+    streamed = nutriscore_analysis.summary_stats(
+        iter(np.array_split(x, 7)))
+
+    for stats in (chunked, streamed):
+        assert stats.count == whole.count
+        assert stats.median == whole.median
+        assert stats.minimum == whole.minimum
+        assert stats.maximum == whole.maximum
+        assert stats.mean == pytest.approx(whole.mean)
+        assert stats.skewness == pytest.approx(whole.skewness)
+        assert stats.kurtosis == pytest.approx(whole.kurtosis)
+
+    empty = nutriscore_analysis.summary_stats([])
+    assert empty.count == 0
+    assert np.isnan(empty.median)
+
+
+def test_summary_stats_sketch():
+    """
+    Test that high-cardinality samples keep a bounded quantile sketch with
+    exact moments, and that the quantiles can be disabled.
+    """
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=20000)
+    size = nutriscore_analysis.SummaryStats.MAX_CENTROIDS
+    chunked = nutriscore_analysis.summary_stats(x, chunksize=3000)
+
+    assert not chunked.exact
+    assert chunked.values.size <= size
+    assert chunked.count == x.size
+    assert chunked.mean == pytest.approx(x.mean())
+    assert chunked.std == pytest.approx(x.std(ddof=1))
+    assert chunked.minimum == x.min()
+    assert chunked.quantile(1) == x.max()
+    assert chunked.quantile([0.25, 0.5, 0.75]) == pytest.approx(
+        np.quantile(x, [0.25, 0.5, 0.75]), abs=0.01)
+
+    moments = nutriscore_analysis.summary_stats(
+        x, chunksize=3000, quantiles=False)
+    assert moments.values is None
+    assert moments.kurtosis == pytest.approx(chunked.kurtosis)
+    assert np.isnan(moments.median)
+
+
+def test_encode_scores():
+    """
+    Test the encoding of the scores on the 0.25 point grid.
+    """
+    scores = np.array([0, 0.25, 8.75, 14, np.nan])
+    codes = nutriscore_analysis.encode_scores(scores)
+
+    assert codes.dtype == np.uint8
+    assert codes.tolist() == [0, 1, 35, 56, nutriscore_analysis.MISSING_CODE]
+    np.testing.assert_array_equal(
+        nutriscore_analysis.decode_scores(codes), scores)
+    with pytest.raises(ValueError):
+        nutriscore_analysis.encode_scores([8.1])
+    with pytest.raises(ValueError):
+        nutriscore_analysis.encode_scores([14.25])
+
+
+def test_score_distribution():
+    """
+    Test that the statistics, histogram and label counts of the score
+    distribution equal those of the raw scores.
+    """
+    rng = np.random.default_rng(0)
+    scores = np.clip(np.round(rng.normal(8, 2, 5000) * 4) / 4, 0, 14)
+    distribution = nutriscore_analysis.ScoreDistribution.from_scores(
+        np.append(scores, np.nan))
+    stats = distribution.summary()
+    reference = nutriscore_analysis.summary_stats(scores)
+
+    assert distribution.count == 5000
+    assert distribution.missing == 1
+    assert distribution.nbytes == 57 * 8
+    assert stats.median == reference.median
+    assert stats.mean == pytest.approx(reference.mean)
+    assert stats.skewness == pytest.approx(reference.skewness)
+    assert stats.kurtosis == pytest.approx(reference.kurtosis)
+
+    hist = distribution.histogram(bins=28)
+    counts, edges = np.histogram(scores, bins=28)
+    np.testing.assert_array_equal(hist['counts'], counts)
+    np.testing.assert_allclose(hist['edges'], edges)
+
+    labels = pd.Series(
+        nutriscore_analysis.assign_labels(scores)).value_counts()
+    assert distribution.label_counts().to_dict() == labels.to_dict()
+
+    merged = distribution.merge(distribution)
+    assert merged.count == 10000
+    assert merged.summary().median == stats.median
+
+
+def test_stratified_sample():
+    """
+    Test that the stratified sample is reproducible and follows the data.
+    """
+    x = np.arange(100000, dtype=float)
+    sample = nutriscore_analysis.stratified_sample(x, 1000, seed=1)
+
+    assert len(sample) == 1000
+    np.testing.assert_array_equal(
+        sample, nutriscore_analysis.stratified_sample(x, 1000, seed=1))
+    # One value in each stratum of 100 ranks
+    np.testing.assert_array_equal(sample // 100, np.arange(1000))
+    assert len(nutriscore_analysis.stratified_sample(x[:10], 1000)) == 10
+
+
+def test_normality_tester():
+    """
+    Test that the normality tests run on the sample and are cached.
+    """
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({'nutriscore': rng.normal(8, 2, 20000)})
+    tester = nutriscore_analysis.NormalityTester(sample_size=500)
+    results = tester.run(data, 'nutriscore', concurrent=True)
+
+    sample = tester.sample(data, 'nutriscore')
+    assert len(sample) == 500
+    assert results['Shapiro-Wilk'] == \
+        nutriscore_analysis.shapiro_test(sample, 'nutriscore')
+    assert results['Kolmogorov-Smirnov'] == \
+        nutriscore_analysis.ks_test(sample, 'nutriscore')
+
+    with patch.dict(tester.TESTS, {'Shapiro-Wilk': MagicMock()}) as tests:
+        cached = tester.run(data, 'nutriscore', ['Shapiro-Wilk'])
+        tests['Shapiro-Wilk'].assert_not_called()
+    assert cached['Shapiro-Wilk'] == results['Shapiro-Wilk']
+
+    with pytest.raises(ValueError):
+        tester.run(data, 'nutriscore', ['Lilliefors'])
+
+    # Results evicted right after being computed are still returned
+    small = nutriscore_analysis.NormalityTester(sample_size=500, cache_size=1)
+    evicted = small.run(data, 'nutriscore')
+    assert set(evicted) == set(results)
+    assert evicted['Shapiro-Wilk'] == results['Shapiro-Wilk']
+
+
+def test_label_distribution():
+    """
+    Test the counts and shares of all labels in one table.
+    """
+    data = pd.DataFrame({'label': ['A', 'B', 'A', 'C', None]})
+    result = nutriscore_analysis.label_distribution(data)
+
+    assert result.index.tolist() == ['A', 'B', 'C', 'D', 'E']
+    assert result['count'].tolist() == [2, 1, 1, 0, 0]
+    assert result['share'].tolist() == [0.4, 0.2, 0.2, 0.0, 0.0]
+
+    # The cached table is not modified through the returned copy
+    result.loc['A', 'count'] = 10
+    assert nutriscore_analysis.label_distribution(data).loc['A', 'count'] == 2
+
+    # Missing labels, formerly '', are counted the same way
+    blank = pd.DataFrame({'label': ['A', 'B', 'A', 'C', '']})
+    pd.testing.assert_frame_equal(
+        nutriscore_analysis.label_distribution(blank),
+        nutriscore_analysis.label_distribution(data)
+    )
@@ -0,0 +1,104 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(
+    os.path.abspath(
+        os.path.join(os.path.dirname(__file__), '..', 'src')
+    )
+)
+
+from tag_query import (  # noqa: E402
+    TagQuery,
+    TagQuerySyntaxError,
+    tokenize
+)
+from tags_nutriscore_correlation import TagIndex  # noqa: E402
+
+
+@pytest.fixture
+def postings():
+    rng = np.random.default_rng(0)
+    ids = np.arange(2000) * 2 + 1
+    return {
+        'vegetarian': set(ids[rng.random(2000) < 0.4].tolist()),
+        'low carb': set(ids[rng.random(2000) < 0.3].tolist()),
+        'low sodium': set(ids[rng.random(2000) < 0.01].tolist()),
+        'dessert': set(ids[rng.random(2000) < 0.2].tolist()),
+        'meat': set(ids[rng.random(2000) < 0.005].tolist()),
+    }
+
+
+@pytest.fixture
+def index(postings):
+    return TagIndex.from_exploded(pd.DataFrame({
+        'tags': [tag for tag, ids in postings.items() for _ in ids],
+        'idrecipes': [i for ids in postings.values() for i in ids]
+    }))
+
+
+def test_tokenize():
+    assert tokenize('Low-Carb AND (main  dish, NOT x)') == [
+        ('tag', 'low carb'), ('AND', 'AND'), ('(', '('),
+        ('tag', 'main dish'), ('AND', ','), ('NOT', 'NOT'),
+        ('tag', 'x'), (')', ')')
+    ]
+
+
+def test_parse():
+    query = TagQuery('vegetarian AND (low carb OR low sodium) NOT dessert')
+    assert query.tree == ('and', [
+        ('tag', 'vegetarian'),
+        ('or', [('tag', 'low carb'), ('tag', 'low sodium')]),
+        ('not', ('tag', 'dessert'))
+    ])
+    assert query.tags == {'vegetarian', 'low carb', 'low sodium', 'dessert'}
+    assert TagQuery.is_boolean('a OR b')
+    assert not TagQuery.is_boolean('low carb,course')
+
+
+@pytest.mark.parametrize('text', ['', 'a AND', '(a OR b', 'a )', 'OR a'])
+def test_parse_errors(text):
+    with pytest.raises(TagQuerySyntaxError):
+        TagQuery(text)
+
+
+def test_canonical():
+    query = TagQuery('vegetarian AND (low carb OR Low-Sodium) NOT dessert')
+    assert query.canonical == TagQuery(
+        '(low sodium OR low carb) AND NOT dessert AND vegetarian'
+    ).canonical
+    assert query.canonical != TagQuery(
+        'vegetarian AND (low carb OR low sodium) NOT meat'
+    ).canonical
+
+
+def test_plan(index):
+    plan = TagQuery('NOT dessert AND vegetarian AND meat').plan(index)
+    assert plan == ('and', [
+        ('tag', 'meat'), ('tag', 'vegetarian'), ('not', ('tag', 'dessert'))
+    ])
+
+
+def test_evaluate(index, postings):
+    universe = set().union(*postings.values())
+    low = postings['low carb'] | postings['low sodium']
+    vegetarian_low = postings['vegetarian'] & low
+    cases = {
+        'vegetarian AND (low carb OR low sodium) NOT dessert':
+            vegetarian_low - postings['dessert'],
+        'meat AND vegetarian': postings['meat'] & postings['vegetarian'],
+        'low sodium NOT vegetarian':
+            postings['low sodium'] - postings['vegetarian'],
+        'NOT dessert': universe - postings['dessert'],
+        'meat OR low sodium': postings['meat'] | postings['low sodium'],
+        'vegetarian, low carb':
+            postings['vegetarian'] & postings['low carb'],
+        'unknown OR meat': postings['meat'],
+    }
+    for text, expected in cases.items():
+        result = TagQuery(text).evaluate(index)
+        assert result.tolist() == sorted(expected), text
@@ -2,7 +2,8 @@ import os
 import sys
 import pytest
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
+import numpy as np
 import pandas as pd
 
 sys.path.append(
@@ -14,9 +15,23 @@ sys.path.append(
 from tags_nutriscore_correlation import (
     Utils,
     PreprocessTags,
+    RecipeTable,
+    TagAggregates,
+    TagCooccurrence,
+    QueryCache,
+    query_cache,
+    query_key,
+    result_nbytes,
     Tags,
+    EncodedTags,
+    TagIndex,
+    TagVocabulary,
     DatabaseTable,
     load_streamlit_db,
+    get_tag_aggregates,
+    load_tag_aggregates,
+    rebuild_tag_table,
+    run_tag_query,
     main
 )
 
@@ -72,6 +87,44 @@ def test_formatter_tags_data(sample_data, formatted_tags_data):
     pd.testing.assert_frame_equal(formatted, formatted_tags_data)
 
 
+def test_explode_tags(sample_data, formatted_tags_data):
+    data = pd.concat([sample_data, pd.DataFrame({'id': [4], 'tags': ['[]']})],
+                     ignore_index=True)
+    exploded = PreprocessTags.explode_tags(data)
+    pd.testing.assert_frame_equal(exploded.iloc[:-1], formatted_tags_data)
+    # As DataFrame.explode, a recipe without tags keeps one missing tag
+    assert exploded.iloc[-1]['idrecipes'] == 4
+    assert pd.isna(exploded.iloc[-1]['tags'])
+    assert PreprocessTags(data).tags[-1] == []
+
+
+def test_rebuild_tag_table(sample_data, formatted_tags_data):
+    database = MagicMock()
+    database.fetch_chunks.return_value = iter(
+        [sample_data.iloc[:2], sample_data.iloc[2:]]
+    )
+    assert rebuild_tag_table(database, chunksize=2) == 9
+
+    calls = database.write_data.call_args_list
+    assert [c.kwargs['if_exists'] for c in calls] == ['replace', 'append']
+    assert {c.args[1] for c in calls} == {'explodetags_staging'}
+    written = pd.concat([c.args[0] for c in calls], ignore_index=True)
+    pd.testing.assert_frame_equal(written, formatted_tags_data)
+    database.replace_table.assert_called_once_with(
+        'explodetags_staging', 'explodetags'
+    )
+
+    # A failed chunk leaves the tag table untouched
+    database = MagicMock()
+    database.write_data.side_effect = [None, RuntimeError('write failed')]
+    database.fetch_chunks.return_value = iter(
+        [sample_data.iloc[:2], sample_data.iloc[2:]]
+    )
+    with pytest.raises(RuntimeError):
+        rebuild_tag_table(database, chunksize=2)
+    database.replace_table.assert_not_called()
+
+
 # Tests pour Tags
 def test_extract_tag(formatted_tags_data):
     tag_handler = Tags(formatted_tags_data, 'course')
@@ -85,12 +138,345 @@ def test_get_recipes_from_tags_single_tag(formatted_tags_data):
     assert (ids == [1, 3]).all()
 
 
+def test_get_recipes_from_tags_no_match(formatted_tags_data):
+    ids = Tags(formatted_tags_data, 'unknown').get_recipes_from_tags()
+    assert isinstance(ids, np.ndarray) and len(ids) == 0
+    # A recipe id 0 is a match
+    data = pd.DataFrame({'idrecipes': [0], 'tags': ['course']})
+    assert Tags(data, 'course').get_recipes_from_tags().tolist() == [0]
+
+
 def test_get_recipes_from_tags_multiple_tags(formatted_tags_data):
     tag_handler = Tags(formatted_tags_data, 'course,meat')
     ids = tag_handler.get_recipes_from_tags()
     assert ids == [3]
 
 
+def test_get_recipes_from_tags_query(formatted_tags_data):
+    tag_handler = Tags(formatted_tags_data, 'time to make NOT course')
+    assert tag_handler.get_recipes_from_tags().tolist() == [2]
+    tag_handler = Tags(formatted_tags_data, '(meat OR 60 minutes or less)')
+    assert tag_handler.get_recipes_from_tags().tolist() == [2, 3]
+
+
+def test_tag_index(formatted_tags_data):
+    index = TagIndex.from_exploded(
+        pd.concat([formatted_tags_data, formatted_tags_data.iloc[:2]])
+    )
+    assert len(index) == 7
+    assert index.tags.tolist() == sorted(set(formatted_tags_data['tags']))
+    assert index.lookup('course').tolist() == [1, 3]
+    assert index.lookup('time to make').tolist() == [1, 2]
+    assert index.lookup('course').dtype == np.int32
+    assert index.postings_size('meat') == 1
+    assert 'unknown' not in index
+    assert len(index.lookup('unknown')) == 0
+    with pytest.raises(ValueError):
+        index.lookup('course')[0] = 2
+
+
+def test_tag_index_from_preprocessed(sample_data, formatted_tags_data):
+    index = TagIndex.from_preprocessed(PreprocessTags(sample_data))
+    expected = TagIndex.from_exploded(formatted_tags_data)
+    np.testing.assert_array_equal(index.offsets, expected.offsets)
+    np.testing.assert_array_equal(index.recipe_ids, expected.recipe_ids)
+
+
+def test_extract_tag_uses_index(formatted_tags_data):
+    index = TagIndex.from_exploded(formatted_tags_data)
+    tag_handler = Tags(formatted_tags_data, 'meat', index=index)
+    assert tag_handler.extract_tag('meat').tolist() == [3]
+    assert tag_handler.index is index
+
+
+def test_tag_index_intersect():
+    rng = np.random.default_rng(0)
+    ids = np.arange(1000) * 3 + 5
+    postings = {
+        'dense1': ids[rng.random(1000) < 0.6],
+        'dense2': ids[rng.random(1000) < 0.5],
+        'sparse1': ids[rng.random(1000) < 0.02],
+        'sparse2': ids[rng.random(1000) < 0.02],
+    }
+    postings['sparse2'] = np.union1d(
+        postings['sparse2'], postings['sparse1'][:5]
+    )
+    tagsdata = pd.DataFrame({
+        'tags': [tag for tag, values in postings.items() for _ in values],
+        'idrecipes': np.concatenate(list(postings.values()))
+    })
+    index = TagIndex.from_exploded(tagsdata)
+    assert set(index.bitmaps) == {
+        index.positions['dense1'], index.positions['dense2']
+    }
+
+    for query in (['dense1', 'dense2'], ['sparse1', 'sparse2'],
+                  ['dense1', 'sparse1'], ['sparse2', 'dense2', 'dense1']):
+        expected = postings[query[0]]
+        for tag in query[1:]:
+            expected = np.intersect1d(expected, postings[tag])
+        np.testing.assert_array_equal(index.intersect(query), expected)
+
+    assert len(index.intersect(['dense1', 'unknown'])) == 0
+
+
+def test_tag_vocabulary(formatted_tags_data):
+    vocabulary = TagVocabulary.from_index(
+        TagIndex.from_exploded(formatted_tags_data)
+    )
+    assert len(vocabulary) == 7
+    assert 'course' in vocabulary
+    assert vocabulary.count('time to make') == 2
+    assert vocabulary.count('unknown') == 0
+    assert vocabulary.complete('co') == [('course', 2)]
+    # Words inside the tags are completed too
+    assert vocabulary.complete('Minutes') == [
+        ('30 minutes or less', 1),
+        ('60 minutes or less', 1),
+        ('90 minutes or less', 1)
+    ]
+    assert vocabulary.complete('', k=2) == [
+        ('course', 2), ('time to make', 2)
+    ]
+    assert vocabulary.complete('zz') == []
+
+
+def test_encoded_tags(sample_data, formatted_tags_data):
+    encoded = EncodedTags.from_preprocessed(PreprocessTags(sample_data))
+    assert encoded.rows.dtype == np.int32
+    assert encoded.codes.dtype == np.int16
+    assert encoded.recipes.tolist() == [1, 2, 3]
+    assert encoded.tags == sorted(set(formatted_tags_data['tags']))
+    pd.testing.assert_frame_equal(encoded.to_frame(), formatted_tags_data)
+
+    index = TagIndex.from_encoded(encoded)
+    assert index.lookup('course').tolist() == [1, 3]
+
+
+def test_encoded_tags_parquet(formatted_tags_data, tmp_path):
+    encoded = EncodedTags.from_exploded(formatted_tags_data.iloc[::-1])
+    path = tmp_path / 'explodetags.parquet'
+    encoded.to_parquet(path)
+    loaded = EncodedTags.read_parquet(path)
+
+    assert loaded.codes.dtype == np.int16
+    assert loaded.tags == encoded.tags
+
+    def by_pair(frame):
+        return frame.sort_values(['idrecipes', 'tags']).reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        by_pair(loaded.to_frame()), by_pair(formatted_tags_data)
+    )
+
+
+def test_encoded_tags_database(formatted_tags_data):
+    encoded = EncodedTags.from_exploded(formatted_tags_data)
+    database = MagicMock()
+    encoded.to_database(database)
+    (pairs, table), _ = database.write_data.call_args_list[0]
+    (dictionary, dictionary_table), _ = database.write_data.call_args_list[1]
+    assert table == 'explodetags_encoded'
+    assert dictionary_table == 'explodetags_encoded_dictionary'
+
+    database.fetch_data.side_effect = [pairs, dictionary]
+    loaded = EncodedTags.from_database(database)
+    pd.testing.assert_frame_equal(loaded.to_frame(), formatted_tags_data)
+
+
+def test_recipe_table_joins_on_id():
+    raw = pd.DataFrame({
+        'name': ['Recipe3', 'Recipe1', 'Recipe2', 'Recipe4'],
+        'id': [3, 1, 2, 4],
+        'tags': ['tag3', 'tag1', 'tag2', 'tag4']
+    })
+    nutrition = pd.DataFrame({
+        'id': [2, 1, 3],
+        'protein': [10.0, 20.0, 30.0],
+        'nutriscore': [45, 50, 40],
+        'label': ['B', 'A', 'C']
+    })
+    table = RecipeTable.from_tables(raw, nutrition)
+    assert len(table) == 3
+
+    recipes = table.recipes_with_scores([3, 1, 4, 99])
+    pd.testing.assert_frame_equal(recipes, pd.DataFrame({
+        'name': ['Recipe1', 'Recipe3'],
+        'id': [1, 3],
+        'tags': ['tag1', 'tag3'],
+        'nutriscore': [50, 40],
+        'label': ['A', 'C']
+    }))
+    nutrients = table.recipes_with_nutrients([2])
+    assert list(nutrients.columns) == [
+        'id', 'protein', 'nutriscore', 'label', 'name'
+    ]
+    assert nutrients.iloc[0]['name'] == 'Recipe2'
+    assert table.recipes_with_scores([]).empty
+
+
+def test_tag_aggregates(formatted_tags_data):
+    raw = pd.DataFrame({
+        'name': ['Recipe1', 'Recipe2', 'Recipe3'],
+        'id': [1, 2, 3],
+        'tags': ['tag1', 'tag2', 'tag3']
+    })
+    nutrition = pd.DataFrame({
+        'id': [1, 2, 3],
+        'dv_protein_%': [20.0, 30.0, 25.0],
+        'nutriscore': [50.0, 45.0, 40.0],
+        'label': ['A', 'A', 'B']
+    })
+    table = RecipeTable.from_tables(raw, nutrition)
+    aggregates = TagAggregates.build(
+        TagIndex.from_exploded(formatted_tags_data), table, n_recipes=1
+    )
+
+    assert 'time to make' in aggregates
+    assert aggregates.count('time to make') == 2
+    assert aggregates.label_distribution('course')['count'].tolist() == \
+        [1, 1, 0, 0, 0]
+    assert aggregates.box_stats('time to make').loc['A', 'median'] == 47.5
+    expected = nutrition[nutrition['label'] == 'A'].drop(
+        columns=['id', 'label']
+    ).describe().T[['mean', 'std', 'min', 'max']]
+    pd.testing.assert_frame_equal(
+        aggregates.nutrient_stats('time to make', 'A'), expected
+    )
+    # The first recipes of a label are those listed by a query of the tag
+    recipes = table.recipes_with_scores(
+        Tags(formatted_tags_data, 'time to make').get_recipes_from_tags()
+    )
+    first = aggregates.first_recipes('time to make', 'A')
+    pd.testing.assert_frame_equal(
+        first, recipes[recipes['label'] == 'A'].iloc[:1]
+        .reset_index(drop=True)
+    )
+    assert aggregates.first_recipes('course', 'B')['name'].tolist() == \
+        ['Recipe3']
+    assert aggregates.first_recipes('course', 'E').empty
+    assert aggregates.first_recipes('unknown', 'A').empty
+
+    database = MagicMock()
+    aggregates.to_database(database)
+    (tables,), _ = database.write_tables.call_args
+    assert list(tables) == ['tag_aggregates', 'tag_aggregates_recipes']
+    loaded = TagAggregates.from_frame(*tables.values())
+    pd.testing.assert_frame_equal(loaded.data, aggregates.data)
+    pd.testing.assert_frame_equal(loaded.recipes, aggregates.recipes)
+
+
+@patch('tags_nutriscore_correlation.db_instance')
+def test_get_tag_aggregates_miss_not_cached(mock_db_instance):
+    load_tag_aggregates.clear()
+    mock_db_instance.fetch_data.return_value = None
+    assert get_tag_aggregates() is None
+
+    aggregates = pd.DataFrame({'tag': ['course'], 'label': ['all'],
+                               'count': [1]})
+    recipes = pd.DataFrame({'tag': ['course'], 'name': ['Recipe1'],
+                            'id': [1], 'tags': ['course'],
+                            'nutriscore': [50.0], 'label': ['A']})
+    mock_db_instance.fetch_data.side_effect = [aggregates, recipes]
+    loaded = get_tag_aggregates()
+    assert 'course' in loaded
+    load_tag_aggregates.clear()
+
+
+def test_tag_cooccurrence(formatted_tags_data):
+    index = TagIndex.from_exploded(formatted_tags_data)
+    matrix = TagCooccurrence.recipe_tag_matrix(index)
+    assert matrix.shape == (3, len(index))
+    assert matrix.nnz == len(formatted_tags_data)
+
+    cooccurrence = TagCooccurrence.from_index(index)
+    assert cooccurrence.expected_size(['time to make']) == 2
+    assert cooccurrence.expected_size(['course', 'time to make']) == 1
+    assert cooccurrence.expected_size(['course', 'unknown']) == 0
+    assert cooccurrence.expected_size(['course', 'course', 'unknown']) == 0
+    assert cooccurrence.expected_size(['course', 'course']) == \
+        cooccurrence.expected_size(['course'])
+    related = cooccurrence.related(['time to make'], k=2)
+    assert related == [('30 minutes or less', 1), ('60 minutes or less', 1)]
+    assert cooccurrence.related(['course', 'meat']) == [
+        ('90 minutes or less', 1), ('main ingredient', 1)
+    ]
+
+
+def test_query_key():
+    assert query_key('Low-Carb, vegetarian') == \
+        query_key('vegetarian,low carb,') == \
+        ('tags', ('low carb', 'vegetarian'))
+    assert query_key('vegetarian AND low carb') == \
+        query_key('low carb AND vegetarian')
+    assert query_key('vegetarian AND low carb')[0] == 'query'
+
+
+def test_query_cache(formatted_tags_data):
+    result = (formatted_tags_data,)
+    size = result_nbytes(result)
+    cache = QueryCache(maxsize=2 * size)
+    compute = MagicMock(return_value=result)
+
+    assert cache.get(('tags', ('a',)), compute) is result
+    assert cache.get(('tags', ('a',)), compute) is result
+    assert compute.call_count == 1
+    assert cache.info()['hits'] == 1
+    assert cache.hit_rate == 0.5
+
+    # The least recently used result is evicted when the size is exceeded
+    cache.get(('tags', ('b',)), compute)
+    cache.get(('tags', ('c',)), compute)
+    assert ('tags', ('a',)) not in cache.cache
+    assert cache.info()['currsize'] == 2 * size
+
+    # A result larger than the cache is returned without being cached
+    small = QueryCache(maxsize=1)
+    assert small.get(('tags', ('a',)), compute) is result
+    assert len(small.cache) == 0
+
+    cache.clear()
+    assert cache.info()['entries'] == 0 and cache.hits == 0
+
+
+@patch('tags_nutriscore_correlation.run_tag_query')
+def test_main_cached(mock_run_tag_query):
+    query_cache.clear()
+    mock_run_tag_query.return_value = (pd.DataFrame(),) * 3
+    main('Low-Carb, vegetarian')
+    main('vegetarian,low carb')
+    mock_run_tag_query.assert_called_once_with('low carb,vegetarian')
+    assert query_cache.hits == 1
+    query_cache.clear()
+
+
+@patch('tags_nutriscore_correlation.load_tag_index')
+@patch('tags_nutriscore_correlation.DatabaseTable')
+@patch('tags_nutriscore_correlation.get_recipe_table')
+def test_run_tag_query_without_recipes(mock_get_recipe_table,
+                                       mock_database_table,
+                                       mock_load_tag_index):
+    raw = pd.DataFrame({'name': ['Recipe1'], 'id': [1], 'tags': ['tag1']})
+    nutrition = pd.DataFrame({
+        'id': [1], 'protein': [20.0], 'nutriscore': [50], 'label': ['A']
+    })
+    table = RecipeTable.from_tables(raw, nutrition)
+    mock_get_recipe_table.return_value = table
+    mock_database_table.return_value.apply_streamlit_db.return_value = \
+        pd.DataFrame({'idrecipes': [1], 'tags': ['tag1']})
+    with patch.object(Tags, 'get_recipes_from_tags',
+                      return_value=np.array([], dtype=int)), \
+            patch.object(RecipeTable, 'rows') as mock_rows:
+        recipes, nutrients, best = run_tag_query('unknown')
+    mock_rows.assert_not_called()
+    assert recipes.empty and nutrients.empty and best.empty
+    assert list(recipes.columns) == [
+        'name', 'id', 'tags', 'nutriscore', 'label'
+    ]
+    assert list(nutrients.columns) == [
+        'id', 'protein', 'nutriscore', 'label', 'name'
+    ]
+
+
 def test_database_table_init():
     """Test du constructeur de la classe DatabaseTable."""
 
@@ -170,6 +556,7 @@ class TestDatabaseTable(unittest.TestCase):
 @patch('tags_nutriscore_correlation.Tags.get_recipes_from_tags')
 def test_main(mock_get_recipes_from_tags, mock_apply_streamlit_db):
     """Test de la fonction main."""
+    query_cache.clear()
 
     # Configurer les mocks pour retourner des DataFrames simulés
     mock_apply_streamlit_db.side_effect = [